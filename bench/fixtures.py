@@ -0,0 +1,65 @@
+"""
+合成的诗歌数据：固定种子生成，不依赖网络，每次运行内容完全相同。
+"""
+import random
+
+CJK_CHARS = (
+    "春眠不觉晓处处闻啼鸟夜来风雨声花落知多少床前明月光疑是地上霜举头望山低思故乡"
+    "白日依尽黄河入海流欲穷千里目更上一层楼国破在城草木深感时溅泪恨别惊心烽火连三"
+    "假如生活欺骗了你要悲伤忧郁的子里须镇静相信吧快乐之将会来临我记得那美妙瞬间"
+)
+LATIN_WORDS = (
+    "if life should deceive you do not be sad or angry on the day of grief be patient "
+    "believe the day of joy will come heart lives in future present is dull everything "
+    "passes and what has passed will become dear remember wonderful moment before me "
+    "appeared fleeting vision genius pure beauty"
+).split()
+CYRILLIC_WORDS = (
+    "если жизнь тебя обманет не печалься не сердись в день уныния смирись день веселья "
+    "верь настанет сердце будущем живёт настоящее уныло всё мгновенно всё пройдёт что "
+    "пройдёт то будет мило помню чудное мгновенье передо мной явилась ты"
+).split()
+
+LANGS = ("zh_cn", "zh_tw", "en", "fr", "de", "ru")
+
+
+def make_text(script, lines, seed=0, para_every=4):
+    """
+    :param script: "cjk" | "latin" | "cyrillic"
+    :param lines: 诗句行数，每 para_every 行空一行分段
+    """
+    rnd = random.Random(f"{script}-{lines}-{seed}")
+    out = []
+    for i in range(lines):
+        if script == "cjk":
+            line = "".join(rnd.choice(CJK_CHARS) for _ in range(rnd.randint(5, 28)))
+        else:
+            pool = LATIN_WORDS if script == "latin" else CYRILLIC_WORDS
+            line = " ".join(rnd.choice(pool) for _ in range(rnd.randint(4, 16)))
+            line = line[0].upper() + line[1:]
+        out.append(line)
+        if para_every and (i + 1) % para_every == 0:
+            out.append("")
+    return "\n".join(out)
+
+
+LANG_SCRIPT = {"zh_cn": "cjk", "zh_tw": "cjk", "en": "latin", "fr": "latin", "de": "latin", "ru": "cyrillic"}
+
+
+def make_versions(seed=0, lines=12):
+    """一首诗的 6 语言版本 + 文案，结构与 LLM 返回的一致"""
+    versions = {}
+    for lang in LANGS:
+        script = LANG_SCRIPT[lang]
+        versions[lang] = {
+            "title": make_text(script, 1, seed=f"{seed}-{lang}-t", para_every=0)[:20],
+            "author": make_text(script, 1, seed=f"{seed}-{lang}-a", para_every=0)[:16],
+            "content": make_text(script, lines, seed=f"{seed}-{lang}")
+        }
+    versions["xhs_copy"] = make_text("cjk", 3, seed=f"{seed}-xhs", para_every=0)
+    return versions
+
+
+def make_source(count):
+    """类似 content_data.POEM_DATA_SOURCE 的输入列表"""
+    return [{"title": f"合成诗歌{i}", "author": f"作者{i % 7}"} for i in range(count)]
@@ -0,0 +1,243 @@
+"""
+渲染 / 采集流水线的基准测试。
+
+    python -m bench.run_bench                       # 全部跑一遍，结果写入 bench_results.json
+    python -m bench.run_bench --only bg layout      # 只跑部分组
+    python -m bench.run_bench --save-baseline bench_baseline.json
+    python -m bench.run_bench --compare bench_baseline.json --threshold 0.15
+
+compare 模式下中位数比基线慢超过 threshold 的项目会被标记为回归，进程以退出码 1 结束。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.fixtures import make_text, make_source
+
+FONTS = {
+    "cjk": "./assets/fonts/serif_cn.ttf",
+    "latin": "./assets/fonts/serif_latin.ttf",
+    "cyrillic": "./assets/fonts/cyrillic.ttf",
+}
+
+
+def available_fonts():
+    """
+    存在的基准字体。缺少的字体跳过并提示：渲染器找不到字体时会退回 Pillow 的内置位图字体，
+    测出来的就不是该文字的排版和渲染了。
+    """
+    fonts = {}
+    for script, font_path in FONTS.items():
+        if os.path.exists(font_path):
+            fonts[script] = font_path
+        else:
+            print(f"⚠️ 缺少字体 {font_path}，跳过 {script} 的排版和渲染基准")
+    return fonts
+
+
+def timeit(fn, repeat=5, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "mean": statistics.fmean(samples),
+        "runs": repeat,
+    }
+
+
+# === 各组基准 ===
+def bench_bg(repeat):
+    from src.dynamic_bg import create_dynamic_background, create_tiled_background
+
+    results = {}
+    for height in (1660, 3000, 5000):
+        results[f"bg.full.h{height}"] = timeit(lambda: create_dynamic_background(1242, height, seed=0), repeat)
+        results[f"bg.tiled.h{height}"] = timeit(lambda: create_tiled_background(1242, height, seed=0), repeat)
+    return results
+
+
+def bench_layout(repeat):
+    from src.renderer import DynamicRenderer
+
+    renderer = DynamicRenderer(verbose=False)
+    results = {}
+    for script, font_path in available_fonts().items():
+        font = renderer._get_font(font_path, 40)
+        for lines in (20, 100, 400):
+            text = make_text(script, lines)
+            for mode in ("greedy", "balanced"):
+                results[f"layout.{mode}.{script}.l{lines}"] = timeit(
+                    lambda: renderer._layout_text(text, font, line_break=mode), repeat)
+    return results
+
+
+def bench_render(repeat):
+    from src.renderer import DynamicRenderer
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for script, font_path in available_fonts().items():
+            for lines in (12, 80):
+                data = {"title": make_text(script, 1, para_every=0)[:20], "author": "Bench",
+                        "content": make_text(script, lines)}
+                out = os.path.join(tmp, f"{script}_{lines}.jpg")
+
+                # 冷启动：每次新建渲染器 (背景缓存为空)；热态：复用同一个渲染器
+                results[f"render.cold.{script}.l{lines}"] = timeit(
+                    lambda: DynamicRenderer(verbose=False).render(data, font_path, out), repeat)
+                warm = DynamicRenderer(verbose=False)
+                results[f"render.warm.{script}.l{lines}"] = timeit(
+                    lambda: warm.render(data, font_path, out), repeat)
+                atlas = DynamicRenderer(verbose=False, glyph_cache=True)
+                results[f"render.glyph_cache.{script}.l{lines}"] = timeit(
+                    lambda: atlas.render(data, font_path, out), repeat)
+    return results
+
+
+def bench_fetch(repeat, latency=0.2, poems=20):
+    """
+    阶段一对接本地模拟 LLM 服务。串行与并发两种模式，都关闭响应缓存。
+    """
+    from bench.stub_llm import start_stub_server
+
+    server, base_url, _ = start_stub_server(latency=latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    # 客户端在第一次请求时才读取 OPENAI_BASE_URL；之前若已创建过 (指向别处) 则丢弃重建
+    import main
+    from src import llm_client
+    llm_client.reset_client()
+
+    source = make_source(poems)
+    results = {}
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+
+            def run(concurrency):
+                for name in (main.REVIEW_FILE, main.CHECKPOINT_FILE):
+                    if os.path.exists(name):
+                        os.remove(name)
+                main.POEM_DATA_SOURCE[:] = source
+                main.step_1_fetch_and_save(concurrency=concurrency)
+
+            # 采集基准本身就是秒级，少跑几次
+            with open(os.devnull, "w") as devnull:
+                stdout = sys.stdout
+                sys.stdout = devnull
+                try:
+                    results[f"fetch.serial.n{poems}"] = timeit(lambda: run(1), max(1, repeat // 3), warmup=0)
+                    results[f"fetch.concurrent8.n{poems}"] = timeit(lambda: run(8), max(1, repeat // 3), warmup=0)
+                finally:
+                    sys.stdout = stdout
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+    return results
+
+
+GROUPS = {
+    "bg": bench_bg,
+    "layout": bench_layout,
+    "render": bench_render,
+    "fetch": bench_fetch,
+}
+
+
+# === 结果输出与对比 ===
+def environment():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ""
+    import PIL
+    import numpy
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pillow": PIL.__version__,
+        "numpy": numpy.__version__,
+        "git_rev": rev,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    :return: (回归列表, 对比明细)；只比较两边都有的项目
+    """
+    regressions = []
+    rows = []
+    for name, cur in sorted(current["results"].items()):
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = cur["median"] / base["median"] if base["median"] else float("inf")
+        flag = ratio > 1 + threshold
+        rows.append((name, base["median"], cur["median"], ratio, flag))
+        if flag:
+            regressions.append(name)
+    return regressions, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="诗歌卡片生成器基准测试")
+    parser.add_argument("--only", nargs="+", choices=sorted(GROUPS), help="只运行指定的组")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数 (取中位数)")
+    parser.add_argument("--fetch-latency", type=float, default=0.2, help="模拟 LLM 的单次延迟 (秒)")
+    parser.add_argument("--fetch-poems", type=int, default=20, help="采集基准的诗歌数量")
+    parser.add_argument("--output", default="bench_results.json", help="结果 JSON 路径")
+    parser.add_argument("--save-baseline", metavar="PATH", help="同时把结果另存为基线")
+    parser.add_argument("--compare", metavar="BASELINE", help="与基线对比并标记回归")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定回归的相对变慢比例")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.only or GROUPS:
+        print(f"⏱️ 运行基准组: {name} ...")
+        if name == "fetch":
+            results.update(bench_fetch(args.repeat, args.fetch_latency, args.fetch_poems))
+        else:
+            results.update(GROUPS[name](args.repeat))
+
+    report = {"env": environment(), "results": results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 结果已保存至: {args.output}")
+
+    for name, r in sorted(results.items()):
+        print(f"  {name:<40} {r['median'] * 1000:10.2f} ms")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions, rows = compare(report, baseline, args.threshold)
+        print(f"\n📊 对比基线: {args.compare} (阈值 +{args.threshold:.0%})")
+        for name, base, cur, ratio, flag in rows:
+            mark = "❌ 回归" if flag else ""
+            print(f"  {name:<40} {base * 1000:10.2f} → {cur * 1000:10.2f} ms  x{ratio:.2f} {mark}")
+        if regressions:
+            print(f"\n❌ 发现 {len(regressions)} 项性能回归")
+            return 1
+        print("\n✅ 没有发现性能回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
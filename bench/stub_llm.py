@@ -0,0 +1,123 @@
+"""
+本地模拟 LLM 服务 (OpenAI Chat Completions 兼容)，用于基准测试和离线调试采集流程。
+
+    python -m bench.stub_llm --port 8000 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=stub python main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from bench.fixtures import make_versions
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    # 由 start_stub_server 注入
+    latency = 0.0
+    error_rate = 0.0
+    stats = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.stats["lock"]:
+            self.stats["requests"] += 1
+
+        if self.error_rate and random.random() < self.error_rate:
+            with self.stats["lock"]:
+                self.stats["errors"] += 1
+            self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                            {"retry-after": "0.05"})
+            return
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        # 用用户提示词做种子，同一首诗总是得到相同的内容
+        user_msg = next((m["content"] for m in request.get("messages", []) if m.get("role") == "user"), "")
+        content = json.dumps(make_versions(seed=user_msg), ensure_ascii=False, indent=2)
+        if request.get("stream"):
+            self._send_stream(request, content)
+            return
+        self._send_json(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content}
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+
+    def _send_stream(self, request, content, chunk_chars=40):
+        """按 SSE 格式分块返回，模拟 stream=True 的逐 token 输出"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i in range(0, len(content), chunk_chars):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": content[i:i + chunk_chars]}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def start_stub_server(latency=0.0, error_rate=0.0, host="127.0.0.1", port=0):
+    """
+    在后台线程启动模拟服务。
+    :return: (server, base_url, stats)；用完调用 server.shutdown()
+    """
+    stats = {"requests": 0, "errors": 0, "lock": threading.Lock()}
+    handler = type("Handler", (StubLLMHandler,), {"latency": latency, "error_rate": error_rate, "stats": stats})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/v1", stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.5, help="每个请求的模拟延迟 (秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 429 的比例")
+    args = parser.parse_args()
+
+    server, base_url, _ = start_stub_server(args.latency, args.error_rate, args.host, args.port)
+    print(f"🧪 模拟 LLM 服务已启动: {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
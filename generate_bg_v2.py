@@ -2,6 +2,7 @@ import os
 import math
 import random
 from PIL import Image, ImageDraw, ImageFilter
+from src.dynamic_bg import radial_gradient
 
 
 def create_textured_paper(width=1242, height=1660):
@@ -11,23 +12,10 @@ def create_textured_paper(width=1242, height=1660):
     c_center = (255, 253, 250)  # 中心暖白
     c_edge = (245, 235, 225)  # 边缘米色
 
-    img = Image.new("RGB", (width, height), c_center)
-    pixels = img.load()
-
     center_x, center_y = width / 2, height / 2
     max_dist = math.sqrt(center_x ** 2 + center_y ** 2)
 
-    for y in range(height):
-        for x in range(width):
-            dx = x - center_x
-            dy = y - center_y
-            dist = math.sqrt(dx * dx + dy * dy)
-            ratio = min(dist / max_dist, 1.0)
-
-            r = int(c_center[0] * (1 - ratio) + c_edge[0] * ratio)
-            g = int(c_center[1] * (1 - ratio) + c_edge[1] * ratio)
-            b = int(c_center[2] * (1 - ratio) + c_edge[2] * ratio)
-            pixels[x, y] = (r, g, b)
+    img = radial_gradient(width, height, center_x, center_y, max_dist, c_center, c_edge)
 
     print("🌹 正在压印纹理 (2/3): 绘制玫瑰暗纹...")
 
@@ -1,156 +1,920 @@
 import os
-import json
 import sys
-from src.llm_client import fetch_poem_data_v2
-from src.renderer import DynamicRenderer
+import time
+import argparse
+import itertools
+from src.checkpoint import CollectionCheckpoint, record_key
+from src.review_io import iter_review_records
+from src.encoder import FORMATS
+from src import metrics
 from content_data import POEM_DATA_SOURCE
 
+# 注意：LLM 相关 (openai/httpx/pydantic) 与渲染相关 (Pillow/NumPy) 的模块都在用到它们的函数里再导入，
+# 只渲染的命令不必加载 LLM 栈、也不需要配置 API 密钥；--help 和 validate 两者都不加载
+
 # === 配置 ===
 # 中间文件存放位置
 REVIEW_FILE = "poems_to_review.json"
+# 阶段一的断点文件 (追加式 JSONL)，中断后重跑会从这里续传
+CHECKPOINT_FILE = "poems_collected.jsonl"
+DEFAULT_QUEUE = "render_queue.sqlite"
 
-# 字体配置 (保持不变)
+# 字体配置：每种语言的主字体
 FONT_CONFIG = {
     "zh_cn": "./assets/fonts/serif_cn.ttf",
     "zh_tw": "./assets/fonts/serif_tw.ttf",
     "en": "./assets/fonts/serif_latin.ttf",
     "fr": "./assets/fonts/serif_latin.ttf",
     "de": "./assets/fonts/serif_latin.ttf",
-    "ru": "./assets/fonts/serif_latin.ttf"
+    "ru": "./assets/fonts/cyrillic.ttf"
+}
+
+# 主字体缺字时依次尝试的后备字体 (按字符切换，主字体有的字不受影响)
+FONT_FALLBACKS = {
+    "zh_cn": ["./assets/fonts/serif_tw.ttf", "./assets/fonts/serif_latin.ttf"],
+    "zh_tw": ["./assets/fonts/serif_cn.ttf", "./assets/fonts/serif_latin.ttf"],
+    "en": ["./assets/fonts/cyrillic.ttf", "./assets/fonts/serif_cn.ttf"],
+    "fr": ["./assets/fonts/cyrillic.ttf", "./assets/fonts/serif_cn.ttf"],
+    "de": ["./assets/fonts/cyrillic.ttf", "./assets/fonts/serif_cn.ttf"],
+    "ru": ["./assets/fonts/serif_latin.ttf", "./assets/fonts/serif_cn.ttf"],
 }
 
 
-def step_1_fetch_and_save():
+def font_chain(lang_code):
+    """某种语言的完整字体链：主字体 + 后备字体"""
+    return (FONT_CONFIG[lang_code], *FONT_FALLBACKS.get(lang_code, ()))
+
+# 渲染器配置 (传给 DynamicRenderer)，也计入卡片指纹
+RENDER_OPTIONS = {}
+
+
+def step_1_fetch_and_save(concurrency=1, rate=None, cache=None, review_file=None, stream=False):
     """
     第一步：只负责找 AI 要数据，存入 JSON，不画图。
+    每首诗获取完立即追加到断点文件；中断后重跑会跳过已成功的诗，只重试失败和未完成的。
+    :param concurrency: 同时在途的 LLM 请求数；大于 1 时走异步并发采集
+    :param rate: 并发采集时每秒最多发起的请求数 (None 表示不限速)
+    :param cache: 可选的 ResponseCache，已经获取过的诗歌直接读缓存
+    :param review_file: 导出的校验文件，.json (整体数组) 或 .jsonl (每行一首)
+    :param stream: 串行采集时使用流式响应，每个语言块到达即显示，格式错误会记录具体原因
+    :return: 获取失败的诗歌数
     """
+    review_file = review_file or REVIEW_FILE
     print("\n🚀 进入【阶段一：数据采集】...")
     print(f"📋 计划处理 {len(POEM_DATA_SOURCE)} 首诗歌")
 
-    collected_data = []
+    checkpoint = CollectionCheckpoint(CHECKPOINT_FILE)
+    status = checkpoint.load_status()
+    pending = [item for item in POEM_DATA_SOURCE
+               if status.get((item['title'], item['author'])) != "ok"]
+    skipped = len(POEM_DATA_SOURCE) - len(pending)
+    if skipped:
+        print(f"⏩ 断点续传: 跳过已采集的 {skipped} 首，剩余 {len(pending)} 首")
+
+    if concurrency > 1:
+        failed = _fetch_concurrently(pending, checkpoint, concurrency, rate, cache)
+    else:
+        failed = _fetch_serially(pending, checkpoint, cache, stream)
+
+    if cache is not None:
+        st = cache.stats()
+        print(f"🗃️ 响应缓存: 命中 {st['hits']}，请求 {st['misses']}，合并重复 {st['coalesced']}")
 
-    for index, item in enumerate(POEM_DATA_SOURCE):
+    # 从断点文件导出供人工校验的文件；已有的校验文件只追加新诗，人工改过的内容原样保留
+    count = checkpoint.export_review(review_file, merge=True)
+
+    print(f"\n💾 {count} 首诗的数据已保存至: {review_file}")
+    if failed:
+        print(f"⚠️ 有 {failed} 首获取失败，已记录在 {CHECKPOINT_FILE}，重新运行第一步即可只重试它们。")
+    print("🛑 流程暂停。请打开该 JSON 文件进行人工校对，确认无误后运行第二步。")
+    return failed
+
+
+def _fetch_serially(items, checkpoint, cache=None, stream=False):
+    """逐首请求，返回失败数"""
+    from src.llm_client import fetch_poem_data_v2, fetch_poem_data_stream
+
+    failed = 0
+
+    for index, item in enumerate(items):
         title = item['title']
         author = item['author']
-        print(f"\n[{index + 1}/{len(POEM_DATA_SOURCE)}] 正在请求 AI 获取: {title} - {author} ...")
+        print(f"\n[{index + 1}/{len(items)}] 正在请求 AI 获取: {title} - {author} ...")
 
         try:
             # 调用 LLM
-            data = fetch_poem_data_v2(title, author)
-
+            if stream:
+                data = fetch_poem_data_stream(title, author, cache=cache,
+                                              on_block=lambda key, _: print(f"  📥 {key} 已到达"))
+            else:
+                data = fetch_poem_data_v2(title, author, cache=cache)
+            if not data:
+                raise ValueError("LLM 返回为空")
             # 这是一个关键步骤：把原始的输入信息也记下来，方便生成文件夹名
-            # 我们把 data 包装一下
-            record = {
-                "input_info": {"title": title, "author": author},
-                "versions": data  # 这里面包含了 6 种语言的详细内容
-            }
-            collected_data.append(record)
-            print("✅ 获取成功，已暂存。")
+            checkpoint.append({"title": title, "author": author}, versions=data)
+            metrics.incr("poems_fetched")
+            print("✅ 获取成功，已写入断点文件。")
 
         except Exception as e:
+            checkpoint.append({"title": title, "author": author}, error=e)
+            metrics.incr("poems_failed")
+            failed += 1
             print(f"❌ 获取失败: {title}. 错误: {e}")
 
-    # 保存到本地文件供人工校验
-    with open(REVIEW_FILE, 'w', encoding='utf-8') as f:
-        json.dump(collected_data, f, ensure_ascii=False, indent=2)
+    return failed
 
-    print(f"\n💾 数据已保存至: {REVIEW_FILE}")
-    print("🛑 流程暂停。请打开该 JSON 文件进行人工校对，确认无误后运行第二步。")
 
+def _fetch_concurrently(items, checkpoint, concurrency, rate, cache=None):
+    """并发请求，每完成一首立即写入断点文件，返回失败数"""
+    from src.async_fetch import fetch_all
+
+    total = len(items)
+    finished = [0]
+    failed = [0]
+
+    def on_result(index, item, data, error):
+        finished[0] += 1
+        input_info = {"title": item['title'], "author": item['author']}
+        if error is None and not data:
+            error = ValueError("LLM 返回为空")
+        if error is None:
+            checkpoint.append(input_info, versions=data)
+            metrics.incr("poems_fetched")
+            print(f"[{finished[0]}/{total}] ✅ {item['title']} - {item['author']}")
+        else:
+            checkpoint.append(input_info, error=error)
+            metrics.incr("poems_failed")
+            failed[0] += 1
+            print(f"[{finished[0]}/{total}] ❌ 获取失败: {item['title']}. 错误: {error}")
+
+    print(f"⚡ 并发采集: 最多 {concurrency} 个请求同时进行" + (f"，限速 {rate} 次/秒" if rate else ""))
+    start = time.perf_counter()
+    fetch_all(items, concurrency=concurrency, rate=rate, on_result=on_result, cache=cache,
+              keep_results=False)
+    print(f"⏱️ 采集耗时 {time.perf_counter() - start:.1f} 秒")
+
+    return failed[0]
 
-def step_2_render_from_file():
+
+def step_2_render_from_file(workers=1, force=False, review_file=None, render_options=None, validate=False,
+                            queue=None):
     """
-    第二步：读取本地 JSON (可能被人工改过)，批量生成图片。
+    第二步：读取本地校验文件 (可能被人工改过)，批量生成图片。
+    校验文件逐条流式读取，.json 与 .jsonl 均可。
+    每个输出目录下的 manifest.json 记录了每张卡片的内容指纹，内容未变且图片还在的卡片会被跳过。
+    :param workers: 渲染进程数；大于 1 时把 (诗, 语言) 任务分发到进程池并行渲染
+    :param force: 忽略清单，全部重新渲染
+    :param render_options: DynamicRenderer 的参数 (输出格式、后台编码线程等)，默认 RENDER_OPTIONS
+    :param validate: 渲染前做语言校验，跳过未通过的卡片
+    :param queue: 任务队列文件路径；给出时只把任务写入队列，由 worker 命令 (可在多台机器上) 渲染
+    :return: 渲染失败的卡片数 (入队模式下为 0)
     """
+    from src.render_pool import render_jobs
+    from src.manifest import ManifestTracker
+
+    review_file = review_file or REVIEW_FILE
+    render_options = RENDER_OPTIONS if render_options is None else render_options
     print("\n🎨 进入【阶段二：视觉渲染】...")
 
-    if not os.path.exists(REVIEW_FILE):
-        print(f"❌ 找不到校验文件: {REVIEW_FILE}")
+    if not os.path.exists(review_file):
+        print(f"❌ 找不到校验文件: {review_file}")
         print("请先运行第一步生成数据。")
-        return
+        return 1
+
+    if queue is not None:
+        return _enqueue_render_jobs(queue, force, review_file, render_options, validate)
+
+    print(f"📂 逐条读取 {review_file}，开始渲染...")
+    if workers > 1:
+        print(f"⚙️ 使用 {workers} 个进程并行渲染...")
+
+    tracker = ManifestTracker()
+    stats = {"poems": 0, "skipped": 0}
+
+    def on_done(job, err):
+        output_dir, filename, digest = job["manifest"]
+        tracker.done(output_dir, filename, digest, ok=err is None, files=_page_names(job))
+
+    start = time.perf_counter()
+    try:
+        jobs = _iter_render_jobs(iter_review_records(review_file), tracker, force, stats, render_options,
+                                 validator=_make_validator(validate))
+        done, failures = render_jobs(jobs, workers=workers, renderer_kwargs=render_options,
+                                     on_done=on_done, fonts=_warm_fonts())
+    finally:
+        tracker.close()
+    elapsed = time.perf_counter() - start
+
+    if stats["skipped"]:
+        print(f"⏩ {stats['skipped']} 张卡片内容未变化，跳过")
+    if stats.get("invalid"):
+        print(f"⚠️ {stats['invalid']} 张卡片未通过语言校验，未渲染")
+    print(f"\n📊 渲染完成: {stats['poems']} 首诗，成功 {done} 张，失败 {len(failures)} 张，耗时 {elapsed:.1f} 秒")
+    for path, err in failures:
+        print(f"❌ 渲染失败: {path}\n{err}")
+
+    print("\n✨ 全部渲染完成！请查看 output 目录。")
+    return len(failures)
+
+
+def _enqueue_render_jobs(queue_path, force, review_file, render_options, validate):
+    """第二步的入队模式：任务连同渲染参数写入队列，输出清单在卡片完成后由队列登记"""
+    from src.manifest import ManifestTracker
+    from src.render_queue import RenderQueue
+
+    queue = RenderQueue(queue_path)
+    # 先登记上一轮已完成的卡片，清单是最新的，才能正确跳过内容未变化的卡片
+    queue.sync_manifests()
+    print(f"📂 逐条读取 {review_file}，写入任务队列 {queue_path} ...")
+
+    tracker = ManifestTracker()
+    stats = {"poems": 0, "skipped": 0}
+
+    def with_options(jobs):
+        for job in jobs:
+            job["render_options"] = render_options
+            yield job
 
-    # 读取校验后的数据
-    with open(REVIEW_FILE, 'r', encoding='utf-8') as f:
-        tasks = json.load(f)
+    try:
+        jobs = _iter_render_jobs(iter_review_records(review_file), tracker, force, stats, render_options,
+                                 validator=_make_validator(validate))
+        added = queue.enqueue(with_options(jobs), force=force)
+    finally:
+        tracker.close()
+    counts = queue.counts()
+    queue.close()
 
-    print(f"📂 读取到 {len(tasks)} 个任务，开始渲染...")
+    if stats["skipped"]:
+        print(f"⏩ {stats['skipped']} 张卡片内容未变化，跳过")
+    if stats.get("invalid"):
+        print(f"⚠️ {stats['invalid']} 张卡片未通过语言校验，未入队")
+    print(f"\n📥 入队完成: {stats['poems']} 首诗，新增 {added} 个任务，队列中待办 {counts.get('pending', 0)} 个")
+    print(f"👉 在每台渲染机器的项目目录下运行: python main.py worker --queue {queue_path} --workers <进程数>")
+    return 0
 
-    renderer = DynamicRenderer()
+
+def step_worker(queue_path, workers=1, lease_seconds=60, claim_batch=1):
+    """
+    队列工作进程：从任务队列领取卡片渲染，直到队列清空。可以在多台机器上同时运行。
+    :param workers: 本机启动的工作进程数
+    :param lease_seconds: 租约时长；工作进程崩溃后最多这么久，它手上的任务会被别人接手
+    :return: 本机渲染失败的卡片数
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from src.render_queue import RenderQueue, run_worker
+
+    if not os.path.exists(queue_path):
+        print(f"❌ 找不到任务队列: {queue_path}")
+        return 1
+    print(f"\n🛠️ 进入【队列渲染】{queue_path}，本机 {workers} 个工作进程，租约 {lease_seconds} 秒...")
+
+    start = time.perf_counter()
+    if workers <= 1:
+        results = [run_worker(queue_path, lease_seconds=lease_seconds, claim_batch=claim_batch)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_worker, queue_path, lease_seconds=lease_seconds, claim_batch=claim_batch)
+                       for _ in range(workers)]
+            results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    done = sum(r["done"] for r in results)
+    failed = sum(r["failed"] for r in results)
+    lost = sum(r["lost"] for r in results)
+    print(f"\n📊 本机完成 {done} 张，失败 {failed} 次，租约被接手 {lost} 张，耗时 {elapsed:.1f} 秒"
+          f" ({done / elapsed if elapsed else 0:.2f} 张/秒)")
+
+    queue = RenderQueue(queue_path)
+    synced = queue.sync_manifests()
+    queue.close()
+    if synced:
+        print(f"📝 已把 {synced} 张完成的卡片写入输出清单")
+    return failed
+
+
+def step_queue_status(queue_path):
+    """
+    查看任务队列进度，并把已完成的卡片登记到各输出目录的清单。
+    :return: 最终失败 (不再重试) 的任务数
+    """
+    from src.render_queue import RenderQueue
+
+    if not os.path.exists(queue_path):
+        print(f"❌ 找不到任务队列: {queue_path}")
+        return 1
+    queue = RenderQueue(queue_path)
+    synced = queue.sync_manifests()
+    counts = queue.counts()
+    failures = queue.failures()
+    queue.close()
+
+    labels = [("pending", "待领取"), ("leased", "渲染中"), ("expired", "租约过期待接手"),
+              ("done", "已完成"), ("failed", "失败")]
+    print(f"\n📋 任务队列 {queue_path}: " + "，".join(f"{name} {counts.get(state, 0)}" for state, name in labels))
+    if synced:
+        print(f"📝 已把 {synced} 张完成的卡片写入输出清单")
+    for job_id, err in failures:
+        print(f"❌ {job_id}\n{err}")
+    return len(failures)
+
+
+def step_serve(host="127.0.0.1", port=8765, workers=2, render_options=None, output_dir="./output/service"):
+    """
+    常驻渲染服务：工作进程预热一次，之后按 HTTP 请求渲染单张卡片，Ctrl+C 退出。
+    :return: 进程退出码
+    """
+    from src.render_service import RenderService, run_service
+    from src.font_registry import get_registry
+
+    registry = get_registry()
+
+    def choose_fonts(lang, data):
+        return FONT_CONFIG[lang], _fallback_fonts(lang, data, registry)[0]
+
+    render_options = dict(RENDER_OPTIONS if render_options is None else render_options, encode_threads=0)
+    service = RenderService(choose_fonts, FONT_CONFIG, workers=workers, render_options=render_options,
+                            output_dir=output_dir, warm_fonts=_warm_fonts())
+    return run_service(service, host, port)
+
+
+def step_pipeline(concurrency=4, workers=1, queue_size=8, cache=None, force=False, review_file=None,
+                  render_options=None, validate=False):
+    """
+    快速通道：采集与渲染流水线并行，不经过人工校验 (适合已经校对过、重新生成的诗歌)。
+    采集线程把结果放进有界队列，渲染端边取边画，第 N 首渲染时第 N+1 首已在请求。
+    已有数据的诗 (校验文件里的记录，或断点文件里已成功的) 不再请求，直接按已有内容渲染，人工修改不会被覆盖；
+    只采集缺失和失败的诗，新采集的写入断点文件并追加到校验文件末尾，之后仍可人工修改再运行第二步。
+    :param concurrency: 采集线程数
+    :param workers: 渲染进程数
+    :param queue_size: 已采集、等待渲染的诗歌上限 (背压)，内存占用与诗歌总数无关
+    :param validate: 渲染前做语言校验，跳过未通过的卡片 (跳过人工校验时建议开启)
+    :return: 采集失败与渲染失败的总数
+    """
+    from src.pipeline import FetchPipeline
+    from src.llm_client import fetch_poem_data_v2
+    from src.render_pool import render_jobs
+    from src.manifest import ManifestTracker
+
+    review_file = review_file or REVIEW_FILE
+    render_options = RENDER_OPTIONS if render_options is None else render_options
+    print("\n⚡ 进入【流水线：采集 + 渲染】(跳过人工校验)...")
+
+    # 已有数据的诗不再请求：校验文件里的记录 (可能人工改过) 原样渲染，
+    # 断点文件里成功但还没进校验文件的也直接使用；只采集缺失和失败的诗
+    checkpoint = CollectionCheckpoint(CHECKPOINT_FILE)
+    wanted = {(item['title'], item['author']) for item in POEM_DATA_SOURCE}
+    reviewed = set()
+    if os.path.exists(review_file):
+        reviewed = {record_key(rec['input_info']) for rec in iter_review_records(review_file)} & wanted
+    status = checkpoint.load_status()
+    collected = {key for key, st in status.items() if st == "ok" and key in wanted} - reviewed
+    pending = [item for item in POEM_DATA_SOURCE if (item['title'], item['author']) not in reviewed | collected]
+    print(f"📋 计划处理 {len(POEM_DATA_SOURCE)} 首诗歌：已有数据 {len(reviewed) + len(collected)} 首直接渲染，"
+          f"需要采集 {len(pending)} 首")
+    print(f"⚙️ 采集线程 {concurrency}，渲染进程 {workers}，队列上限 {queue_size}")
+
+    tracker = ManifestTracker()
+    stats = {"poems": 0, "skipped": 0, "fetched": 0, "fetch_failed": 0}
+
+    def fetch(item):
+        data = fetch_poem_data_v2(item['title'], item['author'], cache=cache)
+        if not data:
+            raise ValueError("LLM 返回为空")
+        return data
+
+    pipe = FetchPipeline(pending, fetch, concurrency=concurrency, queue_size=queue_size)
+
+    def existing_records():
+        if reviewed:
+            for rec in iter_review_records(review_file):
+                if record_key(rec['input_info']) in reviewed:
+                    yield rec
+        if collected:
+            for rec in checkpoint.iter_ok_records():
+                if record_key(rec['input_info']) in collected:
+                    yield rec
+
+    def fetched_records():
+        for item, data, error in pipe:
+            input_info = {"title": item['title'], "author": item['author']}
+            if error is not None:
+                checkpoint.append(input_info, error=error)
+                metrics.incr("poems_failed")
+                stats["fetch_failed"] += 1
+                print(f"❌ 获取失败: {item['title']}. 错误: {error}")
+                continue
+            checkpoint.append(input_info, versions=data)
+            metrics.incr("poems_fetched")
+            stats["fetched"] += 1
+            yield {"input_info": input_info, "versions": data}
+
+    def on_done(job, err):
+        output_dir, filename, digest = job["manifest"]
+        tracker.done(output_dir, filename, digest, ok=err is None, files=_page_names(job))
+
+    start = time.perf_counter()
+    # 先启动采集线程：渲染已有数据的同时，缺失的诗已经在请求
+    pipe.start()
+    try:
+        records = itertools.chain(existing_records(), fetched_records())
+        jobs = _iter_render_jobs(records, tracker, force, stats, render_options,
+                                 validator=_make_validator(validate))
+        done, failures = render_jobs(jobs, workers=workers, renderer_kwargs=render_options,
+                                     on_done=on_done, fonts=_warm_fonts())
+    finally:
+        pipe.close()
+        tracker.close()
+    elapsed = time.perf_counter() - start
+
+    # 新采集的诗追加到校验文件末尾，已有的记录 (人工修改) 保持不动
+    count = checkpoint.export_review(review_file, merge=True)
+
+    if stats["skipped"]:
+        print(f"⏩ {stats['skipped']} 张卡片内容未变化，跳过")
+    if stats.get("invalid"):
+        print(f"⚠️ {stats['invalid']} 张卡片未通过语言校验，未渲染")
+    for path, err in failures:
+        print(f"❌ 渲染失败: {path}\n{err}")
+    print(f"\n📊 流水线完成: 渲染 {stats['poems']} 首，其中新采集 {stats['fetched']} 首 (采集失败 {stats['fetch_failed']})，"
+          f"渲染成功 {done} 张，失败 {len(failures)} 张，耗时 {elapsed:.1f} 秒")
+    if elapsed > 0:
+        print(f"🚄 吞吐: {stats['poems'] / elapsed:.2f} 首/秒，{done / elapsed:.2f} 张/秒；"
+              f"渲染端等待采集 {pipe.starved_s:.1f} 秒，采集端因队列已满阻塞 {pipe.blocked_s:.1f} 秒")
+    print(f"💾 校验文件 {review_file} 共 {count} 首诗 (已有的记录未改动)")
+    return stats["fetch_failed"] + len(failures)
+
+
+def step_validate(workers=1, review_file=None, use_cache=True):
+    """
+    校验：检查校验文件里每个语言块是否真的是对应语言 (fr 里不是英文、zh_tw 里不是简体等)。
+    先按 Unicode 文字区间判断，只有拉丁文字的疑难情况才调用 langdetect；结论按内容哈希缓存。
+    同时检查缺字：该语言的整条字体链 (主字体 + 后备字体) 都没有的字符。
+    :param workers: 并行校验的进程数
+    :return: 未通过校验的语言块数 + 有缺字的语言块数
+    """
+    from src.lang_check import validate_records, VerdictCache
+    from src.font_registry import get_registry
+
+    review_file = review_file or REVIEW_FILE
+    print("\n🔍 进入【语言校验】...")
+    if not os.path.exists(review_file):
+        print(f"❌ 找不到校验文件: {review_file}")
+        return 1
+
+    cache = VerdictCache() if use_cache else None
+    registry = get_registry()
+    start = time.perf_counter()
+    poems = blocks = 0
+    problems = []
+    missing_glyphs = []
+
+    def check_fonts(records):
+        # 在记录交给语言校验之前顺便查缺字，只读一遍文件
+        for rec in records:
+            for lang, block in rec['versions'].items():
+                if lang in FONT_CONFIG and isinstance(block, dict):
+                    text = f"{block.get('title', '')}— {block.get('author', '')}{block.get('content', '')}"
+                    lost = registry.uncovered(text, font_chain(lang))
+                    if lost:
+                        missing_glyphs.append((rec['input_info'], lang, lost))
+            yield rec
+
+    for input_info, verdicts in validate_records(check_fonts(iter_review_records(review_file)),
+                                                 workers=workers, cache=cache):
+        poems += 1
+        for lang, verdict in verdicts.items():
+            blocks += 1
+            if not verdict["ok"]:
+                problems.append((input_info, lang, verdict))
+    elapsed = time.perf_counter() - start
+
+    for input_info, lang, verdict in problems:
+        print(f"⚠️ {input_info['title']} - {input_info['author']} [{lang}]: "
+              f"判定为 {verdict['detected']}，{verdict['reason']}")
+    for input_info, lang, lost in missing_glyphs:
+        print(f"🔤 {input_info['title']} - {input_info['author']} [{lang}]: "
+              f"{len(lost)} 个字符所有字体都没有: {_preview(lost)}")
+    print(f"\n📊 校验完成: {poems} 首诗，{blocks} 个语言块，{len(problems)} 个可疑，"
+          f"{len(missing_glyphs)} 个缺字，耗时 {elapsed:.2f} 秒")
+    if problems:
+        print(f"👉 请在 {review_file} 中修正上述语言块后再运行第二步 (或用 --validate 在渲染时跳过它们)。")
+    if missing_glyphs:
+        print("👉 缺字的语言块请把生僻字换成常用写法，或在 FONT_FALLBACKS 中补充覆盖这些字的字体。")
+    return len(problems) + len(missing_glyphs)
+
+
+def step_layout(review_file=None, render_options=None):
+    """
+    排版预演 (dry-run)：按当前渲染参数给校验文件里的每张卡片排版，不栅格化、不写任何文件。
+    逐张报告正文字号、正文高度和画布高度 (分页时每页一个)，最后汇总字号分布。
+    :return: 0 (预演只是报告；缺字等问题由 validate 检查)
+    """
+    from collections import Counter
+    from src.renderer import DynamicRenderer
+    from src.font_registry import get_registry
+
+    review_file = review_file or REVIEW_FILE
+    print("\n📐 进入【排版预演】(只排版，不画图)...")
+    if not os.path.exists(review_file):
+        print(f"❌ 找不到校验文件: {review_file}")
+        return 1
+
+    render_options = dict(render_options or RENDER_OPTIONS, encode_threads=0)
+    renderer = DynamicRenderer(verbose=False, **render_options)
+    registry = get_registry()
+    sizes = Counter()
+    cards = tall = paginated = 0
+    start = time.perf_counter()
+    for task in iter_review_records(review_file):
+        title_str = task['input_info']['title']
+        for lang_code, lang_data in task['versions'].items():
+            if lang_code not in FONT_CONFIG:
+                continue
+            render_data = _card_data(lang_data)
+            fallback_fonts, _ = _fallback_fonts(lang_code, render_data, registry)
+            plan = renderer.plan(render_data, FONT_CONFIG[lang_code], 40, fallback_fonts)
+            heights = [page['canvas_height'] for page in plan['pages']]
+            cards += 1
+            sizes[plan['font_size']] += 1
+            tall += heights[-1] > 1660 or len(heights) > 1
+            paginated += len(heights) > 1
+            print(f"  {title_str} [{lang_code}] 字号 {plan['font_size']}，正文 {int(plan['body_height'])} px，"
+                  f"画布 {' + '.join(map(str, heights))} px")
+    renderer.close()
+    elapsed = time.perf_counter() - start
+
+    size_str = "，".join(f"{size} 号 {n} 张" for size, n in sorted(sizes.items()))
+    print(f"\n📊 预演完成: {cards} 张卡片，耗时 {elapsed:.2f} 秒")
+    print(f"   字号分布: {size_str or '无'}")
+    print(f"   超出标准 1660 px 高度: {tall} 张，其中分页: {paginated} 张")
+    return 0
+
+
+def _make_validator(validate):
+    if not validate:
+        return None
+    from src.lang_check import LanguageValidator, VerdictCache
+    return LanguageValidator(VerdictCache())
+
+
+def _page_names(job):
+    """实际写出的文件名 (超长分页时为 ru_1.jpg、ru_2.jpg ...)"""
+    return [os.path.basename(path) for path in job.get("pages") or ()]
+
+
+def _warm_fonts():
+    """所有字体 (含后备字体) × (标题 75、作者 38、正文 40)，供工作进程预热"""
+    paths = {path for lang in FONT_CONFIG for path in font_chain(lang)}
+    return {(path, size) for path in paths for size in (75, 38, 40)}
+
+
+def _preview(chars, limit=10):
+    chars = sorted(chars)
+    return "".join(chars[:limit]) + (" ..." if len(chars) > limit else "")
+
+
+def _card_data(lang_data):
+    # 获取内容 (如果人工在JSON里改了，这里读到的就是改过的)
+    return {
+        "title": lang_data.get('title', 'Unknown'),
+        "author": lang_data.get('author', 'Unknown'),
+        "content": lang_data.get('content', '')
+    }
+
+
+def _fallback_fonts(lang_code, render_data, registry):
+    """
+    主字体缺字时才带上后备字体 (也才计入指纹)；整条字体链都没有的字会画成方框，需要提前提示。
+    :return: (后备字体元组, 整条字体链都没有的字符集合)
+    """
+    text = f"{render_data['title']}— {render_data['author']}{render_data['content']}"
+    if not registry.missing(text, FONT_CONFIG[lang_code]):
+        return (), set()
+    return tuple(FONT_FALLBACKS.get(lang_code, ())), registry.uncovered(text, font_chain(lang_code))
+
+
+def _iter_render_jobs(tasks, tracker, force, stats, render_options, validator=None):
+    """
+    把每首诗展开成独立的 (诗, 语言) 渲染任务，边读边产出
+    :param validator: 可选的 LanguageValidator，未通过语言校验的卡片不渲染
+    """
+    from src.manifest import card_hash
+    from src.font_registry import get_registry
+
+    registry = get_registry()
+    output_format = render_options.get("output_format") or {}
+    extension = FORMATS[output_format.get("format", "jpeg")][1]
+    # 编码线程数之类不影响图片内容的参数不计入指纹
+    hash_options = {k: v for k, v in render_options.items()
+                    if k not in ("encode_threads", "encode_queue", "glyph_cache", "glyph_cache_bytes")}
 
     for task in tasks:
+        stats["poems"] += 1
         # 解包数据
         input_info = task['input_info']
         versions = task['versions']  # 这是那 6 个语言的字典
 
         title_str = input_info['title']
-        print(f"\nProcessing: {title_str}...")
 
         # 创建输出目录
         safe_title = title_str.replace(" ", "_")
         output_dir = f"./output/{safe_title}_多语言组图"
         os.makedirs(output_dir, exist_ok=True)
+        manifest = tracker.open(output_dir)
 
         # 保存文案 (如果有)
         if "xhs_copy" in versions:
             with open(f"{output_dir}/小红书文案.txt", 'w', encoding='utf-8') as f:
                 f.write(versions["xhs_copy"])
 
-        # 遍历语言生成图片
+        # 遍历语言生成任务
         # 过滤掉非语言的字段 (如 input_info, xhs_copy)
         valid_langs = [k for k in versions.keys() if k in FONT_CONFIG]
 
         for lang_code in valid_langs:
             lang_data = versions[lang_code]
 
-            # 获取内容 (如果人工在JSON里改了，这里读到的就是改过的)
-            poem_title = lang_data.get('title', 'Unknown')
-            poem_author = lang_data.get('author', 'Unknown')
-            poem_content = lang_data.get('content', '')
+            if validator is not None:
+                verdict = validator.check(lang_code, lang_data)
+                if not verdict["ok"]:
+                    stats["invalid"] = stats.get("invalid", 0) + 1
+                    print(f"⚠️ 跳过 {title_str} [{lang_code}]: 语言校验未通过 ({verdict['reason']})")
+                    continue
 
-            render_data = {
-                "title": poem_title,
-                "author": poem_author,
-                "content": poem_content
+            render_data = _card_data(lang_data)
+            font_path = FONT_CONFIG[lang_code]
+            fallback_fonts, lost = _fallback_fonts(lang_code, render_data, registry)
+            if lost:
+                print(f"⚠️ {title_str} [{lang_code}]: {len(lost)} 个字符所有字体都没有: {_preview(lost)}")
+
+            filename = f"{lang_code}{extension}"
+            digest = card_hash(render_data, font_path, 40, hash_options, fallback_fonts)
+            if not force and manifest.is_fresh(filename, digest):
+                stats["skipped"] += 1
+                continue
+
+            tracker.expect(output_dir)
+            yield {
+                "data": render_data,
+                "font_path": font_path,
+                "fallback_fonts": fallback_fonts,
+                "output_path": f"{output_dir}/{filename}",
+                "font_size": 40,
+                "manifest": (output_dir, filename, digest)
             }
 
-            output_path = f"{output_dir}/{lang_code}.jpg"
-            font_path = FONT_CONFIG[lang_code]
+        tracker.seal(output_dir)
 
-            renderer.render(
-                data=render_data,
-                font_path=font_path,
-                output_path=output_path,
-                font_size=40
-            )
+    if validator is not None:
+        validator.flush()
 
-    print("\n✨ 全部渲染完成！请查看 output 目录。")
 
+def _add_common_options(parser, defaults=True):
+    """
+    defaults=False 时子命令里的选项默认值为 SUPPRESS：没有在子命令后写出的选项沿用顶层解析的值，
+    因此 `main.py --workers 8 render` 与 `main.py render --workers 8` 等价。
+    """
+    d = (lambda v: v) if defaults else (lambda v: argparse.SUPPRESS)
+    parser.add_argument("--review-file", default=d(REVIEW_FILE),
+                        help="校验文件路径，.json 或 .jsonl (大语料推荐 .jsonl)")
+    parser.add_argument("--workers", type=int, default=d(1),
+                        help="并行渲染 / 校验的进程数 (默认 1，即串行)")
+    parser.add_argument("--metrics-jsonl", metavar="PATH", default=d(None),
+                        help="开启运行指标，并把本次运行的汇总追加到该 JSONL 文件")
+    parser.add_argument("--metrics-prom", metavar="PATH", default=d(None),
+                        help="开启运行指标，并写出 Prometheus textfile (供 node_exporter 采集)")
+
+
+def _add_fetch_options(parser, defaults=True):
+    d = (lambda v: v) if defaults else (lambda v: argparse.SUPPRESS)
+    parser.add_argument("--concurrency", type=int, default=d(1),
+                        help="同时在途的 LLM 请求数 (默认 1，即串行)")
+    parser.add_argument("--rate", type=float, default=d(None),
+                        help="每秒最多发起的 LLM 请求数 (默认不限速)")
+    parser.add_argument("--stream", action="store_true", default=d(False),
+                        help="(串行采集) 使用流式响应，语言块逐个到达并校验")
+    parser.add_argument("--no-cache", action="store_true", default=d(False),
+                        help="不使用 LLM 响应缓存")
+    parser.add_argument("--cache-ttl", type=float, default=d(None),
+                        help="响应缓存的有效期 (小时)，默认永不过期")
+    parser.add_argument("--refresh", action="store_true", default=d(False),
+                        help="忽略已有缓存，重新请求并覆盖")
+
+
+def _template_name(value):
+    """--bg-template 的参数检查：模板名或图片路径须存在"""
+    from src.template_bg import template_path
+    try:
+        template_path(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def _add_render_options(parser, defaults=True):
+    d = (lambda v: v) if defaults else (lambda v: argparse.SUPPRESS)
+    parser.add_argument("--force", action="store_true", default=d(False),
+                        help="忽略输出清单，全部重新渲染")
+    parser.add_argument("--format", choices=sorted(FORMATS), default=d("jpeg"),
+                        help="输出图片格式 (默认 jpeg)")
+    parser.add_argument("--quality", type=int, default=d(95), help="JPEG/WebP 质量 (默认 95)")
+    parser.add_argument("--optimize", action="store_true", default=d(False),
+                        help="JPEG/PNG 优化编码 (文件更小，编码更慢)")
+    parser.add_argument("--progressive", action="store_true", default=d(False), help="输出渐进式 JPEG")
+    parser.add_argument("--subsampling", type=int, choices=(0, 1, 2), default=d(None),
+                        help="JPEG 色度抽样: 0=4:4:4, 1=4:2:2, 2=4:2:0 (默认由 Pillow 决定)")
+    parser.add_argument("--lossless", action="store_true", default=d(False), help="无损 WebP")
+    parser.add_argument("--encode-threads", type=int, default=d(2),
+                        help="串行渲染时后台编码的线程数 (0 表示同步编码)")
+    parser.add_argument("--validate", action="store_true", default=d(False),
+                        help="渲染前做语言校验，跳过语言不符的卡片")
+    parser.add_argument("--glyph-cache", action="store_true", default=d(False),
+                        help="正文使用字形位图缓存绘制 (输出不变，中文长诗明显更快)")
+    parser.add_argument("--max-height", type=int, default=d(None),
+                        help="单张图片的最大高度 (像素，不小于 1660)；超长的诗按段落拆成 ru_1.jpg、ru_2.jpg ...")
+    parser.add_argument("--fit-font", action="store_true", default=d(False),
+                        help="正文字号自适应：取 [--font-min, --font-max] 内能放进标准卡片的最大字号")
+    parser.add_argument("--font-min", type=int, default=d(30), help="自适应字号的下限 (默认 30)")
+    parser.add_argument("--font-max", type=int, default=d(60), help="自适应字号的上限 (默认 60)")
+    parser.add_argument("--line-break", choices=("greedy", "balanced"), default=d("greedy"),
+                        help="正文断行: greedy 逐行塞满 (默认)，balanced 行数不变、各行宽度尽量均匀")
+    parser.add_argument("--bg-tiled", action="store_true", default=d(False),
+                        help="背景改用预先合成的无缝图块拼接 (长诗生成背景快得多，颗粒与渐变有肉眼不可见的差别)")
+    parser.add_argument("--bg-template", type=_template_name, default=d(None), metavar="NAME",
+                        help="改用 assets/templates 下的模板背景 (模板名或图片路径)，如 paper_clean")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="诗歌卡片生成器。不带子命令时进入交互菜单；定时任务请使用子命令。")
+    _add_common_options(parser)
+    _add_fetch_options(parser)
+    _add_render_options(parser)
+    parser.add_argument("--queue-size", type=int, default=8,
+                        help="流水线模式中已采集、等待渲染的诗歌上限 (默认 8)")
+
+    sub = parser.add_subparsers(dest="command", metavar="命令")
+
+    p = sub.add_parser("fetch", help="阶段一：采集多语言数据，写入断点文件并导出校验文件")
+    _add_common_options(p, defaults=False)
+    _add_fetch_options(p, defaults=False)
+
+    p = sub.add_parser("render", help="阶段二：读取 (人工校对过的) 校验文件，批量生成图片")
+    _add_common_options(p, defaults=False)
+    _add_render_options(p, defaults=False)
+    p.add_argument("--queue", metavar="PATH", default=None,
+                   help="只把任务写入该队列文件，由 worker 命令在一台或多台机器上渲染")
+
+    p = sub.add_parser("worker", help="从任务队列领取卡片渲染，可在多台机器上同时运行")
+    _add_common_options(p, defaults=False)
+    p.add_argument("--queue", metavar="PATH", default=DEFAULT_QUEUE, help=f"任务队列文件 (默认 {DEFAULT_QUEUE})")
+    p.add_argument("--lease", type=float, default=60,
+                   help="任务租约秒数，工作进程崩溃后最多这么久任务会被别人接手 (默认 60)")
+    p.add_argument("--claim-batch", type=int, default=1, help="每次领取的任务数 (默认 1)")
+
+    p = sub.add_parser("queue-status", help="查看任务队列进度，并把完成的卡片登记到输出清单")
+    p.add_argument("--queue", metavar="PATH", default=DEFAULT_QUEUE, help=f"任务队列文件 (默认 {DEFAULT_QUEUE})")
+
+    p = sub.add_parser("validate", help="检查校验文件中各语言块是否为对应语言 (有可疑项时退出码为 1)")
+    _add_common_options(p, defaults=False)
+
+    p = sub.add_parser("pipeline", help="采集后直接渲染，跳过人工校验 (适合已校对过的诗歌)")
+    _add_common_options(p, defaults=False)
+    _add_fetch_options(p, defaults=False)
+    _add_render_options(p, defaults=False)
+    p.add_argument("--queue-size", type=int, default=argparse.SUPPRESS,
+                   help="已采集、等待渲染的诗歌上限 (默认 8)")
+
+    p = sub.add_parser("layout", help="排版预演 (dry-run)：只排版不画图，报告每张卡片的字号和高度")
+    _add_common_options(p, defaults=False)
+    _add_render_options(p, defaults=False)
 
-def main():
+    p = sub.add_parser("serve", help="常驻本地渲染服务：预热后按 HTTP 请求渲染单张卡片")
+    _add_common_options(p, defaults=False)
+    _add_render_options(p, defaults=False)
+    p.add_argument("--host", default="127.0.0.1", help="监听地址 (默认只监听本机)")
+    p.add_argument("--port", type=int, default=8765, help="监听端口 (默认 8765)")
+    p.add_argument("--output-dir", default="./output/service", help="服务生成的图片目录 (按卡片指纹命名)")
+
+    sub.add_parser("menu", help="交互菜单 (与不带子命令相同)")
+    return parser
+
+
+def parse_args(argv=None):
+    return build_parser().parse_args(argv)
+
+
+def export_metrics(args, command):
+    """按命令行参数导出本次运行的指标 (未开启时什么也不做)"""
+    if not metrics.is_enabled():
+        return
+    if args.metrics_jsonl:
+        metrics.export_jsonl(args.metrics_jsonl, {"command": command})
+    if args.metrics_prom:
+        metrics.export_prometheus(args.metrics_prom)
+    print(f"📈 运行指标已导出")
+
+
+def make_cache(args):
+    if args.no_cache:
+        return None
+    from src.llm_cache import ResponseCache
+    ttl = args.cache_ttl * 3600 if args.cache_ttl is not None else None
+    return ResponseCache(ttl=ttl, refresh=args.refresh)
+
+
+def render_options_from_args(args):
+    output_format = {"format": args.format, "quality": args.quality, "optimize": args.optimize,
+                     "progressive": args.progressive, "subsampling": args.subsampling,
+                     "lossless": args.lossless}
+    options = {"output_format": output_format, "encode_threads": args.encode_threads,
+               "glyph_cache": args.glyph_cache}
+    if args.max_height is not None:
+        # 不分页时不写入，保持卡片指纹与以前一致
+        options["max_height"] = args.max_height
+    if args.fit_font:
+        options["font_fit"] = [args.font_min, args.font_max]
+    if args.line_break != "greedy":
+        # 默认断行不写入，保持卡片指纹与以前一致
+        options["line_break"] = args.line_break
+    if args.bg_tiled:
+        # 不用图块时不写入，保持卡片指纹与以前一致
+        options["bg_tiled"] = True
+    if args.bg_template:
+        options["bg_template"] = args.bg_template
+    return options
+
+
+def run_command(args, command):
+    """执行一个子命令，返回进程退出码 (0 表示全部成功)"""
+    if command == "fetch":
+        failed = step_1_fetch_and_save(concurrency=args.concurrency, rate=args.rate, cache=make_cache(args),
+                                       review_file=args.review_file, stream=args.stream)
+    elif command == "render":
+        failed = step_2_render_from_file(workers=args.workers, force=args.force, review_file=args.review_file,
+                                         render_options=render_options_from_args(args), validate=args.validate,
+                                         queue=getattr(args, "queue", None))
+    elif command == "pipeline":
+        failed = step_pipeline(concurrency=max(args.concurrency, 2), workers=args.workers,
+                               queue_size=args.queue_size, cache=make_cache(args), force=args.force,
+                               review_file=args.review_file, render_options=render_options_from_args(args),
+                               validate=args.validate)
+    elif command == "validate":
+        failed = step_validate(workers=args.workers, review_file=args.review_file)
+    elif command == "worker":
+        failed = step_worker(args.queue, workers=args.workers, lease_seconds=args.lease,
+                             claim_batch=args.claim_batch)
+    elif command == "queue-status":
+        failed = step_queue_status(args.queue)
+    elif command == "serve":
+        failed = step_serve(host=args.host, port=args.port, workers=max(args.workers, 1),
+                            render_options=render_options_from_args(args), output_dir=args.output_dir)
+    elif command == "layout":
+        failed = step_layout(review_file=args.review_file, render_options=render_options_from_args(args))
+    else:
+        raise ValueError(f"未知命令: {command}")
+    export_metrics(args, command)
+    return 1 if failed else 0
+
+
+# 交互菜单的编号 -> 子命令
+MENU_COMMANDS = {"1": "fetch", "2": "render", "3": "pipeline", "4": "validate", "5": "layout"}
+
+
+def interactive_menu(args):
     while True:
         print("\n" + "=" * 30)
         print("   诗歌卡片生成器工作流 v3.0")
         print("=" * 30)
         print("1. [采集] 获取数据 -> 存为 poems_to_review.json")
         print("2. [渲染] 读取 JSON -> 生成最终图片")
+        print("3. [流水线] 采集后直接渲染 (跳过人工校验，适合已校对过的诗歌)")
+        print("4. [校验] 检查 JSON 中各语言块是否为对应语言")
+        print("5. [预演] 只排版不画图，报告每张卡片的字号和高度")
         print("0. 退出")
 
         choice = input("\n请选择模式 (输入数字): ")
 
-        if choice == "1":
-            step_1_fetch_and_save()
-            break  # 执行完一步就退出，强迫你去检查文件
-        elif choice == "2":
-            step_2_render_from_file()
-            break
+        if choice in MENU_COMMANDS:
+            # 执行完一步就退出，强迫你去检查文件
+            return run_command(args, MENU_COMMANDS[choice])
         elif choice == "0":
-            sys.exit()
+            return 0
         else:
             print("输入无效，请重试。")
 
 
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics_jsonl or args.metrics_prom:
+        metrics.enable()
+    if args.command in (None, "menu"):
+        return interactive_menu(args)
+    return run_command(args, args.command)
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
 # import os
 # import json
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import random
+import time
+import openai
+from openai import AsyncOpenAI
+from src import metrics
+from src.llm_client import (MODEL_NAME, SYSTEM_PROMPT, TEMPERATURE, build_user_prompt, response_cache_key,
+                            load_api_config, FetchError)
+
+# 需要重试的 HTTP 状态码：限流 + 服务端错误
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    令牌桶限流器：平均每秒放行 rate 个请求，最多允许 capacity 个突发。
+    rate 为 None 或 0 时不限速。
+    """
+
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate or 1))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def make_async_client(api_key=None, base_url=None, timeout=120):
+    """
+    创建异步客户端。关闭 SDK 自带的重试，统一由 fetch_poem_data_async 做指数退避。
+    base_url 可以指向本地的模拟服务器做测试；不传时读取 .env / 环境变量。
+    """
+    if api_key is None and base_url is None:
+        api_key, base_url = load_api_config()
+    return AsyncOpenAI(api_key=api_key, base_url=base_url if base_url else None,
+                       timeout=timeout, max_retries=0)
+
+
+def _is_retryable(e):
+    if isinstance(e, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code in RETRY_STATUS
+
+
+def _retry_after(e):
+    """读取服务端给出的 Retry-After (秒)，没有则返回 None"""
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def fetch_poem_data_async(client, title, author, limiter=None, max_retries=5,
+                                base_delay=1.0, max_delay=60.0):
+    """
+    异步版 fetch_poem_data_v2。429/5xx/网络错误按指数退避 (带随机抖动) 重试，
+    其它错误或重试耗尽时抛出异常，由调用方决定如何处理。
+    """
+    attempt = 0
+    while True:
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            with metrics.timer("fetch"):
+                response = await client.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": build_user_prompt(title, author)}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=TEMPERATURE
+                )
+            content = response.choices[0].message.content
+            with metrics.timer("parse"):
+                try:
+                    data = json.loads(content or "")
+                except json.JSONDecodeError as e:
+                    raise FetchError("malformed_json", str(e), raw=content) from e
+            if not isinstance(data, dict):
+                raise FetchError("malformed_json", f"返回的不是 JSON 对象: {type(data).__name__}", raw=content)
+            return data
+        except Exception as e:
+            if not _is_retryable(e) or attempt >= max_retries:
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = min(max_delay, base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            attempt += 1
+            metrics.incr("llm_retries")
+            print(f"⏳ {title} 请求失败 ({e.__class__.__name__})，{delay:.1f} 秒后第 {attempt} 次重试...")
+            await asyncio.sleep(delay)
+
+
+async def fetch_all_async(items, concurrency=8, rate=None, max_retries=5, client=None, on_result=None,
+                          cache=None, keep_results=True):
+    """
+    并发采集一批诗歌。
+    :param items: [{"title": ..., "author": ...}, ...]
+    :param concurrency: 同时在途的请求上限
+    :param rate: 每秒最多发起的请求数 (令牌桶)，None 表示不限速
+    :param on_result: 每完成一首就回调 on_result(index, item, data, error)
+    :param cache: 可选的 ResponseCache；命中的条目不占用并发和限速额度，重复条目只请求一次
+    :param keep_results: False 时回调之后不再保留 data (由 on_result 负责落盘)，内存不随诗歌数增长
+    :return: 与 items 顺序一致的 [(data, error), ...]
+    """
+    own_client = client is None
+    client = client or make_async_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = TokenBucket(rate)
+    results = [None] * len(items)
+
+    async def fetch(item):
+        async with semaphore:
+            return await fetch_poem_data_async(client, item['title'], item['author'],
+                                               limiter=limiter, max_retries=max_retries)
+
+    async def worker(index, item):
+        try:
+            if cache is not None:
+                key = response_cache_key(item['title'], item['author'])
+                data = await cache.aget_or_fetch(key, lambda: fetch(item), item['title'], item['author'])
+            else:
+                data = await fetch(item)
+            results[index] = (data, None)
+        except Exception as e:
+            results[index] = (None, e)
+        if on_result is not None:
+            on_result(index, item, *results[index])
+        if not keep_results:
+            results[index] = (None, results[index][1])
+
+    try:
+        await asyncio.gather(*(worker(i, item) for i, item in enumerate(items)))
+    finally:
+        if own_client:
+            await client.close()
+    return results
+
+
+def fetch_all(items, **kwargs):
+    """fetch_all_async 的同步入口"""
+    return asyncio.run(fetch_all_async(items, **kwargs))
@@ -0,0 +1,116 @@
+import json
+import os
+
+
+def record_key(input_info):
+    return input_info['title'], input_info['author']
+
+
+def atomic_write_text(path, write_fn):
+    """
+    先写到同目录的临时文件，fsync 后再 os.replace 覆盖目标文件，
+    中途崩溃也不会留下写了一半的文件。
+    :param write_fn: 接收文件对象的写入函数
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        write_fn(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CollectionCheckpoint:
+    """
+    阶段一的追加式 JSONL 断点文件。每获取完一首诗就立即写入一行：
+        {"input_info": {...}, "status": "ok", "versions": {...}}
+        {"input_info": {...}, "status": "failed", "error": "..."}
+    同一首诗可能出现多行 (失败后重试)，以最后一行为准。
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _iter_lines(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时最后一行可能只写了一半，直接忽略
+                    continue
+
+    def load_status(self):
+        """返回 {(title, author): "ok" | "failed"}，只保存状态，不把正文读进内存"""
+        status = {}
+        for _, rec in self._iter_lines():
+            status[record_key(rec['input_info'])] = rec['status']
+        return status
+
+    def append(self, input_info, versions=None, error=None):
+        rec = {"input_info": input_info}
+        if error is None:
+            rec["status"] = "ok"
+            rec["versions"] = versions
+        else:
+            rec["status"] = "failed"
+            rec["error"] = str(error)
+            # 结构化错误 (如 FetchError) 额外记录类型和已收到的语言块
+            if hasattr(error, "to_dict"):
+                rec["error_detail"] = error.to_dict()
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        if self._ends_torn():
+            # 上次崩溃留下的残行没有换行符，新记录要另起一行，否则会和残行粘成一行一起被丢弃
+            line = "\n" + line
+        # 一次 write 写完整行并立即落盘
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _ends_torn(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def iter_ok_records(self):
+        """按写入顺序逐条产出每首诗最终成功的记录 (input_info + versions)"""
+        last_line = {}
+        for line_no, rec in self._iter_lines():
+            last_line[record_key(rec['input_info'])] = (line_no, rec['status'])
+        keep = {line_no for line_no, st in last_line.values() if st == "ok"}
+
+        for line_no, rec in self._iter_lines():
+            if line_no in keep:
+                yield {"input_info": rec['input_info'], "versions": rec['versions']}
+
+    def export_review(self, review_path, merge=False):
+        """
+        把成功的记录导出为人工校验用的文件 (.json 或 .jsonl，见 src.review_io)。
+        逐条写出，内存占用与诗歌总数无关；通过临时文件原子替换。
+        :param merge: 校验文件已存在时，其中的记录 (可能已人工修改) 原样保留，只在末尾追加文件里还没有的诗；
+                      没有新诗时不改动文件
+        :return: 校验文件中的记录数
+        """
+        from src.review_io import iter_review_records, write_review_records
+        if not (merge and os.path.exists(review_path)):
+            return write_review_records(review_path, self.iter_ok_records())
+
+        existing = {record_key(rec['input_info']) for rec in iter_review_records(review_path)}
+        if all(record_key(rec['input_info']) in existing for rec in self.iter_ok_records()):
+            return len(existing)
+
+        def merged():
+            yield from iter_review_records(review_path)
+            for rec in self.iter_ok_records():
+                if record_key(rec['input_info']) not in existing:
+                    yield rec
+
+        return write_review_records(review_path, merged())
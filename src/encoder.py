@@ -0,0 +1,110 @@
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from src import metrics
+
+# 输出格式 -> (Pillow 格式名, 扩展名)
+FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+    "png": ("PNG", ".png"),
+}
+
+# 命令行里的 0/1/2 与 Pillow 的色度抽样写法对应
+SUBSAMPLING = {0: "4:4:4", 1: "4:2:2", 2: "4:2:0"}
+
+
+class ImageEncoder:
+    """
+    图片编码/写盘阶段。
+    - 格式可选 JPEG (可优化、渐进式、指定色度抽样)、WebP (有损/无损)、PNG
+    - threads > 0 时在后台线程池里保存 (Pillow 编码时会释放 GIL)，绘制下一张卡片与编码上一张重叠；
+      同时排队的图片最多 max_pending 张，超过时 submit 会阻塞，避免大图堆积占满内存
+    """
+
+    def __init__(self, format="jpeg", quality=95, optimize=False, progressive=False, subsampling=None,
+                 lossless=False, method=4, compress_level=6, threads=0, max_pending=4):
+        if format not in FORMATS:
+            raise ValueError(f"未知的输出格式: {format}")
+        self.format = format
+        self.quality = quality
+        self.optimize = optimize
+        self.progressive = progressive
+        self.subsampling = subsampling
+        self.lossless = lossless
+        self.method = method
+        self.compress_level = compress_level
+
+        self.threads = threads
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="encode") if threads else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    @property
+    def extension(self):
+        return FORMATS[self.format][1]
+
+    def save_kwargs(self):
+        pil_format = FORMATS[self.format][0]
+        kwargs = {"format": pil_format}
+        if self.format == "jpeg":
+            kwargs.update(quality=self.quality, optimize=self.optimize, progressive=self.progressive)
+            if self.subsampling is not None:
+                kwargs["subsampling"] = SUBSAMPLING.get(self.subsampling, self.subsampling)
+        elif self.format == "webp":
+            kwargs.update(quality=self.quality, lossless=self.lossless, method=self.method)
+        else:
+            kwargs.update(optimize=self.optimize, compress_level=self.compress_level)
+        return kwargs
+
+    def encode(self, img):
+        """编码为内存中的字节串"""
+        with metrics.timer("encode"):
+            buf = io.BytesIO()
+            img.save(buf, **self.save_kwargs())
+        return buf.getbuffer()
+
+    def save(self, img, output_path):
+        """
+        同步编码并写盘。先写同目录下的临时文件再 os.replace，中途崩溃不会留下半张图片；
+        临时文件名带随机后缀，多个进程 (或多台机器) 写同一张卡片时互不干扰。
+        """
+        data = self.encode(img)
+        with metrics.timer("write"):
+            tmp_path = f"{output_path}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, output_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        metrics.incr("images_written")
+        metrics.incr("image_bytes", len(data))
+        metrics.incr("image_pixels", img.width * img.height)
+        return output_path
+
+    def submit(self, img, output_path):
+        """
+        提交到后台线程保存，返回 Future (结果为 output_path，失败时抛出异常)。
+        没有开启线程池时直接同步保存并返回 None。
+        """
+        if self._executor is None:
+            self.save(img, output_path)
+            return None
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self.save, img, output_path)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self):
+        """等待所有排队中的图片写完"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
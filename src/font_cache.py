@@ -0,0 +1,72 @@
+import weakref
+from functools import lru_cache
+from PIL import ImageFont
+
+
+@lru_cache(maxsize=64)
+def get_font(font_path, size):
+    """
+    进程级字体缓存，键为 (字体路径, 字号)。
+    中文字体动辄十几 MB，每张卡片重复 truetype() 解析代价很高，这里每个组合只打开一次。
+    字体加载失败时回退到 Pillow 默认字体 (与原来的行为一致)。
+    """
+    try:
+        return ImageFont.truetype(font_path, int(size))
+    except Exception:
+        return ImageFont.load_default()
+
+
+class GlyphMetrics:
+    """
+    单个字体的字形宽度缓存。
+    BASIC 排版引擎下文本宽度 = 各字形前进宽度之和 + 相邻字对的字距调整，两者都逐个缓存，
+    之后测量任何字符串都不必再进入 FreeType。
+    RAQM 引擎会做连字等整形，宽度不可加，此时退化为按整串缓存 getlength 的结果。
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.additive = getattr(font, "layout_engine", ImageFont.Layout.BASIC) == ImageFont.Layout.BASIC
+        self._advance = {}
+        self._kerning = {}
+        self._lengths = {}
+
+    def advance(self, char):
+        w = self._advance.get(char)
+        if w is None:
+            w = self._advance[char] = self.font.getlength(char)
+        return w
+
+    def kerning(self, left, right):
+        """字对 (left, right) 的字距调整量，大多数字对为 0"""
+        key = left + right
+        k = self._kerning.get(key)
+        if k is None:
+            k = self._kerning[key] = self.font.getlength(key) - self.advance(left) - self.advance(right)
+        return k
+
+    def getlength(self, text):
+        """与 font.getlength(text) 结果一致的缓存版本"""
+        if not text:
+            return 0.0
+        if not self.additive:
+            w = self._lengths.get(text)
+            if w is None:
+                w = self._lengths[text] = self.font.getlength(text)
+            return w
+
+        total = self.advance(text[0])
+        for prev, char in zip(text, text[1:]):
+            total += self.advance(char) + self.kerning(prev, char)
+        return total
+
+
+_metrics = weakref.WeakKeyDictionary()
+
+
+def get_metrics(font):
+    """取得 (或创建) 某个字体对象的 GlyphMetrics；与 get_font 配合时整个进程共享"""
+    m = _metrics.get(font)
+    if m is None:
+        m = _metrics[font] = GlyphMetrics(font)
+    return m
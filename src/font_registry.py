@@ -0,0 +1,315 @@
+"""
+字体覆盖索引：每个字体文件的 cmap (字符 -> 字形映射) 只解析一次，压成一张以码位为下标的位图，
+按字体文件内容哈希缓存在 .cache/font_coverage/ 下。之后判断某个字体有没有某个字只是一次字节查表。
+
+    registry = get_registry()
+    registry.uncovered("Ёлки 中", ["./assets/fonts/cyrillic.ttf", "./assets/fonts/serif_latin.ttf"])
+    # {"中"}
+
+渲染时用 get_fallback_font() 把 "主字体 + 后备字体" 组合成一个字体对象：
+按字符把文本切成连续的段 (run)，每段使用链上第一个有该字的字体。
+"""
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from functools import lru_cache
+
+# 本模块的覆盖查询只用标准库：validate 只查缺字，不加载 Pillow / NumPy。
+# FallbackFont 是渲染才用的，Pillow 在它里面再导入
+
+# 解析规则或缓存格式有变化时递增，旧缓存随之失效
+COVERAGE_VERSION = "1"
+# 后备字体的切换规则有变化时递增；计入用到后备字体的卡片指纹，这些卡片随之重画
+FALLBACK_VERSION = "2"
+
+_MAX_CODEPOINT = 0x10FFFF
+_BIT_DIGITS = bytes.maketrans(b"\0\1", b"01")
+
+
+@lru_cache(maxsize=None)
+def file_digest(path):
+    """字体文件内容的哈希 (每个进程每个文件只读一次)；文件不存在时返回空串"""
+    if not os.path.exists(path):
+        return ""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FontCoverage:
+    """
+    一个字体覆盖的字符集合：第 cp 位为 1 表示码位 cp 有字形 (不是 .notdef)。
+    位图只保留到最大的覆盖码位，拉丁字体只有几百字节，大字库的中文字体也只有几 KB 到几十 KB。
+    """
+
+    def __init__(self, bits=b""):
+        self.bits = bytes(bits)
+
+    def __contains__(self, char):
+        cp = ord(char)
+        i = cp >> 3
+        return i < len(self.bits) and (self.bits[i] >> (cp & 7)) & 1 == 1
+
+    def __len__(self):
+        """覆盖的字符数"""
+        return int.from_bytes(self.bits, "little").bit_count()
+
+    @classmethod
+    def from_flags(cls, flags):
+        """:param flags: 每个码位一个字节 (0 / 1)，下标即码位"""
+        last = flags.rfind(1)
+        if last < 0:
+            return cls()
+        # 倒序后最高码位在最前，转成 "0101..." 按二进制整数解析，再按小端写出：第 cp 位即码位 cp
+        digits = bytes(flags[last::-1]).translate(_BIT_DIGITS)
+        return cls(int(digits, 2).to_bytes(last // 8 + 1, "little"))
+
+
+def _cmap_subtable(data):
+    """
+    在 sfnt (TrueType / OpenType，TTC 取第一个字体) 中找到 Unicode cmap 子表。
+    :return: 子表在 data 中的偏移；找不到时返回 None
+    """
+    offset = 0
+    if data[:4] == b"ttcf":
+        offset = struct.unpack_from(">I", data, 12)[0]
+    num_tables = struct.unpack_from(">H", data, offset + 4)[0]
+    cmap = None
+    for i in range(num_tables):
+        tag, _, table_offset, _ = struct.unpack_from(">4sIII", data, offset + 12 + 16 * i)
+        if tag == b"cmap":
+            cmap = table_offset
+            break
+    if cmap is None:
+        return None
+
+    # 优先完整 Unicode (含扩展区汉字) 的子表，其次 BMP
+    preference = {(3, 10): 0, (0, 6): 1, (0, 4): 2, (0, 3): 3, (3, 1): 4, (0, 2): 5, (0, 1): 6, (0, 0): 7}
+    best = None
+    for i in range(struct.unpack_from(">H", data, cmap + 2)[0]):
+        platform, encoding, sub_offset = struct.unpack_from(">HHI", data, cmap + 4 + 8 * i)
+        rank = preference.get((platform, encoding))
+        if rank is not None and (best is None or rank < best[0]):
+            best = (rank, cmap + sub_offset)
+    return best[1] if best else None
+
+
+def parse_cmap(data):
+    """
+    解析字体文件的 cmap，支持最常见的 0 / 4 / 6 / 12 号子表格式。
+    只用标准库 (validate 不加载 NumPy)：先按码位逐字节标记，区间整段切片赋值，最后一次性压成位图。
+    :param data: 字体文件的全部字节
+    :return: FontCoverage
+    """
+    sub = _cmap_subtable(data)
+    if sub is None:
+        return FontCoverage()
+    flags = bytearray(_MAX_CODEPOINT + 1)
+
+    fmt = struct.unpack_from(">H", data, sub)[0]
+    if fmt == 0:
+        flags[:256] = bytes(1 if g else 0 for g in data[sub + 6:sub + 6 + 256])
+    elif fmt == 4:
+        seg_count = struct.unpack_from(">H", data, sub + 6)[0] // 2
+        ends = struct.unpack_from(f">{seg_count}H", data, sub + 14)
+        starts_at = sub + 16 + 2 * seg_count
+        starts = struct.unpack_from(f">{seg_count}H", data, starts_at)
+        deltas = struct.unpack_from(f">{seg_count}h", data, starts_at + 2 * seg_count)
+        range_at = starts_at + 4 * seg_count
+        range_offsets = struct.unpack_from(f">{seg_count}H", data, range_at)
+        for i in range(seg_count):
+            start, end = starts[i], min(ends[i], 0xFFFE)
+            if start > end:
+                continue
+            if range_offsets[i] == 0:
+                # 字形号 = (码位 + delta) mod 65536，只有映射到 0 (.notdef) 的那一个码位不算
+                flags[start:end + 1] = b"\1" * (end - start + 1)
+                notdef = -deltas[i] & 0xFFFF
+                if start <= notdef <= end:
+                    flags[notdef] = 0
+            else:
+                at = range_at + 2 * i + range_offsets[i]
+                glyphs = struct.unpack_from(f">{end - start + 1}H", data, at)
+                flags[start:end + 1] = bytes(1 if g and (g + deltas[i]) & 0xFFFF else 0 for g in glyphs)
+    elif fmt == 6:
+        first, count = struct.unpack_from(">HH", data, sub + 6)
+        glyphs = struct.unpack_from(f">{count}H", data, sub + 10)
+        flags[first:first + count] = bytes(1 if g else 0 for g in glyphs)
+    elif fmt == 12:
+        num_groups = struct.unpack_from(">I", data, sub + 12)[0]
+        for start, end, start_glyph in struct.iter_unpack(">III", data[sub + 16:sub + 16 + 12 * num_groups]):
+            end = min(end, _MAX_CODEPOINT)
+            if start <= end:
+                flags[start:end + 1] = b"\1" * (end - start + 1)
+                if start_glyph == 0:
+                    flags[start] = 0
+    else:
+        raise ValueError(f"不支持的 cmap 子表格式: {fmt}")
+    return FontCoverage.from_flags(flags)
+
+
+class FontRegistry:
+    """
+    进程内的字体覆盖索引。覆盖位图先查内存，再查磁盘缓存 (按字体文件哈希命名)，都没有才解析字体文件。
+    字体文件不存在或无法解析时视为什么字都没有。
+    """
+
+    def __init__(self, cache_dir="./.cache/font_coverage"):
+        self.cache_dir = cache_dir
+        self._coverage = {}
+        # 每条后备链各自记住已经判断过的字符：{链: (全部覆盖的字符集合, 整条链都没有的字符集合)}
+        self._chain_known = {}
+        self._lock = threading.Lock()
+
+    def _cache_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.v{COVERAGE_VERSION}.bin")
+
+    def coverage(self, font_path):
+        cov = self._coverage.get(font_path)
+        if cov is None:
+            with self._lock:
+                cov = self._coverage.get(font_path)
+                if cov is None:
+                    cov = self._coverage[font_path] = self._load(font_path)
+        return cov
+
+    def _load(self, font_path):
+        digest = file_digest(font_path)
+        if not digest:
+            return FontCoverage()
+        cache_path = self._cache_path(digest) if self.cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    return FontCoverage(zlib.decompress(f.read()))
+            except (OSError, zlib.error):
+                pass
+
+        try:
+            with open(font_path, 'rb') as f:
+                cov = parse_cmap(f.read())
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠️ 无法读取字体 {font_path} 的字符表: {e}")
+            return FontCoverage()
+
+        if cache_path:
+            # 多个工作进程可能同时写同一个缓存文件，各写各的临时文件再原子替换
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(cov.bits))
+            os.replace(tmp_path, cache_path)
+        return cov
+
+    def covers(self, font_path, char):
+        return char in self.coverage(font_path)
+
+    def missing(self, text, font_path):
+        """text 中该字体没有的字符 (空白、换行等控制字符不计)"""
+        cov = self.coverage(font_path)
+        return {c for c in set(text) if c not in cov and not _ignorable(c)}
+
+    def pick(self, char, chain):
+        """:return: 链上第一个有该字的字体在 chain 中的下标；都没有时返回 None"""
+        for i, path in enumerate(chain):
+            if char in self.coverage(path):
+                return i
+        return None
+
+    def uncovered(self, text, chain):
+        """
+        text 中整条后备链都没有的字符。每条链对每个字符只判断一次，
+        之后大语料的缺字检查基本都是集合运算。
+        """
+        chain = tuple(chain)
+        known = self._chain_known.get(chain)
+        if known is None:
+            known = self._chain_known.setdefault(chain, (set(), set()))
+        ok, bad = known
+        chars = set(text)
+        for c in chars - ok - bad:
+            if _ignorable(c) or self.pick(c, chain) is not None:
+                ok.add(c)
+            else:
+                bad.add(c)
+        return chars & bad
+
+
+def _ignorable(char):
+    return char.isspace() or ord(char) < 0x20
+
+
+_registry = None
+
+
+def get_registry():
+    """进程内共享的 FontRegistry"""
+    global _registry
+    if _registry is None:
+        _registry = FontRegistry()
+    return _registry
+
+
+class FallbackFont:
+    """
+    一组按优先级排列的同字号字体，对外表现得像单个字体 (getmetrics / getlength / layout_engine)，
+    因此可以直接交给排版和 get_metrics 使用。测量与绘制时按字符覆盖切换字体：
+    每个字符 (包括空白) 使用链上第一个有该字的字体，整条链都没有的字符使用主字体。
+    空白也按同一规则取字体，这样整串宽度恰好等于逐字宽度加同一字体内相邻字对的字距，
+    GlyphMetrics 逐字累加测出的宽度与按段绘制的宽度一致，居中不会偏。
+    """
+
+    def __init__(self, font_paths, size, registry=None):
+        from PIL import ImageFont
+        from src.font_cache import get_font
+
+        self.font_paths = tuple(font_paths)
+        self.fonts = [get_font(path, size) for path in self.font_paths]
+        self.registry = registry or get_registry()
+        self.size = size
+        engines = {getattr(f, "layout_engine", ImageFont.Layout.BASIC) for f in self.fonts}
+        self.layout_engine = engines.pop() if len(engines) == 1 else ImageFont.Layout.RAQM
+        self._picks = {}
+
+    @property
+    def primary(self):
+        return self.fonts[0]
+
+    def getmetrics(self):
+        """行高以主字体为准"""
+        return self.primary.getmetrics()
+
+    def font_index(self, char):
+        i = self._picks.get(char)
+        if i is None:
+            i = self.registry.pick(char, self.font_paths)
+            i = self._picks[char] = 0 if i is None else i
+        return i
+
+    def runs(self, text):
+        """:return: [(字体, 连续使用该字体的文本)]"""
+        runs = []
+        current, start = None, 0
+        for pos, char in enumerate(text):
+            i = self.font_index(char)
+            if i != current:
+                if current is not None:
+                    runs.append((self.fonts[current], text[start:pos]))
+                current, start = i, pos
+        if current is not None:
+            runs.append((self.fonts[current], text[start:]))
+        return runs
+
+    def getlength(self, text):
+        """各段宽度之和 (不同字体之间不做字距调整)"""
+        return sum(font.getlength(run) for font, run in self.runs(text))
+
+
+@lru_cache(maxsize=64)
+def get_fallback_font(font_paths, size):
+    """进程级缓存的 FallbackFont，键为 (字体路径元组, 字号)"""
+    return FallbackFont(font_paths, int(size))
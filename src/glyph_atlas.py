@@ -0,0 +1,125 @@
+"""
+字形位图缓存 (glyph atlas)。
+中文正文每张卡片要画几百个字，draw.text 每次都让 FreeType 重新栅格化每个字形，
+而同一批古诗里常用字大量重复，简繁两张卡片更是几乎同一批字。
+这里把每个 (字体, 字符, 亚像素相位) 只栅格化一次，之后整行由缓存的灰度位图拼成蒙版，
+再用墨色一次性绘制，结果与 draw.text 逐像素一致。
+"""
+import math
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageFont
+
+from src.font_cache import get_metrics
+
+
+def _screen(target, source):
+    """
+    与 FreeType 渲染整串文字时重叠字形的合成方式一致：t + s - t*s/255 (四舍五入)。
+    target 原地更新。
+    """
+    prod = target * source + 128
+    target += source - ((prod >> 8) + prod >> 8)
+
+
+class GlyphAtlas:
+    """
+    字形灰度位图的 LRU 缓存，按位图字节数控制总内存。
+    起笔位置的小数部分会影响抗锯齿结果，因此键里带上 x/y 方向以 1/64 像素计的相位
+    (FreeType 内部就是 26.6 定点数，同一相位的栅格化结果完全相同)。
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._store = OrderedDict()
+
+    @staticmethod
+    def supports(font):
+        """只有 BASIC 排版引擎下字宽可加、字形位置可复算，其它情况退回 draw.text"""
+        return isinstance(font, ImageFont.FreeTypeFont) and get_metrics(font).additive
+
+    def glyph(self, font, char, phase_x, phase_y):
+        """
+        :param phase_x: 起笔 x 的小数部分，单位 1/64 像素 (0~64)
+        :return: (uint16 位图数组, 相对起笔点的 x 偏移, y 偏移)；空白字符的位图大小为 0
+        """
+        key = (font, char, phase_x, phase_y)
+        entry = self._store.get(key)
+        if entry is not None:
+            self._store.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        core, (ox, oy) = font.getmask2(char, "L", start=(phase_x / 64, phase_y / 64))
+        w, h = core.size
+        bitmap = np.asarray(Image.frombytes("L", (w, h), bytes(core)), dtype=np.uint16) if w and h else None
+        entry = (bitmap, ox, oy)
+        size = w * h * 2
+        if size <= self.max_bytes:
+            self._store[key] = entry
+            self.current_bytes += size
+            self._evict()
+        return entry
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._store:
+            _, (bitmap, _, _) = self._store.popitem(last=False)
+            if bitmap is not None:
+                self.current_bytes -= bitmap.size * 2
+
+    def clear(self):
+        self._store.clear()
+        self.current_bytes = 0
+
+    def line_mask(self, xy, text, font):
+        """
+        用缓存的字形拼出整行的灰度蒙版。
+        :return: (左上角坐标, L 模式蒙版)；整行都是空白时返回 (None, None)
+        """
+        x, y = xy
+        frac_x, int_x = math.modf(x)
+        frac_y, int_y = math.modf(y)
+        phase_x = round(frac_x * 64)
+        phase_y = round(frac_y * 64)
+        int_x, int_y = int(int_x), int(int_y)
+        metrics = get_metrics(font)
+
+        # 字形位置按 26.6 定点累加前进宽度和字距，再四舍五入到整像素 (与 FreeType 渲染整串时相同)
+        pen = 0
+        placed = []
+        prev = None
+        for char in text:
+            if prev is not None:
+                pen += round(metrics.kerning(prev, char) * 64)
+            bitmap, ox, oy = self.glyph(font, char, phase_x, phase_y)
+            if bitmap is not None:
+                placed.append((int_x + ox + ((pen + 32) >> 6), int_y + oy, bitmap))
+            pen += round(metrics.advance(char) * 64)
+            prev = char
+
+        if not placed:
+            return None, None
+        left = min(p[0] for p in placed)
+        top = min(p[1] for p in placed)
+        right = max(p[0] + p[2].shape[1] for p in placed)
+        bottom = max(p[1] + p[2].shape[0] for p in placed)
+
+        mask = np.zeros((bottom - top, right - left), dtype=np.uint16)
+        for gx, gy, bitmap in placed:
+            h, w = bitmap.shape
+            _screen(mask[gy - top:gy - top + h, gx - left:gx - left + w], bitmap)
+        return (left, top), Image.fromarray(mask.astype(np.uint8), "L")
+
+    def draw_text(self, draw, xy, text, font, fill):
+        """draw.text(xy, text, font=font, fill=fill) 的缓存版本 (单行、默认锚点)"""
+        if draw.fontmode != "L" or not self.supports(font):
+            draw.text(xy, text, font=font, fill=fill)
+            return
+        origin, mask = self.line_mask(xy, text, font)
+        if mask is not None:
+            draw.bitmap(origin, mask, fill=fill)
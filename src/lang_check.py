@@ -0,0 +1,358 @@
+"""
+语言真实性校验：确认每个语言块确实是对应的语言 (例如 fr 里不是英文，zh_tw 里不是简体)。
+先用预先排好的 Unicode 文字区间表判断书写系统 (汉字 / 拉丁 / 西里尔)，简繁用常用简繁字对区分；
+只有拉丁文字内部无法靠字母判断的情况 (如没有任何变音符号的 "法文") 才延迟导入 langdetect 再判断。
+结果按内容哈希缓存，重复校验同一份文件几乎不花时间。
+
+    check_block("fr", "Le lac et la mer dans le soir")   # 虚词命中 5 个
+    # {"ok": True, "detected": "fr", "method": "stopwords", "reason": ""}
+    check_block("fr", "Le lac")                          # 只命中 1 个，不足 MIN_STOPWORD_HITS，交给 langdetect
+    # {"ok": True, "detected": "fr", "method": "langdetect", "reason": ""}
+"""
+import hashlib
+import json
+import os
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+# 判断规则有变化时递增，旧的缓存结论随之失效
+CHECK_VERSION = "1"
+
+# 语言代码 -> 期望的书写系统
+EXPECTED_SCRIPT = {
+    "zh_cn": "han",
+    "zh_tw": "han",
+    "en": "latin",
+    "fr": "latin",
+    "de": "latin",
+    "ru": "cyrillic",
+}
+
+# (起始码位, 结束码位, 书写系统)，按起始码位排序
+_SCRIPT_RANGES = [
+    (0x0041, 0x005A, "latin"),
+    (0x0061, 0x007A, "latin"),
+    (0x00C0, 0x00D6, "latin"),
+    (0x00D8, 0x00F6, "latin"),
+    (0x00F8, 0x024F, "latin"),
+    (0x0400, 0x052F, "cyrillic"),
+    (0x1C80, 0x1C8F, "cyrillic"),
+    (0x1E00, 0x1EFF, "latin"),
+    (0x2DE0, 0x2DFF, "cyrillic"),
+    (0x2E80, 0x2FDF, "han"),
+    (0x3005, 0x3007, "han"),
+    (0x3040, 0x30FF, "kana"),
+    (0x3400, 0x4DBF, "han"),
+    (0x4E00, 0x9FFF, "han"),
+    (0xA640, 0xA69F, "cyrillic"),
+    (0xAC00, 0xD7AF, "hangul"),
+    (0xF900, 0xFAFF, "han"),
+    (0x20000, 0x3134F, "han"),
+]
+_RANGE_STARTS = [r[0] for r in _SCRIPT_RANGES]
+
+# 常用简繁字对 (简体, 繁體)，只收两边写法不会混用的字
+_SIMP_TRAD_PAIRS = (
+    "们們 这這 来來 时時 为為 国國 说說 会會 个個 对對 过過 还還 没沒 从從 见見 东東 长長 开開 门門 问問 "
+    "间間 闻聞 关關 风風 飞飛 马馬 鸟鳥 鱼魚 龙龍 乐樂 书書 画畫 灯燈 泪淚 梦夢 爱愛 忆憶 远遠 归歸 随隨 "
+    "谁誰 语語 诗詩 词詞 调調 让讓 认認 识識 读讀 听聽 无無 与與 万萬 严嚴 丽麗 义義 乡鄉 买買 亲親 华華 "
+    "处處 头頭 宝寶 实實 岁歲 帅帥 广廣 庄莊 张張 弹彈 当當 忧憂 怀懷 恋戀 愿願 战戰 机機 杂雜 条條 极極 "
+    "树樹 桥橋 欢歡 气氣 汉漢 沟溝 涛濤 湾灣 满滿 烟煙 热熱 爷爺 独獨 环環 现現 电電 离離 种種 穷窮 笔筆 "
+    "红紅 纸紙 线線 细細 终終 经經 结結 给給 绝絕 继繼 绿綠 编編 缘緣 网網 罗羅 肠腸 脸臉 艳艷 节節 苏蘇 "
+    "荣榮 药藥 虽雖 虫蟲 觉覺 视視 试試 话話 该該 请請 谢謝 贝貝 贵貴 边邊 进進 选選 递遞 邻鄰 钟鐘 铁鐵 "
+    "银銀 锁鎖 阳陽 阴陰 陆陸 难難 顶頂 顺順 领領 频頻 题題 颜顏 饭飯 馆館 驾駕 骑騎 鲜鮮 鸡雞 鹤鶴 齐齊 "
+    "岛島 峡峽 浅淺 渐漸 滚滾 灭滅 烦煩 烧燒 犹猶 猎獵 剑劍 动動 劳勞 势勢 单單 卖賣 历歷 压壓 厌厭 县縣 "
+    "双雙 变變 叹嘆 吴吳 员員 响響 园園 围圍 图圖 圣聖 坏壞 块塊 坚堅 坛壇 声聲 壮壯 夸誇 夺奪 妆妝 妇婦 "
+    "娇嬌 学學 宁寧 寻尋 导導 层層 属屬 峦巒 币幣 带帶 帘簾 师師 应應 庙廟 废廢 异異 弯彎 径徑 怜憐 总總 "
+    "恶惡 惊驚 惯慣 愤憤 戏戲 护護 报報 担擔 拥擁 择擇 挂掛 挥揮 据據 数數 断斷 旧舊 显顯 晓曉 晕暈 暂暫 "
+    "术術 杀殺 杨楊 枣棗 枪槍 标標 样樣 检檢 楼樓 残殘 毕畢 毁毀 汤湯 沦淪 泽澤 洁潔 浊濁 测測 浓濃 润潤 "
+    "涨漲 渊淵 湿濕 溃潰 灵靈 灾災 炉爐 点點 炼煉 烛燭 牵牽 状狀 猪豬 献獻 琼瓊 疗療 疯瘋 盏盞 盐鹽 监監 "
+    "盖蓋 盘盤 码碼 础礎 祸禍 禅禪 称稱 积積 稳穩 窃竊 竞競 笼籠 简簡 签簽 类類 粮糧 紧緊 练練 织織 绕繞 "
+    "绘繪 绣繡 缓緩 缩縮 罢罷 职職 联聯 肃肅 胜勝 脉脈 脑腦 腾騰 艺藝 芦蘆 苍蒼 莲蓮 获獲 萧蕭 蓝藍 蔷薔 "
+    "虑慮 补補 装裝 观觀 规規 览覽 触觸 誉譽 计計 订訂 讨討 训訓 记記 讲講 许許 论論 设設 访訪 证證 评評 "
+    "诉訴 译譯 诚誠 询詢 误誤 谈談 谋謀 谓謂 谜謎 谱譜 贞貞 负負 财財 责責 贤賢 败敗 货貨 质質 贫貧 购購 "
+    "贴貼 贺賀 资資 赋賦 赏賞 赐賜 赞贊 赠贈 赵趙 赶趕 跃躍 践踐 踪蹤 车車 轨軌 转轉 轮輪 软軟 轻輕 载載 "
+    "较較 辉輝 辈輩 辞辭 辽遼 达達 迁遷 迈邁 运運 违違 连連 迟遲 逊遜 遗遺 郑鄭 释釋 钓釣 钢鋼 钱錢 铃鈴 "
+    "铜銅 铺鋪 链鏈 销銷 锦錦 键鍵 镇鎮 镜鏡 闭閉 闪閃 阁閣 阔闊 队隊 阶階 际際 陈陳 险險 隐隱 雾霧 韩韓 "
+    "页頁 项項 顾顧 顿頓 预預 颇頗 颈頸 颗顆 额額 飘飄 饮飲 饱飽 饰飾 饿餓 驱驅 驰馳 驻駐 验驗 骂罵 骄驕 "
+    "鲁魯 鸣鳴 鸦鴉 鸭鴨 鸳鴛 鸯鴦 鹅鵝 鹰鷹 麦麥 齿齒 龟龜"
+).split()
+SIMPLIFIED_ONLY = frozenset(pair[0] for pair in _SIMP_TRAD_PAIRS)
+TRADITIONAL_ONLY = frozenset(pair[1] for pair in _SIMP_TRAD_PAIRS)
+
+# 拉丁文字语言的特征字母：出现即可直接判定，不必动用 langdetect
+GERMAN_MARKERS = frozenset("äöüßÄÖÜẞ")
+FRENCH_MARKERS = frozenset("éèêëàâçœîïôûùÿÉÈÊËÀÂÇŒÎÏÔÛÙŸ")
+# 乌克兰语等特有的西里尔字母，出现时交给 langdetect 确认是不是俄文
+NON_RUSSIAN_CYRILLIC = frozenset("іїєґўІЇЄҐЎ")
+
+# 主体文字占字母总数的比例低于该值视为混入了其它语言
+MIN_SCRIPT_RATIO = 0.9
+
+# 英法德的高频虚词：变音符号不足以判断时，先按虚词命中数判断，差距明显才采信
+STOPWORDS = {
+    "en": frozenset("the and of to in is that it was for on with as his he her you my not but by at "
+                    "from this be are all i me we they no so".split()),
+    "fr": frozenset("le la les et des un une du est que qui dans pour pas sur au aux ce se ne je tu il "
+                    "elle nous vous mon ma mes son sa ses leur".split()),
+    "de": frozenset("der die das und ist nicht ein eine ich du er sie wir ihr mit auf den dem des im zu "
+                    "von sich auch wie mein dein kein noch".split()),
+}
+MIN_STOPWORD_HITS = 3
+_STOPWORD_LANGS = {}
+for _lang, _words in STOPWORDS.items():
+    for _word in _words:
+        _STOPWORD_LANGS.setdefault(_word, []).append(_lang)
+
+# langdetect 的耗时与文本长度成正比，判断语种取开头这么多字符已经足够
+LANGDETECT_MAX_CHARS = 400
+
+_script_of_char = {}
+
+
+def char_script(char):
+    """单个字符所属的书写系统 ("han" / "latin" / "cyrillic" ...)，标点、数字、空白返回 None"""
+    script = _script_of_char.get(char, False)
+    if script is False:
+        cp = ord(char)
+        i = bisect_right(_RANGE_STARTS, cp) - 1
+        script = _SCRIPT_RANGES[i][2] if i >= 0 and cp <= _SCRIPT_RANGES[i][1] else None
+        _script_of_char[char] = script
+    return script
+
+
+def script_counts(text):
+    counts = {}
+    for char in text:
+        script = char_script(char)
+        if script is not None:
+            counts[script] = counts.get(script, 0) + 1
+    return counts
+
+
+def _verdict(ok, detected, method="script", reason=""):
+    return {"ok": ok, "detected": detected, "method": method, "reason": reason}
+
+
+_langdetect = None
+
+
+def _detect_with_langdetect(text):
+    """延迟导入 langdetect (加载语言模型要好几百毫秒)，固定随机种子保证结果可复现"""
+    global _langdetect
+    if _langdetect is None:
+        from langdetect import DetectorFactory, detect_langs
+        DetectorFactory.seed = 0
+        _langdetect = detect_langs
+    langs = _langdetect(text[:LANGDETECT_MAX_CHARS])
+    return langs[0].lang if langs else None
+
+
+def check_block(lang, text):
+    """
+    校验一段文本是否为 lang 对应的语言。
+    :param lang: 语言代码 (zh_cn / zh_tw / en / fr / de / ru)
+    :return: {"ok": bool, "detected": 判定结果, "method": "script" | "stopwords" | "langdetect", "reason": 说明}
+    """
+    expected = EXPECTED_SCRIPT.get(lang)
+    if expected is None:
+        return _verdict(True, None, reason="未知语言，跳过")
+
+    counts = script_counts(text)
+    letters = sum(counts.values())
+    if not letters:
+        return _verdict(False, None, reason="内容为空")
+
+    dominant = max(counts, key=counts.get)
+    if dominant != expected or counts[dominant] / letters < MIN_SCRIPT_RATIO:
+        return _verdict(False, dominant, reason=f"书写系统不符: {counts}")
+
+    if expected == "han":
+        simp = sum(1 for c in text if c in SIMPLIFIED_ONLY)
+        trad = sum(1 for c in text if c in TRADITIONAL_ONLY)
+        detected = "zh_tw" if trad > simp else "zh_cn" if simp > trad else lang
+        if detected != lang:
+            return _verdict(False, detected, reason=f"简体字 {simp} 个，繁体字 {trad} 个")
+        return _verdict(True, detected)
+
+    if expected == "cyrillic":
+        if not any(c in NON_RUSSIAN_CYRILLIC for c in text):
+            return _verdict(True, "ru")
+        return _check_with_langdetect(lang, text)
+
+    # 拉丁文字：特征字母明确时直接判定，其次看高频虚词，仍无法判断时才交给 langdetect
+    has_de = any(c in GERMAN_MARKERS for c in text)
+    has_fr = any(c in FRENCH_MARKERS for c in text)
+    if lang == "de" and has_de and not has_fr:
+        return _verdict(True, "de")
+    if lang == "fr" and has_fr and not has_de:
+        return _verdict(True, "fr")
+
+    detected = _guess_by_stopwords(text)
+    if detected is not None:
+        if detected != lang:
+            return _verdict(False, detected, method="stopwords", reason=f"高频虚词判定为 {detected}")
+        return _verdict(True, detected, method="stopwords")
+    if lang == "en" and not (has_de or has_fr):
+        return _verdict(True, "en")
+    return _check_with_langdetect(lang, text)
+
+
+def _guess_by_stopwords(text):
+    """按虚词命中数猜测 en/fr/de；命中太少或前两名差距不到一倍时返回 None"""
+    hits = {lang: 0 for lang in STOPWORDS}
+    for word in text.lower().replace("'", " ").replace("’", " ").split():
+        for lang in _STOPWORD_LANGS.get(word.strip(".,;:!?\"«»()—-"), ()):
+            hits[lang] += 1
+    ranked = sorted(hits, key=hits.get, reverse=True)
+    best, second = hits[ranked[0]], hits[ranked[1]]
+    if best >= MIN_STOPWORD_HITS and best >= 2 * second:
+        return ranked[0]
+    return None
+
+
+def _check_with_langdetect(lang, text):
+    try:
+        detected = _detect_with_langdetect(text)
+    except ImportError:
+        return _verdict(True, None, method="skipped", reason="未安装 langdetect，无法进一步确认")
+    except Exception as e:
+        # langdetect 对过短或全是符号的文本会抛异常
+        return _verdict(False, None, method="langdetect", reason=f"langdetect 无法判断: {e}")
+    expected = lang.split("_")[0]
+    if detected != expected:
+        return _verdict(False, detected, method="langdetect", reason=f"langdetect 判定为 {detected}")
+    return _verdict(True, detected, method="langdetect")
+
+
+def block_text(block):
+    """参与校验的字段：标题 + 正文 (作者名常是音译，不计入)"""
+    if isinstance(block, dict):
+        return f"{block.get('title', '')}\n{block.get('content', '')}"
+    return str(block)
+
+
+def verdict_key(lang, text):
+    return hashlib.sha256(f"{CHECK_VERSION}\0{lang}\0{text}".encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    校验结论缓存，键为 (规则版本, 语言, 内容) 的哈希。
+    追加式 JSONL 文件，启动时整体读入；只有主进程读写。
+    """
+
+    def __init__(self, path="./.cache/lang_verdicts.jsonl"):
+        self.path = path
+        self._verdicts = {}
+        self._pending = []
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._verdicts[rec["key"]] = rec["verdict"]
+
+    def get(self, key):
+        return self._verdicts.get(key)
+
+    def put(self, key, verdict):
+        self._verdicts[key] = verdict
+        self._pending.append(key)
+        if len(self._pending) >= 1000:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for key in self._pending:
+                f.write(json.dumps({"key": key, "verdict": self._verdicts[key]}, ensure_ascii=False) + "\n")
+        self._pending = []
+
+    def __len__(self):
+        return len(self._verdicts)
+
+
+class LanguageValidator:
+    """单进程校验器 (渲染阶段逐块调用)，带结论缓存"""
+
+    def __init__(self, cache=None):
+        self.cache = cache
+
+    def check(self, lang, block):
+        text = block_text(block)
+        key = verdict_key(lang, text)
+        verdict = self.cache.get(key) if self.cache is not None else None
+        if verdict is None:
+            verdict = check_block(lang, text)
+            if self.cache is not None:
+                self.cache.put(key, verdict)
+        return verdict
+
+    def flush(self):
+        if self.cache is not None:
+            self.cache.flush()
+
+
+def _check_batch(batch):
+    """进程池入口：[(key, lang, text), ...] -> [(key, verdict), ...]"""
+    return [(key, check_block(lang, text)) for key, lang, text in batch]
+
+
+def validate_records(records, workers=1, cache=None, chunk_records=500, batch_blocks=64):
+    """
+    校验校验文件中的所有语言块，逐首产出结果。
+    每 chunk_records 首诗为一批：缓存命中的直接取结论，其余分成小包交给进程池并行判断。
+    :param records: iter_review_records 产出的记录 (可以是生成器)
+    :param workers: 进程数；<= 1 时在当前进程执行
+    :return: 生成器，产出 (input_info, {lang: verdict})
+    """
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        chunk = []
+        for rec in records:
+            chunk.append(rec)
+            if len(chunk) >= chunk_records:
+                yield from _validate_chunk(chunk, pool, cache, batch_blocks)
+                chunk = []
+        if chunk:
+            yield from _validate_chunk(chunk, pool, cache, batch_blocks)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if cache is not None:
+            cache.flush()
+
+
+def _validate_chunk(chunk, pool, cache, batch_blocks):
+    keys = []
+    missing = {}
+    for rec in chunk:
+        rec_keys = {}
+        for lang, block in rec['versions'].items():
+            if lang not in EXPECTED_SCRIPT:
+                continue
+            text = block_text(block)
+            key = verdict_key(lang, text)
+            rec_keys[lang] = key
+            if (cache is None or cache.get(key) is None) and key not in missing:
+                missing[key] = (key, lang, text)
+        keys.append(rec_keys)
+
+    todo = list(missing.values())
+    batches = [todo[i:i + batch_blocks] for i in range(0, len(todo), batch_blocks)]
+    results = pool.map(_check_batch, batches) if pool is not None else map(_check_batch, batches)
+    fresh = {}
+    for batch_result in results:
+        for key, verdict in batch_result:
+            fresh[key] = verdict
+            if cache is not None:
+                cache.put(key, verdict)
+
+    for rec, rec_keys in zip(chunk, keys):
+        verdicts = {lang: fresh.get(key) or cache.get(key) for lang, key in rec_keys.items()}
+        yield rec['input_info'], verdicts
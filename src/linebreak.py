@@ -0,0 +1,152 @@
+"""
+断行引擎。
+每个词 (西文) 或字 (中文) 只测量一次，行宽用累加的方式维护，只在候选断点处补上字距修正，
+整段的复杂度与字数成线性，不再每加一个字就重新测量整行。
+"""
+
+
+def _join_width(metrics, last_char, piece):
+    """把 piece 接到以 last_char 结尾的行后面时增加的宽度"""
+    return metrics.kerning(last_char, piece[0]) + metrics.getlength(piece)
+
+
+def break_greedy(words, sep, metrics, max_width):
+    """
+    贪心断行，结果与逐次 getlength(test_line) 的旧实现完全一致 (包括对空词的处理)。
+    :param words: 西文为按空格切开的词，中文为单字
+    :param sep: 词间分隔符，西文 " "，中文 ""
+    :param metrics: GlyphMetrics
+    :return: 行字符串列表
+    """
+    if not metrics.additive:
+        return _break_greedy_measured(words, sep, metrics, max_width)
+
+    word_widths = {}
+    lines = []
+    parts = []  # 当前行的片段，最后再 join，避免反复拼接字符串
+    cur_w = 0.0
+    last_char = ""
+
+    for word in words:
+        w = word_widths.get(word)
+        if w is None:
+            w = word_widths[word] = metrics.getlength(word)
+
+        if parts and last_char:
+            # 追加 sep + word：分隔符和词都用缓存宽度，字距只在接缝处修正
+            piece = sep + word
+            if sep:
+                delta = _join_width(metrics, last_char, sep)
+                if word:
+                    delta += metrics.kerning(sep[-1], word[0]) + w
+            elif word:
+                delta = metrics.kerning(last_char, word[0]) + w
+            else:
+                delta = 0.0
+            test_w = cur_w + delta
+        else:
+            # 当前行为空，测试行就是 word 本身
+            piece = None
+            test_w = w
+
+        if test_w <= max_width:
+            if piece is None:
+                parts = [word]
+            else:
+                parts.append(piece)
+            cur_w = test_w
+            last_char = (parts[-1] or last_char)[-1:] or last_char
+        else:
+            lines.append("".join(parts))
+            parts = [word]
+            cur_w = w
+            last_char = word[-1:]
+
+    current_line = "".join(parts)
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def _break_greedy_measured(words, sep, metrics, max_width):
+    """字宽不可加 (RAQM 整形) 时的回退：逐次测量整行"""
+    current_line = ""
+    lines = []
+    for word in words:
+        test_line = current_line + sep + word if current_line else word
+        if metrics.getlength(test_line) <= max_width:
+            current_line = test_line
+        else:
+            lines.append(current_line)
+            current_line = word
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def break_balanced(words, sep, metrics, max_width):
+    """
+    Knuth–Plass 式的均衡断行：先保证行数最少 (与贪心相同)，再让各行宽度尽量接近，
+    即最小化所有行 (含最后一行) 剩余空白的平方和，适合居中排版的诗句。
+    动态规划只回看能放进一行的候选断点，复杂度 O(字数 × 每行字数)。
+    """
+    words = [w for w in words if w]  # 连续空格产生的空词在均衡模式下没有意义
+    n = len(words)
+    if n == 0:
+        return []
+
+    # 词宽前缀和 + 相邻两词之间的接缝宽度前缀和
+    word_w = [metrics.getlength(w) for w in words]
+    gap_w = []
+    for a, b in zip(words, words[1:]):
+        if sep:
+            gap_w.append(metrics.kerning(a[-1], sep[0]) + metrics.getlength(sep) + metrics.kerning(sep[-1], b[0]))
+        else:
+            gap_w.append(metrics.kerning(a[-1], b[0]))
+    pw = [0.0]
+    for w in word_w:
+        pw.append(pw[-1] + w)
+    pg = [0.0]
+    for g in gap_w:
+        pg.append(pg[-1] + g)
+
+    def line_width(i, j):
+        # words[i:j] 组成一行的宽度
+        return pw[j] - pw[i] + pg[j - 1] - pg[i]
+
+    # best[j] = 排好 words[:j] 的最小代价 (行数, 空白平方和)
+    inf = (float("inf"), float("inf"))
+    best = [inf] * (n + 1)
+    best[0] = (0, 0.0)
+    prev = [0] * (n + 1)
+
+    for j in range(1, n + 1):
+        i = j - 1
+        while i >= 0:
+            w = line_width(i, j)
+            if w > max_width and i < j - 1:
+                break  # 再往前只会更宽
+            slack = max(0.0, max_width - w)
+            lines, badness = best[i]
+            cand = (lines + 1, badness + slack * slack)
+            if cand < best[j]:
+                best[j] = cand
+                prev[j] = i
+            if w > max_width:
+                break  # 单个超长词独占一行
+            i -= 1
+
+    result = []
+    j = n
+    while j > 0:
+        i = prev[j]
+        result.append(sep.join(words[i:j]))
+        j = i
+    result.reverse()
+    return result
+
+
+LINE_BREAKERS = {
+    "greedy": break_greedy,
+    "balanced": break_balanced,
+}
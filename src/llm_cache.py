@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "./.cache/llm_responses.sqlite"
+
+
+def make_cache_key(title, author, model, system_prompt, temperature):
+    """
+    缓存键：(诗名, 作者, 模型, 系统提示词哈希, 温度)。
+    改了提示词或换了模型，旧缓存自然失效。
+    """
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    raw = json.dumps([title, author, model, prompt_hash, temperature], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LLM 响应的持久化缓存 (SQLite)。
+    - ttl: 过期秒数，None 表示永不过期
+    - refresh=True: 忽略已有缓存强制重新请求 (结果仍会写回)
+    - 同一个键的并发请求只会真正发出一次 (in-flight 合并)
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=None, refresh=False):
+        self.path = path
+        self.ttl = ttl
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        # refresh 模式下本次运行已重新请求过的键，重复条目仍可命中
+        self._refreshed = set()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, title TEXT, author TEXT, data TEXT, created REAL)"
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+
+        # 正在进行中的请求：同步路径用 Event，异步路径用 Future
+        self._inflight_lock = threading.Lock()
+        self._inflight = {}
+        self._async_inflight = {}
+
+    # === 基础读写 ===
+    def get(self, key):
+        if self.refresh and key not in self._refreshed:
+            return None
+        with self._db_lock:
+            row = self._conn.execute("SELECT data, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        data, created = row
+        if self.ttl is not None and time.time() - created > self.ttl:
+            return None
+        return json.loads(data)
+
+    def put(self, key, data, title="", author=""):
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, title, author, data, created) VALUES (?, ?, ?, ?, ?)",
+                (key, title, author, json.dumps(data, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+        self._refreshed.add(key)
+
+    def invalidate(self, key=None):
+        """删除一条缓存；key 为 None 时清空全部"""
+        with self._db_lock:
+            if key is None:
+                self._conn.execute("DELETE FROM responses")
+            else:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def purge_expired(self):
+        if self.ttl is None:
+            return 0
+        with self._db_lock:
+            cur = self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+        return cur.rowcount
+
+    # === 带合并的取数 ===
+    def get_or_fetch(self, key, fetch, title="", author=""):
+        """
+        同步版：命中则直接返回；否则调用 fetch()，并让同时到来的相同请求等待这一次的结果。
+        返回空结果 (LLM 返回了 {}) 不会被缓存；fetch() 抛出的异常原样传给调用方。
+        """
+        data = self.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self._inflight[key] = threading.Event()
+
+        if not owner:
+            self.coalesced += 1
+            event.wait()
+            data = self.get(key)
+            if data is not None:
+                return data
+            # 领头的请求失败了，自己再请求一次
+            return self.get_or_fetch(key, fetch, title, author)
+
+        self.misses += 1
+        try:
+            data = fetch()
+            if data:
+                self.put(key, data, title, author)
+            return data
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    async def aget_or_fetch(self, key, fetch, title="", author=""):
+        """
+        异步版：fetch 是返回协程的函数。相同键的并发请求共享同一个 Future，
+        领头请求的异常也会传给所有等待者。
+        """
+        data = self.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        future = self._async_inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._async_inflight[key] = future
+        try:
+            data = await fetch()
+            if data:
+                self.put(key, data, title, author)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有人等待时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._async_inflight.pop(key, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+    def close(self):
+        self._conn.close()
@@ -1,16 +1,48 @@
 import os
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
+import threading
+import time
+from src.llm_cache import make_cache_key
+from src import metrics
+from src.stream_parser import IncrementalObjectParser, MalformedJSONError
 
-load_dotenv()
+# openai SDK (连带 httpx、pydantic) 导入要将近一秒，且没有配置密钥时直接报错；
+# 因此客户端在第一次真正请求时才创建，只渲染、只校验的命令完全不需要它
+_client = None
+_client_lock = threading.Lock()
 
-api_key = os.getenv("OPENAI_API_KEY")
-base_url = os.getenv("OPENAI_BASE_URL")
 
-client = OpenAI(api_key=api_key, base_url=base_url if base_url else None)
+def load_api_config():
+    """读取 .env 与环境变量，返回 (api_key, base_url)"""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_BASE_URL")
+
+
+def get_client():
+    """进程内共享的同步客户端，首次调用时创建"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                api_key, base_url = load_api_config()
+                _client = OpenAI(api_key=api_key, base_url=base_url if base_url else None)
+    return _client
+
+
+def reset_client():
+    """丢弃已创建的客户端，下次请求时按当前环境变量重新创建 (测试、基准切换服务地址时用)"""
+    global _client
+    with _client_lock:
+        _client = None
+
 
 MODEL_NAME = "deepseek-chat"  # 或 gpt-4-turbo
+TEMPERATURE = 0.7
+
+# 期望 LLM 返回的语言块 (另有 xhs_copy 文案)
+LANGUAGES = ("zh_cn", "zh_tw", "en", "fr", "de", "ru")
 
 # === 核心修改：要求 JSON 包含 author 字段 ===
 SYSTEM_PROMPT = """
@@ -61,26 +93,138 @@ SYSTEM_PROMPT = """
 """
 
 
-def fetch_poem_data_v2(title, author):
+def build_user_prompt(title, author):
     # 提示词微调，强调作者名翻译
-    prompt = f"请处理诗歌：《{title}》，作者：{author}。请确保输出所有 6 种语言的【标题】、【作者名】和【正文】。"
+    return f"请处理诗歌：《{title}》，作者：{author}。请确保输出所有 6 种语言的【标题】、【作者名】和【正文】。"
+
+
+def response_cache_key(title, author):
+    """本模块当前配置 (模型、提示词、温度) 下的缓存键"""
+    return make_cache_key(title, author, MODEL_NAME, SYSTEM_PROMPT, TEMPERATURE)
+
+
+class FetchError(Exception):
+    """
+    结构化的采集错误 (代替过去静默返回的 {})。
+    kind: "api_error" | "malformed_json" | "incomplete"
+    partial: 出错前已经解析出的语言块
+    """
+
+    def __init__(self, kind, message, partial=None, raw=None):
+        super().__init__(f"[{kind}] {message}")
+        self.kind = kind
+        self.message = message
+        self.partial = partial or {}
+        self.raw = raw
+
+    def to_dict(self):
+        return {"kind": self.kind, "message": self.message, "received": sorted(self.partial)}
+
+
+def fetch_poem_data_v2(title, author, cache=None):
+    """
+    :param cache: 可选的 ResponseCache；命中时不再请求模型
+    :return: 多语言字典
+    :raises FetchError: 请求失败 ("api_error") 或返回的不是 JSON 对象 ("malformed_json")
+    """
+    if cache is not None:
+        return cache.get_or_fetch(response_cache_key(title, author),
+                                  lambda: fetch_poem_data_v2(title, author),
+                                  title, author)
+
+    prompt = build_user_prompt(title, author)
     print(f"🤖 正在调用 AI 检索多语言数据 (含作者名本地化)...")
 
     try:
-        response = client.chat.completions.create(
+        with metrics.timer("fetch"):
+            response = get_client().chat.completions.create(
+                model=MODEL_NAME,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"},
+                temperature=TEMPERATURE
+            )
+        content = response.choices[0].message.content
+    except Exception as e:
+        raise FetchError("api_error", str(e)) from e
+
+    with metrics.timer("parse"):
+        try:
+            data = json.loads(content or "")
+        except json.JSONDecodeError as e:
+            raise FetchError("malformed_json", str(e), raw=content) from e
+    if not isinstance(data, dict):
+        raise FetchError("malformed_json", f"返回的不是 JSON 对象: {type(data).__name__}", raw=content)
+    return data
+
+
+def fetch_poem_data_stream(title, author, on_block=None, cache=None):
+    """
+    流式版本 (stream=True)：边生成边增量解析，每个语言块 (zh_cn、en ...) 的对象一闭合
+    就回调 on_block(key, value)，下游可以提前校验或预览。
+    输出格式有误或缺少语言时抛出 FetchError，而不是返回 {}。
+    :return: 完整的多语言字典
+    """
+    if cache is not None:
+        streamed = []
+
+        def fetch():
+            streamed.append(True)
+            return fetch_poem_data_stream(title, author, on_block)
+
+        data = cache.get_or_fetch(response_cache_key(title, author), fetch, title, author)
+        # 命中缓存时没有经过流式解析，把各语言块依次补发给下游
+        if not streamed and on_block is not None:
+            for k, v in data.items():
+                on_block(k, v)
+        return data
+
+    prompt = build_user_prompt(title, author)
+    parser = IncrementalObjectParser()
+
+    # 网络等待与增量解析交替进行，分别累计后各记一次，解析时间不再同时算进 fetch
+    fetch_s = parse_s = 0.0
+    try:
+        start = time.perf_counter()
+        stream = get_client().chat.completions.create(
             model=MODEL_NAME,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             response_format={"type": "json_object"},
-            temperature=0.7
+            temperature=TEMPERATURE,
+            stream=True
         )
-        content = response.choices[0].message.content
-        return json.loads(content)
+        for chunk in stream:
+            fetch_s += time.perf_counter() - start
+            if chunk.choices and chunk.choices[0].delta.content:
+                start = time.perf_counter()
+                blocks = parser.feed(chunk.choices[0].delta.content)
+                parse_s += time.perf_counter() - start
+                for k, v in blocks:
+                    if on_block is not None:
+                        on_block(k, v)
+            start = time.perf_counter()
+        fetch_s += time.perf_counter() - start
+        start = time.perf_counter()
+        data = parser.close()
+        parse_s += time.perf_counter() - start
+    except MalformedJSONError as e:
+        raise FetchError("malformed_json", str(e), partial=parser.members, raw=e.raw) from e
     except Exception as e:
-        print(f"❌ LLM Error: {e}")
-        return {}
+        raise FetchError("api_error", str(e), partial=parser.members) from e
+    finally:
+        metrics.record_time("fetch", fetch_s)
+        metrics.record_time("parse", parse_s)
+
+    missing = [lang for lang in LANGUAGES if lang not in data]
+    if missing:
+        raise FetchError("incomplete", f"缺少语言: {', '.join(missing)}", partial=data)
+    return data
+
 
 # 测试代码（仅在直接运行此文件时执行）
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+from src.checkpoint import atomic_write_text
+from src.font_registry import FALLBACK_VERSION, file_digest
+from src.renderer import RENDERER_VERSION
+from src.template_bg import template_path
+
+MANIFEST_NAME = "manifest.json"
+
+
+def card_hash(data, font_path, font_size, renderer_options=None, fallback_fonts=()):
+    """
+    一张卡片的内容指纹：(标题, 作者, 正文, 字体文件, 字号, 渲染器版本及配置)。
+    任何一项改变都会让指纹变化，从而触发重新渲染。
+    :param fallback_fonts: 实际用到的后备字体；不需要后备字体时不计入，指纹与以前一致
+    """
+    payload = {
+        "title": data.get("title", ""),
+        "author": data.get("author", ""),
+        "content": data.get("content", ""),
+        "font": file_digest(font_path),
+        "font_size": font_size,
+        "renderer": RENDERER_VERSION,
+        "options": renderer_options or {},
+    }
+    if fallback_fonts:
+        payload["fallback_fonts"] = [file_digest(path) for path in fallback_fonts]
+        payload["fallback_version"] = FALLBACK_VERSION
+    if (renderer_options or {}).get("bg_template"):
+        # 模板图片本身换了也要重画
+        payload["bg_template"] = file_digest(template_path(renderer_options["bg_template"]))
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class OutputManifest:
+    """
+    每个输出目录下的 manifest.json：{文件名: 卡片指纹}。
+    超长分页的卡片写成 {文件名: {"digest": 指纹, "files": [ru_1.jpg, ru_2.jpg, ...]}}。
+    指纹一致且图片 (所有分页) 仍在磁盘上时，该卡片可以跳过。
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                # 损坏的清单当作不存在，全部重新渲染
+                self.entries = {}
+
+    def is_fresh(self, filename, digest):
+        entry = self.entries.get(filename)
+        if isinstance(entry, dict):
+            entry_digest, files = entry.get("digest"), entry.get("files") or [filename]
+        else:
+            entry_digest, files = entry, [filename]
+        return (entry_digest == digest
+                and all(os.path.exists(os.path.join(self.output_dir, name)) for name in files))
+
+    def record(self, filename, digest, files=None):
+        """:param files: 实际写出的文件名 (分页时不止一个)；None 表示就是 filename 本身"""
+        if files and list(files) != [filename]:
+            self.entries[filename] = {"digest": digest, "files": list(files)}
+        else:
+            self.entries[filename] = digest
+
+    def save(self):
+        atomic_write_text(self.path, lambda f: json.dump(self.entries, f, ensure_ascii=False, indent=2))
+
+
+class ManifestTracker:
+    """
+    流式渲染时管理多个输出目录的清单：
+    某个目录的任务全部提交 (seal) 且全部完成后立即保存清单并释放，
+    同一时刻只有在途的几个目录留在内存中。
+    """
+
+    def __init__(self):
+        self._manifests = {}
+        self._pending = {}
+        self._sealed = set()
+        self._dirty = set()
+
+    def open(self, output_dir):
+        if output_dir not in self._manifests:
+            self._manifests[output_dir] = OutputManifest(output_dir)
+            self._pending[output_dir] = 0
+        return self._manifests[output_dir]
+
+    def expect(self, output_dir):
+        """登记一张即将渲染的卡片"""
+        self._pending[output_dir] += 1
+
+    def seal(self, output_dir):
+        """该目录不会再有新任务"""
+        self._sealed.add(output_dir)
+        self._maybe_flush(output_dir)
+
+    def done(self, output_dir, filename, digest, ok, files=None):
+        if ok:
+            self._manifests[output_dir].record(filename, digest, files)
+            self._dirty.add(output_dir)
+        self._pending[output_dir] -= 1
+        self._maybe_flush(output_dir)
+
+    def _maybe_flush(self, output_dir):
+        if output_dir in self._sealed and self._pending.get(output_dir) == 0:
+            if output_dir in self._dirty:
+                self._manifests[output_dir].save()
+            self._manifests.pop(output_dir, None)
+            self._pending.pop(output_dir, None)
+            self._sealed.discard(output_dir)
+            self._dirty.discard(output_dir)
+
+    def close(self):
+        """保存所有尚未写出的清单 (例如渲染中途出错时)"""
+        for output_dir in list(self._dirty):
+            if output_dir in self._manifests:
+                self._manifests[output_dir].save()
+        self._manifests.clear()
+        self._pending.clear()
+        self._sealed.clear()
+        self._dirty.clear()
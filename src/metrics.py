@@ -0,0 +1,187 @@
+"""
+轻量的运行指标：各阶段耗时 (fetch/parse/layout/background/draw/encode/write)、计数器、峰值内存。
+默认关闭；关闭时 timer() 返回一个共享的空上下文，incr() 只做一次布尔判断，几乎没有开销。
+
+    from src import metrics
+    metrics.enable()
+    with metrics.timer("layout"):
+        ...
+    metrics.incr("image_bytes", n)
+    metrics.export_jsonl("metrics.jsonl", {"command": "render"})
+    metrics.export_prometheus("metrics.prom")
+"""
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+from src.checkpoint import atomic_write_text
+
+_NULL = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("registry", "stage", "start")
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.record_time(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.timings = {}  # stage -> [次数, 总秒数, 最大秒数]
+            self.counters = {}
+            self.started = time.time()
+
+    def timer(self, stage):
+        return _Timer(self, stage) if self.enabled else _NULL
+
+    def record_time(self, stage, seconds):
+        with self._lock:
+            t = self.timings.get(stage)
+            if t is None:
+                self.timings[stage] = [1, seconds, seconds]
+            else:
+                t[0] += 1
+                t[1] += seconds
+                if seconds > t[2]:
+                    t[2] = seconds
+
+    def incr(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self, reset=False):
+        """可 pickle 的快照，用于从工作进程汇总到主进程"""
+        with self._lock:
+            snap = {"timings": {k: list(v) for k, v in self.timings.items()},
+                    "counters": dict(self.counters),
+                    "peak_rss_bytes": peak_rss_bytes()}
+        if reset:
+            self.reset()
+        return snap
+
+    def merge(self, snap):
+        if not snap:
+            return
+        with self._lock:
+            for stage, (count, total, longest) in snap["timings"].items():
+                t = self.timings.setdefault(stage, [0, 0.0, 0.0])
+                t[0] += count
+                t[1] += total
+                t[2] = max(t[2], longest)
+            for name, value in snap["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            worker_peak = snap.get("peak_rss_bytes", 0)
+            if worker_peak > self.counters.get("worker_peak_rss_bytes", 0):
+                self.counters["worker_peak_rss_bytes"] = worker_peak
+
+
+def peak_rss_bytes():
+    """当前进程的峰值常驻内存 (字节)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+_registry = Metrics()
+
+
+def enable(on=True):
+    _registry.enabled = on
+
+
+def is_enabled():
+    return _registry.enabled
+
+
+def timer(stage):
+    return _registry.timer(stage)
+
+
+def record_time(stage, seconds):
+    """直接记一次耗时 (分段累计的耗时用它一次记入，不方便用 timer 包住时)"""
+    if _registry.enabled:
+        _registry.record_time(stage, seconds)
+
+
+def incr(name, value=1):
+    _registry.incr(name, value)
+
+
+def snapshot(reset=False):
+    return _registry.snapshot(reset)
+
+
+def merge(snap):
+    _registry.merge(snap)
+
+
+def reset():
+    _registry.reset()
+
+
+def summary(extra=None):
+    snap = _registry.snapshot()
+    stages = {stage: {"count": c, "total_s": round(total, 6), "mean_s": round(total / c, 6) if c else 0,
+                      "max_s": round(longest, 6)}
+              for stage, (c, total, longest) in sorted(snap["timings"].items())}
+    record = {
+        "started": _registry.started,
+        "finished": time.time(),
+        "pid": os.getpid(),
+        "stages": stages,
+        "counters": snap["counters"],
+        "peak_rss_bytes": snap["peak_rss_bytes"],
+    }
+    if extra:
+        record.update(extra)
+    return record
+
+
+def export_jsonl(path, extra=None):
+    """把本次运行的汇总追加为一行 JSON"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(summary(extra), ensure_ascii=False) + "\n")
+
+
+def export_prometheus(path, prefix="poemcard"):
+    """写出 node_exporter textfile 格式 (原子替换，避免被采集到写了一半的文件)"""
+    rec = summary()
+    lines = [
+        f"# HELP {prefix}_stage_seconds_total Total time spent per pipeline stage.",
+        f"# TYPE {prefix}_stage_seconds_total counter",
+    ]
+    lines += [f'{prefix}_stage_seconds_total{{stage="{s}"}} {v["total_s"]}' for s, v in rec["stages"].items()]
+    lines += [f"# HELP {prefix}_stage_calls_total Number of times each stage ran.",
+              f"# TYPE {prefix}_stage_calls_total counter"]
+    lines += [f'{prefix}_stage_calls_total{{stage="{s}"}} {v["count"]}' for s, v in rec["stages"].items()]
+    lines += [f"# HELP {prefix}_stage_seconds_max Slowest single run of each stage.",
+              f"# TYPE {prefix}_stage_seconds_max gauge"]
+    lines += [f'{prefix}_stage_seconds_max{{stage="{s}"}} {v["max_s"]}' for s, v in rec["stages"].items()]
+    for name, value in sorted(rec["counters"].items()):
+        lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+    lines += [f"# TYPE {prefix}_peak_rss_bytes gauge", f"{prefix}_peak_rss_bytes {rec['peak_rss_bytes']}",
+              f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+              f"{prefix}_last_run_timestamp_seconds {rec['finished']}"]
+    atomic_write_text(path, lambda f: f.write("\n".join(lines) + "\n"))
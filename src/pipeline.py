@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class FetchPipeline:
+    """
+    采集 → 渲染流水线的前半段：若干采集线程把结果放进有界队列，下游边取边渲染，
+    第 N 首诗渲染的同时第 N+1 首已经在请求。队列满时采集线程阻塞 (背压)，
+    在内存里排队的诗歌最多 queue_size 首，与总数无关。
+
+        pipe = FetchPipeline(items, fetch_fn, concurrency=4, queue_size=8)
+        for item, data, error in pipe:
+            ...
+        print(pipe.starved_s, pipe.blocked_s)
+
+    采集线程在第一次迭代时启动；下游要先处理别的数据时，可以提前调用 start() 让采集先跑起来，
+    此时须在 finally 中调用 close()。
+    """
+
+    def __init__(self, items, fetch_fn, concurrency=4, queue_size=8):
+        """
+        :param fetch_fn: fetch_fn(item) -> data，在采集线程中调用；抛出的异常作为 error 交给下游
+        :param concurrency: 采集线程数
+        :param queue_size: 已采集、等待渲染的诗歌上限
+        """
+        self.fetch_fn = fetch_fn
+        self.concurrency = max(1, concurrency)
+        self._items = iter(items)
+        self._items_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._threads = None
+        # 下游等待采集的总时长 (渲染"饿着") 与采集线程因队列已满而阻塞的总时长
+        self.starved_s = 0.0
+        self.blocked_s = 0.0
+
+    def _next_item(self):
+        with self._items_lock:
+            return next(self._items, _DONE)
+
+    def _put(self, entry):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self._queue.put(entry, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.blocked_s += waited
+
+    def _worker(self):
+        try:
+            while not self._stop.is_set():
+                item = self._next_item()
+                if item is _DONE:
+                    return
+                try:
+                    entry = (item, self.fetch_fn(item), None)
+                except Exception as e:
+                    entry = (item, None, e)
+                self._put(entry)
+        finally:
+            self._put(_DONE)
+
+    def start(self):
+        """启动采集线程 (重复调用无副作用)"""
+        if self._threads is None:
+            self._threads = [threading.Thread(target=self._worker, name=f"fetch-{i}", daemon=True)
+                             for i in range(self.concurrency)]
+            for t in self._threads:
+                t.start()
+        return self
+
+    def close(self):
+        """通知采集线程停下并等待退出；正在进行的请求会等它结束"""
+        self._stop.set()
+        for t in self._threads or ():
+            t.join()
+
+    def __iter__(self):
+        self.start()
+        running = len(self._threads)
+        try:
+            while running:
+                start = time.perf_counter()
+                entry = self._queue.get()
+                self.starved_s += time.perf_counter() - start
+                if entry is _DONE:
+                    running -= 1
+                    continue
+                yield entry
+        finally:
+            # 下游提前退出 (异常或中断) 时通知采集线程停下
+            self.close()
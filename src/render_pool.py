@@ -0,0 +1,161 @@
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from tqdm import tqdm
+from src.renderer import DynamicRenderer
+from src.template_bg import get_template
+from src import metrics
+
+# 每个工作进程各自持有一个渲染器 (在 _init_worker 中创建)
+_worker_renderer = None
+
+
+def _init_worker(renderer_kwargs, fonts=(), metrics_enabled=False):
+    """
+    工作进程初始化：创建本进程专属的 DynamicRenderer，预热字体缓存和标准尺寸背景，
+    之后该进程处理的所有卡片都复用这份热状态。
+    :param fonts: 需要预加载的 (字体路径, 字号) 列表
+    :param metrics_enabled: 主进程开启了指标采集时，工作进程也采集并随结果回传
+    """
+    global _worker_renderer
+    metrics.enable(metrics_enabled)
+    # 进程之间已经并行，工作进程内部同步编码，保证任务返回时图片已经写完
+    renderer_kwargs = dict(renderer_kwargs, encode_threads=0)
+    _worker_renderer = DynamicRenderer(verbose=False, **renderer_kwargs)
+    r = _worker_renderer
+    for font_path, size in fonts:
+        r._get_font(font_path, size)
+    r.background(1660)
+    # 预热阶段的耗时不计入
+    metrics.reset()
+
+
+def _pool_render_job(job):
+    """进程池入口：在 render_job 结果后附上本进程自上次以来的指标增量"""
+    path, err, pages = render_job(job)
+    return path, err, pages, metrics.snapshot(reset=True) if metrics.is_enabled() else None
+
+
+def _start_render(renderer, job):
+    """:return: (输出文件列表, 后台编码中的 Future 列表)"""
+    return renderer.render_pages(
+        data=job["data"],
+        font_path=job["font_path"],
+        output_path=job["output_path"],
+        font_size=job.get("font_size", 40),
+        fallback_fonts=job.get("fallback_fonts", ())
+    )
+
+
+def render_job(job, renderer=None):
+    """
+    渲染单张卡片。任何异常都在这里捕获并作为结果返回，一张失败不会影响其它卡片。
+    :param job: {"data": ..., "font_path": ..., "output_path": ..., "font_size": ..., "fallback_fonts": (可选)}
+    :return: (output_path, 错误信息或 None, 实际写出的文件列表 (超长分页时不止一个))
+    """
+    renderer = renderer or _worker_renderer
+    try:
+        pages, futures = _start_render(renderer, job)
+        for future in futures:
+            future.result()
+        return job["output_path"], None, pages
+    except Exception as e:
+        return job["output_path"], f"{e}\n{traceback.format_exc()}", None
+
+
+def render_jobs(jobs, workers=1, renderer_kwargs=None, on_done=None, total=None, fonts=None):
+    """
+    批量渲染 (poem, lang) 任务。
+    workers <= 1 时在当前进程串行执行；否则分发到 ProcessPoolExecutor。
+    jobs 可以是生成器：进程池模式下同时在途的任务数不超过 workers * 4，内存不随任务总数增长。
+    :param on_done: 每张卡片完成时在主进程回调 on_done(job, 错误信息或 None)；
+                    成功时 job["pages"] 为实际写出的文件列表
+    :param total: 任务总数 (仅用于进度条，可不传)
+    :param fonts: 工作进程需要预加载的 (字体路径, 字号)；为 None 时从 jobs 中收集 (要求 jobs 是列表)
+    :return: (成功数, 失败列表 [(output_path, 错误信息)])
+    """
+    renderer_kwargs = renderer_kwargs or {}
+    failures = []
+    done = 0
+
+    def finish(job, path, err, pages=None):
+        nonlocal done
+        job["pages"] = pages
+        if err:
+            failures.append((path, err))
+            metrics.incr("cards_failed")
+        else:
+            done += 1
+            metrics.incr("cards_rendered")
+        if on_done is not None:
+            on_done(job, err)
+
+    if workers <= 1:
+        renderer = DynamicRenderer(**renderer_kwargs)
+        # 开启后台编码时，已提交但未写完的卡片按提交顺序排队，写完再回调
+        encoding = deque()
+
+        def settle(job, pages, futures):
+            try:
+                for future in futures:
+                    future.result()
+                finish(job, job["output_path"], None, pages)
+            except Exception as e:
+                finish(job, job["output_path"], f"{e}\n{traceback.format_exc()}")
+
+        try:
+            for job in jobs:
+                try:
+                    pages, futures = _start_render(renderer, job)
+                except Exception as e:
+                    finish(job, job["output_path"], f"{e}\n{traceback.format_exc()}")
+                    continue
+                if not futures:
+                    finish(job, job["output_path"], None, pages)
+                else:
+                    encoding.append((job, pages, futures))
+                while encoding and all(f.done() for f in encoding[0][2]):
+                    settle(*encoding.popleft())
+        finally:
+            while encoding:
+                settle(*encoding.popleft())
+            renderer.close()
+        return done, failures
+
+    if fonts is None:
+        # 标题 75、作者 38 加上各任务的正文字号
+        fonts = set()
+        for job in jobs:
+            for size in (75, 38, job.get("font_size", 40)):
+                fonts.add((job["font_path"], size))
+
+    if renderer_kwargs.get("bg_template"):
+        # 模板在主进程解码一次写成像素文件，工作进程启动时直接映射，不再各自解码
+        get_template(renderer_kwargs["bg_template"])
+
+    max_pending = workers * 4
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(renderer_kwargs, sorted(fonts), metrics.is_enabled())) as pool:
+        pending = {}
+        with tqdm(total=total, desc="渲染", unit="张") as bar:
+            def collect(finished):
+                for future in finished:
+                    job = pending.pop(future)
+                    try:
+                        path, err, pages, snap = future.result()
+                        metrics.merge(snap)
+                    except Exception as e:
+                        # 工作进程本身崩溃 (如被系统杀掉) 时 future 会抛出异常
+                        path, err, pages = job["output_path"], repr(e), None
+                    finish(job, path, err, pages)
+                    bar.set_postfix(失败=len(failures))
+                    bar.update(1)
+
+            for job in jobs:
+                if len(pending) >= max_pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                pending[pool.submit(_pool_render_job, job)] = job
+            collect(as_completed(list(pending)))
+
+    return done, failures
@@ -0,0 +1,322 @@
+"""
+多机渲染任务队列 (SQLite)。
+第二步把 (诗, 语言) 任务写进队列文件，任意多个工作进程 / 机器各自领取任务渲染：
+
+    python main.py render --queue render_queue.sqlite        # 入队 (跳过内容未变化的卡片)
+    python main.py worker --queue render_queue.sqlite --workers 8  # 每台机器上各启动若干工作进程
+    python main.py queue-status --queue render_queue.sqlite  # 查看进度，并把完成的卡片写入输出清单
+
+领取任务时带有限期租约 (lease)，工作进程渲染期间定时续约 (heartbeat)；
+进程崩溃或机器掉线后租约过期，任务会被其他工作进程重新领取，整批任务不会卡住。
+多台机器共用队列时，队列文件和 output 目录需放在同一个共享文件系统上，且该文件系统的文件锁可靠
+(SQLite 依赖 POSIX 锁，部分 NFS 挂载方式不支持)；各机器都在项目根目录下运行，字体等相对路径才一致。
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_QUEUE_PATH = "./render_queue.sqlite"
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class RenderQueue:
+    """
+    jobs 表的一行是一张卡片，id 为输出路径：
+        state: pending -> leased -> done / failed (失败次数未到上限时回到 pending)
+        lease_until: 租约到期时间；过期的 leased 任务视同 pending
+    每个进程各自打开一个连接；领取用 BEGIN IMMEDIATE 串行化，同一任务不会同时被两个进程领到。
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, lease_seconds=60, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 自己管理事务 (isolation_level=None)；等锁最多 30 秒
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, job TEXT, digest TEXT, state TEXT, worker TEXT, lease_until REAL, "
+            "attempts INTEGER DEFAULT 0, error TEXT, files TEXT, synced INTEGER DEFAULT 0, updated REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until)")
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    def _transaction(self, fn):
+        """在 BEGIN IMMEDIATE 事务中执行 fn(conn)：事务一开始就拿到写锁，读改写之间不会被别的进程插入"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    # === 入队 ===
+    def enqueue(self, jobs, batch_size=500, force=False):
+        """
+        写入任务 (可以是生成器)。已完成且指纹相同的任务保持不变，其余的 (新任务、内容变了的、失败过的) 重置为 pending。
+        :param jobs: render_pool 格式的任务字典，需带 "manifest": (输出目录, 文件名, 指纹)
+        :param force: 全部重置为 pending (对应 render --force)；正在渲染的任务也会重新领取，原持有者的结果不再登记
+        :return: 实际入队 (新增或重置) 的任务数
+        """
+        added = 0
+
+        def write(conn, rows):
+            n = 0
+            for job_id, payload, digest in rows:
+                row = conn.execute("SELECT digest, state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if not force and row is not None and row[0] == digest and row[1] in (DONE, LEASED):
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs (id, job, digest, state, worker, lease_until, attempts, error, "
+                    "files, synced, updated) VALUES (?, ?, ?, ?, NULL, NULL, 0, NULL, NULL, 0, ?)",
+                    (job_id, payload, digest, PENDING, time.time()))
+                n += 1
+            return n
+
+        rows = []
+        for job in jobs:
+            rows.append((job["output_path"], json.dumps(job, ensure_ascii=False), job["manifest"][2]))
+            if len(rows) >= batch_size:
+                added += self._transaction(lambda conn: write(conn, rows))
+                rows = []
+        if rows:
+            added += self._transaction(lambda conn: write(conn, rows))
+        return added
+
+    # === 工作进程 ===
+    def claim(self, worker_id, limit=1):
+        """
+        领取最多 limit 个任务 (pending 或租约已过期的)，租约为 lease_seconds。
+        过期次数达到 max_attempts 的任务 (例如每次都把工作进程撑爆) 标记为 failed，不再领取。
+        :return: [任务字典]，每个字典带 "queue_id"
+        """
+        def take(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? "
+                "WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, "租约多次过期 (工作进程崩溃或卡死)", now, LEASED, now, self.max_attempts))
+            rows = conn.execute(
+                "SELECT id, job FROM jobs WHERE state = ? OR (state = ? AND lease_until < ?) LIMIT ?",
+                (PENDING, LEASED, now, limit)).fetchall()
+            for job_id, _ in rows:
+                conn.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                    "WHERE id = ?", (LEASED, worker_id, now + self.lease_seconds, now, job_id))
+            return rows
+
+        jobs = []
+        for job_id, payload in self._transaction(take):
+            job = json.loads(payload)
+            job["queue_id"] = job_id
+            jobs.append(job)
+        return jobs
+
+    def heartbeat(self, worker_id, job_ids):
+        """
+        为手上的任务续约。
+        :return: 已经不属于本进程的任务 id (租约过期后被别人领走了)
+        """
+        if not job_ids:
+            return set()
+
+        def renew(conn):
+            lost = set()
+            until = time.time() + self.lease_seconds
+            for job_id in job_ids:
+                cur = conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND state = ? AND worker = ?",
+                                   (until, job_id, LEASED, worker_id))
+                if cur.rowcount == 0:
+                    lost.add(job_id)
+            return lost
+
+        return self._transaction(renew)
+
+    def complete(self, worker_id, job_id, files):
+        """
+        标记完成 (图片已原子写入)。只有仍持有租约时才生效。
+        :return: 是否生效；False 表示租约已被别人接手，本次结果由对方负责登记
+        """
+        def done(conn):
+            cur = conn.execute(
+                "UPDATE jobs SET state = ?, files = ?, error = NULL, lease_until = NULL, updated = ? "
+                "WHERE id = ? AND state = ? AND worker = ?",
+                (DONE, json.dumps(files, ensure_ascii=False), time.time(), job_id, LEASED, worker_id))
+            return cur.rowcount == 1
+
+        return self._transaction(done)
+
+    def fail(self, worker_id, job_id, error):
+        """渲染出错：次数未到上限时放回 pending 重试，否则标记为 failed"""
+        def mark(conn):
+            conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "error = ?, lease_until = NULL, updated = ? WHERE id = ? AND state = ? AND worker = ?",
+                (self.max_attempts, FAILED, PENDING, error, time.time(), job_id, LEASED, worker_id))
+
+        self._transaction(mark)
+
+    # === 进度与收尾 ===
+    def counts(self):
+        """:return: {状态: 任务数}；租约已过期的 leased 任务计入 "expired" """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT CASE WHEN state = ? AND lease_until < ? THEN 'expired' ELSE state END, COUNT(*) "
+                "FROM jobs GROUP BY 1", (LEASED, now)).fetchall()
+        return dict(rows)
+
+    def is_drained(self):
+        """没有待领取、也没有被领取中的任务"""
+        counts = self.counts()
+        return not (counts.get(PENDING) or counts.get(LEASED) or counts.get("expired"))
+
+    def failures(self):
+        with self._lock:
+            return self._conn.execute("SELECT id, error FROM jobs WHERE state = ?", (FAILED,)).fetchall()
+
+    def sync_manifests(self):
+        """
+        把已完成但还没登记的卡片写入各输出目录的 manifest.json。
+        在写锁内完成，多台机器同时调用时也不会互相覆盖清单。
+        :return: 本次登记的卡片数
+        """
+        from src.manifest import OutputManifest
+
+        def sync(conn):
+            rows = conn.execute("SELECT id, job, files FROM jobs WHERE state = ? AND synced = 0", (DONE,)).fetchall()
+            by_dir = defaultdict(list)
+            for job_id, payload, files in rows:
+                output_dir, filename, digest = json.loads(payload)["manifest"]
+                by_dir[output_dir].append((filename, digest, json.loads(files) if files else None))
+            for output_dir, entries in by_dir.items():
+                manifest = OutputManifest(output_dir)
+                for filename, digest, files in entries:
+                    manifest.record(filename, digest, files)
+                manifest.save()
+            conn.executemany("UPDATE jobs SET synced = 1 WHERE id = ?", [(row[0],) for row in rows])
+            return len(rows)
+
+        return self._transaction(sync)
+
+
+class _Heartbeat(threading.Thread):
+    """后台线程：每 lease_seconds / 3 秒为当前手上的任务续约"""
+
+    def __init__(self, queue, worker_id):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.worker_id = worker_id
+        self.held = set()
+        self.lost = set()
+        self._held_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def hold(self, job_ids):
+        job_ids = set(job_ids)
+        with self._held_lock:
+            # 同一任务之后可能又被本进程领回来，旧的 "已丢失" 记录作废
+            self.lost -= job_ids
+            self.held |= job_ids
+
+    def release(self, job_id):
+        with self._held_lock:
+            self.held.discard(job_id)
+
+    def is_lost(self, job_id):
+        """续约时发现该任务已被别人领走 (或被 --force 重新入队)"""
+        with self._held_lock:
+            return job_id in self.lost
+
+    def run(self):
+        while not self._stopping.wait(self.queue.lease_seconds / 3):
+            with self._held_lock:
+                held = list(self.held)
+            try:
+                lost = self.queue.heartbeat(self.worker_id, held)
+            except sqlite3.Error as e:
+                # 数据库暂时忙或共享盘抖动：下一轮再试，租约还有余量
+                print(f"⚠️ 续约失败: {e}")
+                continue
+            with self._held_lock:
+                self.lost |= lost
+                self.held -= lost
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+
+
+def run_worker(queue_path=DEFAULT_QUEUE_PATH, worker_id=None, lease_seconds=60, claim_batch=1, poll=2.0,
+               max_attempts=3):
+    """
+    工作进程主循环：领取 -> 渲染 (原子写入) -> 标记完成，直到队列里没有待办也没有在办的任务。
+    别的进程还持有租约时不会退出，而是隔 poll 秒再看，租约过期的任务由本进程接手。
+    :param claim_batch: 每次领取的任务数；渲染一张卡片远慢于一次领取，默认一次一张，负载最均衡
+    :return: {"worker", "done", "failed", "lost"}
+    """
+    from src.render_pool import render_job
+    from src.renderer import DynamicRenderer
+
+    worker_id = worker_id or default_worker_id()
+    queue = RenderQueue(queue_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    heartbeat = _Heartbeat(queue, worker_id)
+    heartbeat.start()
+    renderers = {}
+    stats = {"worker": worker_id, "done": 0, "failed": 0, "lost": 0}
+    try:
+        while True:
+            jobs = queue.claim(worker_id, limit=claim_batch)
+            if not jobs:
+                if queue.is_drained():
+                    break
+                time.sleep(poll)
+                continue
+            heartbeat.hold(job["queue_id"] for job in jobs)
+            for job in jobs:
+                if heartbeat.is_lost(job["queue_id"]):
+                    # 还没开始画租约就丢了 (例如前一张卡片画得太久)：任务已归别人，不再渲染
+                    heartbeat.release(job["queue_id"])
+                    stats["lost"] += 1
+                    continue
+                # 同一批任务的渲染参数相同，每种参数只创建一个渲染器；工作进程内同步编码
+                options = job.get("render_options") or {}
+                key = json.dumps(options, sort_keys=True)
+                if key not in renderers:
+                    renderers[key] = DynamicRenderer(verbose=False, **dict(options, encode_threads=0))
+                _, err, pages = render_job(job, renderers[key])
+                heartbeat.release(job["queue_id"])
+                if heartbeat.is_lost(job["queue_id"]):
+                    # 渲染期间租约被别人接手：结果由新的持有者负责登记，这里既不标记完成也不记失败
+                    stats["lost"] += 1
+                elif err:
+                    queue.fail(worker_id, job["queue_id"], err)
+                    stats["failed"] += 1
+                elif queue.complete(worker_id, job["queue_id"], [os.path.basename(p) for p in pages]):
+                    stats["done"] += 1
+                else:
+                    stats["lost"] += 1
+    finally:
+        heartbeat.stop()
+        for renderer in renderers.values():
+            renderer.close()
+        queue.close()
+    return stats
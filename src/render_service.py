@@ -0,0 +1,312 @@
+"""
+常驻的本地渲染服务 (asyncio + 标准库，无额外依赖)，供 CMS 按需请求单张卡片：
+
+    python main.py serve --port 8765 --workers 2
+    curl -X POST http://127.0.0.1:8765/render -d '{"lang": "ru", "title": "...", "author": "...", "content": "..."}' -o card.jpg
+
+- 工作进程启动时就预热好字体和标准尺寸背景，之后每个请求只付渲染本身的时间
+- 图片按卡片指纹存放在输出目录 ({指纹}.jpg)，同一张卡片再次请求直接返回已有文件
+- 同时到来的相同请求 (指纹相同) 只渲染一次，其余请求等待同一个结果
+- GET /stats 返回请求计数和 p50/p99 延迟
+
+接口：
+    POST /render  {"lang", "title", "author", "content", "font_size"?, "response"?: "image" | "json"}
+                  title / author / content 须为字符串，font_size 为 10~200 的整数，否则返回 400
+                  默认直接返回图片；"json" 或卡片被分页时返回 {"digest", "files", "cached", "ms"}
+    GET  /stats   计数与延迟分位数
+    GET  /health
+"""
+import asyncio
+import json
+import math
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src import metrics
+from src.encoder import FORMATS
+from src.checkpoint import atomic_write_text
+from src.manifest import OutputManifest, card_hash
+from src.render_pool import _init_worker, _pool_render_job
+from src.template_bg import get_template
+
+MAX_BODY = 1024 * 1024
+# 请求可指定的正文字号范围；超出时返回 400 (<= 0 会退回 Pillow 默认字体，过大会让工作进程卡住)
+FONT_SIZE_RANGE = (10, 200)
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def percentile(sorted_values, q):
+    """最近秩法分位数；sorted_values 须已排序，空列表返回 None"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class LatencyWindow:
+    """最近 size 个请求的延迟 (毫秒)，按需计算分位数"""
+
+    def __init__(self, size=10000):
+        self.samples = deque(maxlen=size)
+
+    def add(self, ms):
+        self.samples.append(ms)
+
+    def summary(self):
+        values = sorted(self.samples)
+        p50, p99 = percentile(values, 50), percentile(values, 99)
+        return {"count": len(values),
+                "p50": round(p50, 1) if p50 is not None else None,
+                "p99": round(p99, 1) if p99 is not None else None}
+
+
+def _init_service_worker(*args):
+    """工作进程忽略 Ctrl+C，由主进程统一收尾 (否则会继承 asyncio 的 SIGINT 处理并各自打印异常)"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _init_worker(*args)
+
+
+def _ping():
+    """让进程池把所有工作进程都启动起来 (启动时 _init_worker 完成预热)"""
+    time.sleep(0.2)
+    return os.getpid()
+
+
+class RenderService:
+    """
+    :param choose_fonts: choose_fonts(lang, data) -> (主字体路径, 后备字体元组)；由 main.py 按 FONT_CONFIG 提供
+    :param languages: 接受的语言代码
+    :param render_options: DynamicRenderer 的参数，服务运行期间固定 (计入卡片指纹)
+    :param warm_fonts: 工作进程预加载的 (字体路径, 字号)
+    """
+
+    def __init__(self, choose_fonts, languages, workers=2, render_options=None, output_dir="./output/service",
+                 warm_fonts=()):
+        self.choose_fonts = choose_fonts
+        self.languages = set(languages)
+        self.workers = max(1, workers)
+        self.render_options = dict(render_options or {})
+        self.output_dir = output_dir
+        self.warm_fonts = sorted(warm_fonts)
+        output_format = self.render_options.get("output_format") or {}
+        self.extension = FORMATS[output_format.get("format", "jpeg")][1]
+        self.content_type = "image/" + FORMATS[output_format.get("format", "jpeg")][0].lower()
+        # 与命令行渲染一致：编码线程数之类不影响图片内容的参数不计入指纹
+        self.hash_options = {k: v for k, v in self.render_options.items()
+                             if k not in ("encode_threads", "encode_queue", "glyph_cache", "glyph_cache_bytes")}
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = OutputManifest(output_dir)
+        self._pool = None
+        self._inflight = {}
+        self._save_lock = None
+        self.stats = {"requests": 0, "rendered": 0, "hits": 0, "coalesced": 0, "errors": 0}
+        self.latency = {"all": LatencyWindow(), "render": LatencyWindow(), "hit": LatencyWindow()}
+
+    # === 进程池 ===
+    async def start_pool(self):
+        if self.render_options.get("bg_template"):
+            # 与批量渲染相同：模板只在主进程解码一次，工作进程映射解码好的像素
+            get_template(self.render_options["bg_template"])
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_service_worker,
+            initargs=(self.render_options, self.warm_fonts, metrics.is_enabled()))
+        self._save_lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _ping) for _ in range(self.workers)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self.manifest.save()
+
+    # === 渲染 ===
+    def _job(self, request):
+        lang = request.get("lang")
+        if not isinstance(lang, str) or lang not in self.languages:
+            raise ValueError(f"未知或缺少 lang: {lang!r}，可选: {', '.join(sorted(self.languages))}")
+        data = {}
+        for field, default in (("title", "Unknown"), ("author", "Unknown"), ("content", None)):
+            if field not in request and default is None:
+                raise ValueError(f"缺少 {field}")
+            value = request.get(field, default)
+            if not isinstance(value, str):
+                raise ValueError(f"{field} 须为字符串: {value!r}")
+            data[field] = value
+        if not data["content"].strip():
+            raise ValueError("content 不能为空")
+
+        font_size = request.get("font_size", 40)
+        low, high = FONT_SIZE_RANGE
+        if isinstance(font_size, bool) or not isinstance(font_size, int) or not low <= font_size <= high:
+            raise ValueError(f"font_size 须为 {low}~{high} 之间的整数: {font_size!r}")
+        font_path, fallback_fonts = self.choose_fonts(lang, data)
+        digest = card_hash(data, font_path, font_size, self.hash_options, fallback_fonts)
+        filename = f"{digest}{self.extension}"
+        return digest, filename, {
+            "data": data,
+            "font_path": font_path,
+            "fallback_fonts": fallback_fonts,
+            "output_path": os.path.join(self.output_dir, filename),
+            "font_size": font_size,
+        }
+
+    async def _render(self, digest, filename, job):
+        loop = asyncio.get_running_loop()
+        _, err, pages, snap = await loop.run_in_executor(self._pool, _pool_render_job, job)
+        metrics.merge(snap)
+        if err:
+            raise RuntimeError(err)
+        files = [os.path.basename(p) for p in pages]
+        self.manifest.record(filename, digest, files)
+        # 清单写盘放到线程里，不阻塞事件循环；写的是当时的快照，且同一时刻只有一个写盘线程
+        async with self._save_lock:
+            snapshot = dict(self.manifest.entries)
+            await loop.run_in_executor(None, _save_json, self.manifest.path, snapshot)
+        return files
+
+    async def render(self, request):
+        """
+        :return: (指纹, 文件名列表, 状态 "hit" | "render" | "coalesced")
+        """
+        digest, filename, job = self._job(request)
+        if self.manifest.is_fresh(filename, digest):
+            self.stats["hits"] += 1
+            entry = self.manifest.entries[filename]
+            return digest, entry["files"] if isinstance(entry, dict) else [filename], "hit"
+
+        task = self._inflight.get(digest)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return digest, await asyncio.shield(task), "coalesced"
+
+        task = self._inflight[digest] = asyncio.ensure_future(self._render(digest, filename, job))
+        try:
+            files = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(digest, None)
+        self.stats["rendered"] += 1
+        return digest, files, "render"
+
+    # === HTTP ===
+    async def _dispatch(self, method, path, body):
+        """:return: (状态码, Content-Type, 响应体字节)"""
+        if path == "/health":
+            return 200, "application/json", b'{"ok": true}'
+        if path == "/stats":
+            return 200, "application/json", json.dumps(self.report(), ensure_ascii=False).encode("utf-8")
+        if path != "/render":
+            return 404, "application/json", b'{"error": "not found"}'
+        if method != "POST":
+            return 405, "application/json", b'{"error": "use POST"}'
+
+        start = time.perf_counter()
+        self.stats["requests"] += 1
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("请求体须为 JSON 对象")
+            digest, files, how = await self.render(request)
+        except (ValueError, TypeError) as e:
+            self.stats["errors"] += 1
+            return 400, "application/json", json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+        except Exception as e:
+            self.stats["errors"] += 1
+            return 500, "application/json", json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+
+        if request.get("response", "image") == "image" and len(files) == 1:
+            path = os.path.join(self.output_dir, files[0])
+            payload = await asyncio.get_running_loop().run_in_executor(None, _read_bytes, path)
+            status, content_type = 200, self.content_type
+        else:
+            ms = (time.perf_counter() - start) * 1000
+            payload = json.dumps({"digest": digest, "files": files, "cached": how == "hit", "ms": round(ms, 1)},
+                                 ensure_ascii=False).encode("utf-8")
+            status, content_type = 200, "application/json"
+
+        ms = (time.perf_counter() - start) * 1000
+        self.latency["all"].add(ms)
+        self.latency["hit" if how == "hit" else "render"].add(ms)
+        return status, content_type, payload
+
+    async def _handle(self, reader, writer):
+        """最小的 HTTP/1.1 实现：Content-Length 请求体，支持 keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    status, content_type, payload = 413, "application/json", b'{"error": "body too large"}'
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, content_type, payload = await self._dispatch(method, target.split("?")[0], body)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                writer.write(
+                    f"{version} {status} {_REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def report(self):
+        return dict(self.stats, inflight=len(self._inflight),
+                    latency_ms={name: window.summary() for name, window in self.latency.items()})
+
+    async def serve_forever(self, host="127.0.0.1", port=8765):
+        await self.start_pool()
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f"🌐 渲染服务已启动: http://{host}:{port}/render ({self.workers} 个预热的工作进程，输出目录 {self.output_dir})")
+        async with server:
+            await server.serve_forever()
+
+
+def _save_json(path, entries):
+    atomic_write_text(path, lambda f: json.dump(entries, f, ensure_ascii=False, indent=2))
+
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def run_service(service, host="127.0.0.1", port=8765):
+    """阻塞运行服务，Ctrl+C 退出时打印请求统计和延迟分位数"""
+    try:
+        asyncio.run(service.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        report = service.report()
+        latency = report["latency_ms"]
+        print(f"\n📊 共 {report['requests']} 个请求：渲染 {report['rendered']}，命中已有图片 {report['hits']}，"
+              f"合并 {report['coalesced']}，出错 {report['errors']}")
+        for name in ("all", "render", "hit"):
+            if latency[name]["count"]:
+                print(f"   {name:>6}: p50 {latency[name]['p50']} ms，p99 {latency[name]['p99']} ms "
+                      f"({latency[name]['count']} 个)")
+    return 0
@@ -1,13 +1,29 @@
+import hashlib
+import os
 import re
-from PIL import Image, ImageDraw, ImageFont
-from src.dynamic_bg import create_dynamic_background  # 引入刚才写的背景模块
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from PIL import Image, ImageDraw
+from src.dynamic_bg import BackgroundCache  # 引入刚才写的背景模块
+from src.template_bg import get_template
+from src.font_cache import get_font, get_metrics
+from src.font_registry import FallbackFont, get_fallback_font, get_registry
+from src.linebreak import LINE_BREAKERS
+from src.encoder import ImageEncoder
+from src.glyph_atlas import GlyphAtlas
+from src import metrics
 
 
-# 如果尚未安装 langdetect，请先 pip install langdetect
-# from langdetect import detect
+# 渲染效果有变化时递增，输出清单据此判断旧图片是否需要重画
+RENDERER_VERSION = "3.1"
+
 
 class DynamicRenderer:
-    def __init__(self):
+    def __init__(self, bg_style="rose", bg_seed=0, bg_cache_bytes=256 * 1024 * 1024, bg_tiled=False,
+                 verbose=True, line_break="greedy", output_format=None, encode_threads=0, encode_queue=4,
+                 glyph_cache=False, glyph_cache_bytes=32 * 1024 * 1024, max_height=None,
+                 font_fit=None, bg_template=None):
         # 基础配置
         self.width = 1242  # 固定宽度
         self.margin_x = 140
@@ -23,19 +39,120 @@ class DynamicRenderer:
         self.y_body_start = 480  # 正文起始Y
         self.padding_bottom = 250  # 底部留白
 
+        # 单张画布的最大高度 (None 表示不限)。超长的诗按段落拆成多页 ru_1.jpg、ru_2.jpg ...，
+        # 每次只在内存里画一页，峰值内存与诗的长度无关
+        if max_height is not None and max_height < 1660:
+            raise ValueError(f"max_height 不能小于标准高度 1660: {max_height}")
+        self.max_height = max_height
+
+        # 字号自适应：font_fit=(最小字号, 最大字号) 时不再固定正文字号，
+        # 而是取区间内让正文恰好放进标准 1660 高卡片的最大字号 (最小字号也放不下时照常加高画布)
+        if font_fit is not None:
+            min_size, max_size = font_fit
+            if not 0 < min_size <= max_size:
+                raise ValueError(f"font_fit 需要 0 < 最小字号 <= 最大字号: {font_fit}")
+        self.font_fit = tuple(font_fit) if font_fit is not None else None
+        # 排版结果缓存，键为 (正文哈希, 字体对象, 断行方式)；字体对象本身就代表了 (字体, 字号)
+        self._layouts = OrderedDict()
+        self._layouts_max = 64
+
+        # 背景配置：固定 seed 保证重跑得到相同像素，相同高度的卡片共用一张背景
+        self.bg_style = bg_style
+        self.bg_seed = bg_seed
+        # bg_tiled=True 时用无缝图块拼接背景，长诗不再按高度重新生成暗纹和噪音
+        self.bg_cache = BackgroundCache(max_bytes=bg_cache_bytes, tiled=bg_tiled)
+        # bg_template 为模板名 (assets/templates 下的文件名，不含扩展名) 或图片路径时改用模板背景，
+        # 模板解码后的像素由各进程共享映射，bg_style / bg_seed / bg_tiled 不再起作用
+        self.bg_template = get_template(bg_template, self.width) if bg_template else None
+
+        # 多进程渲染时关闭逐张打印，由进度条统一汇报
+        self.verbose = verbose
+
+        # 断行方式: "greedy" (逐行塞满) 或 "balanced" (行数不变，各行宽度尽量均匀)
+        if line_break not in LINE_BREAKERS:
+            raise ValueError(f"未知的断行方式: {line_break}")
+        self.line_break = line_break
+
+        # 输出编码：output_format 是 ImageEncoder 的参数 (格式、质量、渐进式等)，默认 JPEG 质量 95；
+        # encode_threads > 0 时在后台线程编码，render 返回 Future，与下一张卡片的绘制重叠
+        self.encoder = ImageEncoder(threads=encode_threads, max_pending=encode_queue, **(output_format or {}))
+
+        # glyph_cache=True 时正文由缓存的字形位图拼成 (输出与 draw.text 逐像素一致)，
+        # 中文常用字在整批卡片之间只栅格化一次
+        self.glyph_atlas = GlyphAtlas(max_bytes=glyph_cache_bytes) if glyph_cache else None
+
+    @property
+    def output_extension(self):
+        return self.encoder.extension
+
+    def close(self):
+        """等待后台编码全部完成"""
+        self.encoder.close()
+
     def _get_font(self, font_path, size):
-        try:
-            return ImageFont.truetype(font_path, int(size))
-        except:
-            return ImageFont.load_default()
+        # 进程级缓存，同一 (字体, 字号) 只解析一次
+        return get_font(font_path, int(size))
+
+    def background(self, height):
+        """一张指定高度的底图 (新图片，可直接绘制)：模板模式从共享的模板像素复制，否则走背景缓存"""
+        if self.bg_template is not None:
+            return self.bg_template.get(max(1660, int(height)))
+        return self.bg_cache.get(self.width, height, style=self.bg_style, seed=self.bg_seed)
+
+    @staticmethod
+    def _font_paths(data, font_path, fallback_fonts=()):
+        """
+        主字体缺字且给了后备字体时返回整条字体链，否则只有主字体 (输出与以前完全相同)。
+        """
+        if fallback_fonts:
+            text = f"{data['title']}— {data['author']}{data['content']}"
+            if get_registry().missing(text, font_path):
+                return (font_path, *fallback_fonts)
+        return (font_path,)
+
+    def _font(self, font_paths, size):
+        """字体链只有主字体时是普通字体，否则是按字符切换字体的 FallbackFont"""
+        if len(font_paths) > 1:
+            return get_fallback_font(font_paths, int(size))
+        return self._get_font(font_paths[0], size)
 
-    def _layout_text(self, text, font, line_spacing_ratio=0.6, para_spacing_ratio=1.2):
+    def _layout_cached(self, text, font):
+        """_layout_text 的缓存版本 (只缓存默认行距、段距)；字号搜索和正式渲染共用同一份排版"""
+        key = (hashlib.sha1(text.encode("utf-8")).digest(), font, self.line_break)
+        result = self._layouts.get(key)
+        if result is not None:
+            self._layouts.move_to_end(key)
+            return result
+        result = self._layouts[key] = self._layout_text(text, font)
+        if len(self._layouts) > self._layouts_max:
+            self._layouts.popitem(last=False)
+        return result
+
+    def fit_font_size(self, text, font_paths, min_size, max_size):
+        """
+        二分查找 [min_size, max_size] 内正文高度不超过标准卡片可用高度的最大字号。
+        排版高度随字号单调增加，只需 log2(区间长度) 次排版；最小字号也放不下时返回 min_size。
+        """
+        available = 1660 - self.y_body_start - self.padding_bottom
+        lo, hi, best = min_size, max_size, min_size
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            _, height, _ = self._layout_cached(text, self._font(font_paths, mid))
+            if height <= available:
+                best, lo = mid, mid + 1
+            else:
+                hi = mid - 1
+        return best
+
+    def _layout_text(self, text, font, line_spacing_ratio=0.6, para_spacing_ratio=1.2, line_break=None):
         """
         计算文本排版布局
         返回: (layout_structure, total_pixel_height)
         """
+        break_lines = LINE_BREAKERS[line_break or self.line_break]
         paragraphs = text.split('\n')
         layout_data = []
+        glyph_metrics = get_metrics(font)
 
         ascent, descent = font.getmetrics()
         font_height = ascent + descent
@@ -51,19 +168,9 @@ class DynamicRenderer:
             # 简单的中西文分词判断
             is_latin = any('a' <= char.lower() <= 'z' for char in para)
             words = para.split(' ') if is_latin else list(para)
+            sep = " " if is_latin else ""
 
-            current_line = ""
-            para_lines = []
-
-            for word in words:
-                sep = " " if is_latin else ""
-                test_line = current_line + sep + word if current_line else word
-                if font.getlength(test_line) <= self.content_width:
-                    current_line = test_line
-                else:
-                    para_lines.append(current_line)
-                    current_line = word
-            if current_line: para_lines.append(current_line)
+            para_lines = break_lines(words, sep, glyph_metrics, self.content_width)
 
             # 计算本段落高度
             p_height = len(para_lines) * font_height + (len(para_lines) - 1) * line_gap
@@ -82,38 +189,154 @@ class DynamicRenderer:
 
         return layout_data, total_height, para_gap
 
-    def render(self, data, font_path, output_path, font_size=40):
+    def paginate(self, layout, body_height, para_gap):
+        """
+        按最大画布高度把排版结果分页，优先在段落之间断开；单个段落比一页还高时才在行之间断开。
+        :return: [{"paragraphs": 本页的段落 (结构同 layout), "height": 本页正文高度}, ...]
+        """
+        if self.max_height is None:
+            return [{"paragraphs": layout, "height": body_height}]
+        max_body = self.max_height - self.y_body_start - self.padding_bottom
+        if body_height <= max_body:
+            return [{"paragraphs": layout, "height": body_height}]
+
+        pages = []
+        current, current_h = [], 0
+
+        def flush():
+            nonlocal current, current_h
+            if current:
+                pages.append({"paragraphs": current, "height": current_h})
+            current, current_h = [], 0
+
+        for para in layout:
+            for piece in self._split_paragraph(para, max_body):
+                added = piece['height'] + (para_gap if current else 0)
+                if current and current_h + added > max_body:
+                    flush()
+                    added = piece['height']
+                current.append(piece)
+                current_h += added
+        flush()
+        return pages
+
+    @staticmethod
+    def _split_paragraph(para, max_body):
+        """把比一页还高的段落按行切成若干块，每块都能放进一页"""
+        if para['height'] <= max_body:
+            return [para]
+        f_h, l_gap = para['font_height'], para['line_gap']
+        per_page = max(1, int((max_body + l_gap) // (f_h + l_gap)))
+        lines = para['lines']
+        pieces = []
+        for i in range(0, len(lines), per_page):
+            chunk = lines[i:i + per_page]
+            pieces.append(dict(para, lines=chunk, height=len(chunk) * f_h + (len(chunk) - 1) * l_gap))
+        return pieces
+
+    def plan(self, data, font_path, font_size=40, fallback_fonts=()):
+        """
+        只排版不画图：确定字体、正文字号、分页和每页的画布高度。render_pages 与 dry-run 共用。
+        :param font_size: 正文字号；开启 font_fit 时被自适应的结果代替
+        :param fallback_fonts: 主字体缺字时依次尝试的后备字体路径
+        :return: {"font_size", "fonts": (标题, 作者, 正文字体), "body_height", "para_gap",
+                  "pages": [{"paragraphs", "height", "canvas_height"}, ...]}
+        """
         # 1. 准备字体
-        font_title = self._get_font(font_path, 75)
-        font_author = self._get_font(font_path, 38)
-        font_body = self._get_font(font_path, font_size)  # 锁定字号，不再缩小！
+        font_paths = self._font_paths(data, font_path, fallback_fonts)
 
         # 2. 虚拟排版 (只计算高度，不画图)
-        print(f"  ...正在计算诗歌 [{data['title'][:5]}] 的长度需求...")
-        layout, body_height, para_gap = self._layout_text(data['content'], font_body)
+        with metrics.timer("layout"):
+            if self.font_fit is not None:
+                font_size = self.fit_font_size(data['content'], font_paths, *self.font_fit)
+            font_body = self._font(font_paths, font_size)
+            layout, body_height, para_gap = self._layout_cached(data['content'], font_body)
+            pages = self.paginate(layout, body_height, para_gap)
+
+        for index, page in enumerate(pages):
+            # 3. 计算所需的总画布高度
+            # 公式: 正文起始位置 + 正文实际高度 + 底部留白
+            required_height = self.y_body_start + page['height'] + self.padding_bottom
+
+            # 如果需要的高度(比如1800) > 标准(1660)，就用1800；否则用1660
+            page['canvas_height'] = max(1660, int(required_height))
+            if index < len(pages) - 1:
+                # 分页时除最后一页外都用统一的最大高度：尺寸一致，且共用同一张缓存背景
+                page['canvas_height'] = self.max_height
+
+        return {
+            "font_size": font_size,
+            "fonts": (self._font(font_paths, 75), self._font(font_paths, 38), font_body),
+            "body_height": body_height,
+            "para_gap": para_gap,
+            "pages": pages,
+        }
+
+    def render_pages(self, data, font_path, output_path, font_size=40, fallback_fonts=()):
+        """
+        渲染一张卡片，超过 max_height 时拆成多页。
+        :param fallback_fonts: 主字体缺字时依次尝试的后备字体路径
+        :return: (输出文件列表, 后台编码中的 Future 列表)；单页时文件就是 output_path，
+                 多页时为 {名}_1{扩展名}、{名}_2{扩展名} ...
+        """
+        if self.verbose: print(f"  ...正在计算诗歌 [{data['title'][:5]}] 的长度需求...")
+        plan = self.plan(data, font_path, font_size, fallback_fonts)
+        font_title, font_author, font_body = plan['fonts']
+        para_gap, pages = plan['para_gap'], plan['pages']
+        if self.verbose and self.font_fit is not None: print(f"  ...自适应正文字号: {plan['font_size']}")
+
+        if len(pages) == 1:
+            paths = [output_path]
+        else:
+            stem, ext = os.path.splitext(output_path)
+            paths = [f"{stem}_{i}{ext}" for i in range(1, len(pages) + 1)]
+            if self.verbose: print(f"  ...内容超过最大高度 {self.max_height} px，拆分为 {len(pages)} 页")
 
-        # 3. 计算所需的总画布高度
-        # 公式: 正文起始位置 + 正文实际高度 + 底部留白
-        required_height = self.y_body_start + body_height + self.padding_bottom
+        futures = []
+        for index, (page, path) in enumerate(zip(pages, paths)):
+            # 4. 生成动态底图
+            final_height = page['canvas_height']
+            if self.verbose: print(f"  ...生成底图: {self.width}x{final_height} px (内容高: {int(page['height'])} px)")
+            with metrics.timer("background"):
+                img = self.background(final_height)
 
-        # 4. 生成动态底图
-        # 如果需要的高度(比如1800) > 标准(1660)，就用1800；否则用1660
-        final_height = max(1660, int(required_height))
+            with metrics.timer("draw"):
+                self._draw_card(img, data, font_title, font_author, font_body, page['paragraphs'], page['height'],
+                                para_gap, final_height, page=(index + 1, len(pages)) if len(pages) > 1 else None)
 
-        print(f"  ...生成底图: {self.width}x{final_height} px (内容高: {int(body_height)} px)")
-        img = create_dynamic_background(self.width, final_height)
+            # 6. 保存 (开启后台编码时返回 Future)；编码队列有上限，画完的页不会在内存里堆积
+            future = self.encoder.submit(img, path)
+            del img
+            if future is not None:
+                futures.append(future)
+            if self.verbose: print(f"✅ 图片已{'提交编码' if future else '保存'}: {path}")
+        return paths, futures
+
+    def render(self, data, font_path, output_path, font_size=40, fallback_fonts=()):
+        """
+        渲染并保存卡片。同步编码时返回 None；开启后台编码时返回 Future (所有页写完后完成，结果为文件列表)。
+        """
+        paths, futures = self.render_pages(data, font_path, output_path, font_size, fallback_fonts)
+        if not futures:
+            return None
+        if len(futures) == 1 and len(paths) == 1:
+            return futures[0]
+        return _gather(futures, paths)
+
+    def _draw_card(self, img, data, font_title, font_author, font_body, layout, body_height, para_gap,
+                   final_height, page=None):
         draw = ImageDraw.Draw(img)
 
         # 5. 正式绘制
 
         # A. 标题 (居中)
-        w_title = font_title.getlength(data['title'])
-        draw.text(((self.width - w_title) / 2, self.y_title), data['title'], font=font_title, fill=self.title_color)
+        w_title = get_metrics(font_title).getlength(data['title'])
+        self._draw_text(draw, ((self.width - w_title) / 2, self.y_title), data['title'], font_title, self.title_color)
 
         # B. 作者 (居中)
         author_str = f"— {data['author']}"
-        w_auth = font_author.getlength(author_str)
-        draw.text(((self.width - w_auth) / 2, self.y_author), author_str, font=font_author, fill=(100, 100, 100, 200))
+        w_auth = get_metrics(font_author).getlength(author_str)
+        self._draw_text(draw, ((self.width - w_auth) / 2, self.y_author), author_str, font_author, (100, 100, 100, 200))
 
         # C. 正文 (根据 layout 数据绘制)
         # 如果是标准高度图片，我们让短诗在中间区域视觉居中
@@ -127,16 +350,63 @@ class DynamicRenderer:
             # 长诗：固定顶端
             cursor_y = self.y_body_start
 
+        body_metrics = get_metrics(font_body)
         for para in layout:
             f_h = para['font_height']
             l_gap = para['line_gap']
             for line in para['lines']:
-                w_line = font_body.getlength(line)
-                draw.text(((self.width - w_line) / 2, cursor_y), line, font=font_body, fill=self.ink_color)
+                w_line = body_metrics.getlength(line)
+                xy = ((self.width - w_line) / 2, cursor_y)
+                self._draw_text(draw, xy, line, font_body, self.ink_color, atlas=self.glyph_atlas)
                 cursor_y += f_h + l_gap
             cursor_y -= l_gap  # 撤销最后一行多加的行距
             cursor_y += para_gap  # 加上段距
 
-        # 6. 保存
-        img.save(output_path, quality=95)
-        print(f"✅ 图片已保存: {output_path}")
\ No newline at end of file
+        # D. 页码 (仅多页时，画在底部留白的中间)
+        if page is not None:
+            page_str = f"{page[0]} / {page[1]}"
+            w_page = get_metrics(font_author).getlength(page_str)
+            self._draw_text(draw, ((self.width - w_page) / 2, final_height - self.padding_bottom / 2), page_str,
+                            font_author, (100, 100, 100, 200))
+
+    @staticmethod
+    def _draw_text(draw, xy, text, font, fill, atlas=None):
+        """
+        画一行文字。font 是 FallbackFont 时逐段换字体绘制：后备字体按基线对齐到主字体，
+        段与段之间按各段宽度前进 (与 FallbackFont.getlength 的测量一致)。
+        """
+        if isinstance(font, FallbackFont):
+            x, y = xy
+            baseline = y + font.getmetrics()[0]
+            for run_font, run in font.runs(text):
+                if run_font is font.primary:
+                    DynamicRenderer._draw_text(draw, (x, y), run, run_font, fill, atlas)
+                else:
+                    draw.text((x, baseline), run, font=run_font, fill=fill, anchor="ls")
+                x += get_metrics(run_font).getlength(run)
+        elif atlas is not None:
+            atlas.draw_text(draw, xy, text, font, fill)
+        else:
+            draw.text(xy, text, font=font, fill=fill)
+
+
+def _gather(futures, result):
+    """把多页的编码 Future 合并成一个：全部完成后以 result 完成，任一失败则以该异常失败"""
+    combined = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(f):
+        with lock:
+            if combined.done():
+                return
+            if f.exception() is not None:
+                combined.set_exception(f.exception())
+                return
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                combined.set_result(result)
+
+    for f in futures:
+        f.add_done_callback(on_done)
+    return combined
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+校验文件的读写。支持两种格式，按扩展名区分：
+- .json  : 原来的整体 JSON 数组 (indent=2)，方便人工编辑
+- .jsonl : 每行一首诗，适合数万首的大语料
+两种格式都按记录流式读写，内存占用与诗歌总数无关。
+
+格式互转：
+    python -m src.review_io poems_to_review.jsonl poems_to_review.json
+    python -m src.review_io poems_to_review.json poems_to_review.jsonl
+"""
+import json
+import sys
+from src.checkpoint import atomic_write_text
+
+
+def is_jsonl(path):
+    return path.lower().endswith(".jsonl")
+
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    """逐个解析 JSON 数组中的元素，不把整个文件读进内存"""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip_ws(chars=" \t\r\n"):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip_ws()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("校验文件不是 JSON 数组")
+    pos += 1
+
+    while True:
+        skip_ws(" \t\r\n,")
+        if pos >= len(buf):
+            raise ValueError("JSON 数组没有正确结束")
+        if buf[pos] == "]":
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # 元素被截断在块边界上，读入更多内容再试
+                fill()
+        yield item
+        pos = end
+
+
+def iter_review_records(path):
+    """逐条产出校验文件中的记录 ({"input_info": ..., "versions": ...})"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if is_jsonl(path):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f)
+
+
+def write_review_records(path, records):
+    """
+    流式写出校验文件 (原子替换)。.json 的输出与 json.dump(..., indent=2) 完全相同。
+    :return: 写出的记录数
+    """
+    count = [0]
+
+    def write_jsonl(f):
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False))
+            f.write("\n")
+            count[0] += 1
+
+    def write_json(f):
+        f.write("[")
+        for rec in records:
+            body = json.dumps(rec, ensure_ascii=False, indent=2)
+            f.write(",\n" if count[0] else "\n")
+            f.write("\n".join("  " + line for line in body.split("\n")))
+            count[0] += 1
+        f.write("\n]" if count[0] else "]")
+
+    atomic_write_text(path, write_jsonl if is_jsonl(path) else write_json)
+    return count[0]
+
+
+def convert(src, dst):
+    """在 .json 和 .jsonl 之间转换 (格式由扩展名决定)"""
+    return write_review_records(dst, iter_review_records(src))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("用法: python -m src.review_io <输入文件> <输出文件>")
+        sys.exit(1)
+    n = convert(sys.argv[1], sys.argv[2])
+    print(f"✅ 已转换 {n} 首诗: {sys.argv[1]} -> {sys.argv[2]}")
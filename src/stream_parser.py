@@ -0,0 +1,129 @@
+import json
+
+
+class MalformedJSONError(ValueError):
+    def __init__(self, message, position=None, raw=None):
+        super().__init__(message)
+        self.position = position
+        self.raw = raw
+
+
+class IncrementalObjectParser:
+    """
+    增量解析一个顶层 JSON 对象，每当某个顶层成员 (如 "zh_cn": {...}) 的值结束，就立即产出 (key, value)。
+    流式输出时 "zh_cn" 的对象一闭合就能交给下游，不必等到 "xhs_copy" 写完。
+
+        parser = IncrementalObjectParser()
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...
+        parser.close()  # 检查对象是否完整
+    """
+
+    def __init__(self):
+        self._pos = 0  # 已扫描的字符数
+        self._text = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._finished = False
+        self._member_start = None  # 当前成员在 _text 中的起点
+        self._member_emitted = False
+        self._emitted_end = None  # 提前产出的成员值在 _text 中的终点
+        self._after_comma = False
+        self.members = {}
+
+    def feed(self, chunk):
+        """喂入一段文本，返回本段中完成的成员列表 [(key, value), ...]"""
+        if not chunk:
+            return []
+        self._text += chunk
+        out = []
+        text = self._text
+        i = self._pos
+        n = len(text)
+
+        while i < n:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    # 顶层成员的值是字符串时，引号闭合即可尝试产出
+                    if self._depth == 1 and self._member_start is not None:
+                        self._try_emit(text[self._member_start:i + 1], out, partial=True)
+                i += 1
+                continue
+
+            if self._finished:
+                if not ch.isspace():
+                    raise MalformedJSONError("顶层对象之后还有多余内容", i, text)
+            elif not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._member_start = i + 1
+                elif not ch.isspace():
+                    raise MalformedJSONError("输出不是 JSON 对象", i, text)
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and ch == "}":
+                    # 某个语言块的对象刚刚闭合
+                    self._try_emit(text[self._member_start:i + 1], out, partial=True)
+                elif self._depth == 0:
+                    self._try_emit(text[self._member_start:i], out)
+                    self._finished = True
+                elif self._depth < 0:
+                    raise MalformedJSONError("括号不匹配", i, text)
+            elif ch == "," and self._depth == 1:
+                self._try_emit(text[self._member_start:i], out)
+                self._member_start = i + 1
+                self._member_emitted = False
+                self._after_comma = True
+            i += 1
+
+        self._pos = i
+        return out
+
+    def _try_emit(self, member_text, out, partial=False):
+        """
+        尝试把一段 "key": value 解析出来。
+        partial=True 表示值可能还没结束 (例如字符串后面还有内容)，解析失败时静默等待更多输入。
+        成员在 "," 或 "}" 处结束时 (partial=False)，已提前产出的值之后只允许有空白。
+        """
+        if self._member_emitted:
+            if not partial and member_text[self._emitted_end - self._member_start:].strip():
+                raise MalformedJSONError("成员值之后还有多余内容", self._emitted_end, self._text)
+            return
+        if not member_text.strip():
+            # 只有空对象 {} 允许出现空成员；",," 或结尾多余的逗号都是非法的
+            if not partial and self._after_comma:
+                raise MalformedJSONError("多余的逗号", self._member_start, self._text)
+            return
+        try:
+            obj = json.loads("{" + member_text + "}")
+        except json.JSONDecodeError as e:
+            if partial:
+                return
+            raise MalformedJSONError(f"无法解析成员: {e.msg}", self._member_start, self._text) from e
+        for key, value in obj.items():
+            self.members[key] = value
+            out.append((key, value))
+        self._member_emitted = True
+        self._emitted_end = self._member_start + len(member_text)
+
+    def close(self):
+        """输入结束时调用；对象没有闭合则抛出 MalformedJSONError"""
+        if not self._started:
+            raise MalformedJSONError("输出为空", 0, self._text)
+        if not self._finished:
+            raise MalformedJSONError("JSON 对象没有闭合 (输出被截断?)", len(self._text), self._text)
+        return self.members
@@ -0,0 +1,131 @@
+"""
+模板背景：直接使用 assets/templates 下做好的信纸图片，不再按卡片生成暗纹和噪音。
+
+每个模板只解码一次，解码后的 RGB 像素写成裸像素文件 (按模板文件哈希和宽度命名，缓存在 .cache/templates/)，
+各进程用 np.memmap 只读映射同一个文件：像素由操作系统页缓存共享，工作进程不再各自持有一份解码后的大图，
+取背景时只复制本张卡片需要的部分 (标准高度是整张，长诗在中间段向下延伸)。
+
+    tpl = get_template("paper_clean")
+    img = tpl.get(2400)  # 1242x2400 的 RGB 图，可直接在上面绘制
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from src.font_registry import file_digest
+
+TEMPLATE_DIR = "./assets/templates"
+TEMPLATE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+# 与 DynamicRenderer 的固定宽度一致
+TEMPLATE_WIDTH = 1242
+# 解码或缩放方式有变化时递增，旧的像素文件随之失效
+TEMPLATE_VERSION = "1"
+
+
+def list_templates(template_dir=TEMPLATE_DIR):
+    """模板目录下可用的模板名 (文件名去掉扩展名)"""
+    if not os.path.isdir(template_dir):
+        return []
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(template_dir)
+                  if os.path.splitext(name)[1].lower() in TEMPLATE_EXTENSIONS)
+
+
+def template_path(name, template_dir=TEMPLATE_DIR):
+    """
+    :param name: 模板名 (如 "paper_clean") 或图片文件路径
+    :return: 模板图片路径；找不到时抛出 ValueError
+    """
+    if os.path.isfile(name):
+        return name
+    for ext in TEMPLATE_EXTENSIONS:
+        path = os.path.join(template_dir, name + ext)
+        if os.path.isfile(path):
+            return path
+    raise ValueError(f"找不到背景模板: {name}，可选: {', '.join(list_templates(template_dir)) or '(无)'}")
+
+
+def _decode(path, width):
+    """解码模板并缩放到指定宽度 (保持宽高比)，:return: (height, width, 3) 的 uint8 数组"""
+    with Image.open(path) as src:
+        img = src.convert("RGB")
+    if img.width != width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+    return np.asarray(img)
+
+
+class TemplateBackground:
+    """
+    一张解码好的模板，像素为只读的内存映射 (height, width, 3)。
+    :param head: 延伸时保持不动的顶部行数 (默认模板高度的 1/4，信纸的上边缘不会被拉伸或重复)
+    :param foot: 延伸时保持不动的底部行数 (默认 1/4)
+    :param blend: 延伸段与底部衔接处的渐变行数
+    """
+
+    def __init__(self, path, width=TEMPLATE_WIDTH, cache_dir="./.cache/templates", head=None, foot=None,
+                 blend=64):
+        self.path = path
+        self.pixels = self._load(path, width, cache_dir)
+        self.height, self.width = self.pixels.shape[:2]
+        self.head = self.height // 4 if head is None else head
+        self.foot = self.height // 4 if foot is None else foot
+        if self.head < 0 or self.foot < 0 or self.head + self.foot >= self.height:
+            raise ValueError(f"head + foot 须小于模板高度 {self.height}: {self.head} + {self.foot}")
+        self.blend = blend
+
+    @staticmethod
+    def _load(path, width, cache_dir):
+        """裸像素文件存在且大小正确时直接映射；否则解码一次写入缓存 (写临时文件再原子替换，多进程同时写也安全)"""
+        with Image.open(path) as src:
+            w, h = src.size
+        height = h if w == width else max(1, round(h * width / w))
+        shape = (height, width, 3)
+        raw_path = os.path.join(cache_dir, f"{file_digest(path)}.{width}x{height}.v{TEMPLATE_VERSION}.rgb")
+
+        if not (os.path.exists(raw_path) and os.path.getsize(raw_path) == height * width * 3):
+            pixels = _decode(path, width)
+            if pixels.shape != shape:
+                raise ValueError(f"背景模板 {path} 解码后的尺寸 {pixels.shape} 与预期 {shape} 不符")
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{raw_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(pixels.tobytes())
+            os.replace(tmp_path, raw_path)
+        return np.memmap(raw_path, dtype=np.uint8, mode="r", shape=shape)
+
+    def get(self, height):
+        """
+        取一张指定高度的背景 (新图片，调用方可以直接在上面绘制)。
+        不高于模板时从顶部裁剪；更高时保留顶部 head 行和底部 foot 行，中间段来回镜像铺满，
+        镜像保证段与段之间上下两行相同；铺到底部时一般停在段中间，最后 blend 行渐变到模板里紧挨底部的那几行。
+        :return: PIL.Image (RGB)
+        """
+        height = max(1, int(height))
+        if height <= self.height:
+            # 从映射的页面直接复制到新图片，整个过程只复制一次
+            return Image.frombuffer("RGB", (self.width, height), self.pixels[:height], "raw", "RGB", 0, 1)
+
+        out = np.empty((height, self.width, 3), dtype=np.uint8)
+        out[:self.head] = self.pixels[:self.head]
+        out[height - self.foot:] = self.pixels[self.height - self.foot:]
+        band = self.pixels[self.head:self.height - self.foot]
+        y, end, forward = self.head, height - self.foot, True
+        while y < end:
+            n = min(len(band), end - y)
+            out[y:y + n] = band[:n] if forward else band[::-1][:n]
+            y += n
+            forward = not forward
+
+        blend = min(self.blend, end - self.head, len(band))
+        if blend > 0:
+            weight = np.linspace(0, 1, blend, dtype=np.float32)[:, None, None]
+            seam = out[end - blend:end].astype(np.float32)
+            out[end - blend:end] = (seam * (1 - weight) + band[len(band) - blend:] * weight + 0.5).astype(np.uint8)
+        return Image.frombuffer("RGB", (self.width, height), out, "raw", "RGB", 0, 1)
+
+
+@lru_cache(maxsize=None)
+def get_template(name, width=TEMPLATE_WIDTH):
+    """进程级缓存的 TemplateBackground，键为 (模板名或路径, 宽度)"""
+    return TemplateBackground(template_path(name), width)
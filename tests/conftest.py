@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+FONT_LATIN = os.path.join(ROOT, "assets", "fonts", "serif_latin.ttf")
+FONT_CYRILLIC = os.path.join(ROOT, "assets", "fonts", "cyrillic.ttf")
+
+
+@pytest.fixture
+def in_tmp(tmp_path, monkeypatch):
+    """在临时目录中运行 (写断点文件、缓存、输出目录的测试用)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,35 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.async_fetch import fetch_all
+from src.llm_client import FetchError
+
+ITEMS = [{"title": "A", "author": "x"}, {"title": "B", "author": "x"}]
+
+
+def _client(replies):
+    """按诗名返回固定内容的假异步客户端"""
+    async def create(messages, **kwargs):
+        title = next(title for title in replies if title in messages[1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=replies[title]))])
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def test_results_in_input_order():
+    client = _client({"A": json.dumps({"en": {"content": "a"}}), "B": json.dumps({"en": {"content": "b"}})})
+    seen = []
+    results = fetch_all(ITEMS, client=client, concurrency=2,
+                        on_result=lambda i, item, data, error: seen.append(item["title"]))
+    assert results == [({"en": {"content": "a"}}, None), ({"en": {"content": "b"}}, None)]
+    assert sorted(seen) == ["A", "B"]
+
+
+@pytest.mark.parametrize("reply", ["[1, 2]", '"text"', "null", "not json", ""])
+def test_non_object_reply_is_malformed(reply):
+    results = fetch_all(ITEMS[:1], client=_client({"A": reply}), max_retries=0)
+    [(data, error)] = results
+    assert data is None
+    assert isinstance(error, FetchError) and error.kind == "malformed_json"
@@ -0,0 +1,68 @@
+import json
+
+from src.checkpoint import CollectionCheckpoint, atomic_write_text
+
+
+def _info(title):
+    return {"title": title, "author": "普希金"}
+
+
+def test_last_record_wins(tmp_path):
+    cp = CollectionCheckpoint(str(tmp_path / "c.jsonl"))
+    cp.append(_info("A"), error=ValueError("timeout"))
+    cp.append(_info("B"), versions={"en": {"content": "b"}})
+    cp.append(_info("A"), versions={"en": {"content": "a"}})
+    cp.append(_info("B"), error=ValueError("retry failed"))
+
+    assert cp.load_status() == {("A", "普希金"): "ok", ("B", "普希金"): "failed"}
+    assert [r["input_info"]["title"] for r in cp.iter_ok_records()] == ["A"]
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / "c.jsonl"
+    cp = CollectionCheckpoint(str(path))
+    cp.append(_info("A"), versions={"en": {"content": "a"}})
+    cp.append(_info("B"), versions={"en": {"content": "b"}})
+    # 模拟写到一半崩溃：最后一行不完整
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"input_info": {"title": "C", "author": "普希金"}, "status": "o')
+
+    assert set(cp.load_status()) == {("A", "普希金"), ("B", "普希金")}
+    assert [r["input_info"]["title"] for r in cp.iter_ok_records()] == ["A", "B"]
+
+    # 重跑后在残行之后继续追加，残行不影响后面的记录
+    cp.append(_info("C"), versions={"en": {"content": "c"}})
+    assert cp.load_status()[("C", "普希金")] == "ok"
+
+
+def test_structured_error_detail(tmp_path):
+    class Err(Exception):
+        def to_dict(self):
+            return {"kind": "malformed_json", "received": ["en"]}
+
+    cp = CollectionCheckpoint(str(tmp_path / "c.jsonl"))
+    cp.append(_info("A"), error=Err("bad"))
+    rec = json.loads((tmp_path / "c.jsonl").read_text(encoding="utf-8"))
+    assert rec["status"] == "failed"
+    assert rec["error_detail"] == {"kind": "malformed_json", "received": ["en"]}
+
+
+def test_missing_file_is_empty(tmp_path):
+    cp = CollectionCheckpoint(str(tmp_path / "none.jsonl"))
+    assert cp.load_status() == {}
+    assert list(cp.iter_ok_records()) == []
+
+
+def test_atomic_write_keeps_old_file_on_error(tmp_path):
+    path = tmp_path / "out.json"
+    path.write_text("old", encoding="utf-8")
+
+    def boom(f):
+        f.write("half")
+        raise RuntimeError("crash")
+
+    try:
+        atomic_write_text(str(path), boom)
+    except RuntimeError:
+        pass
+    assert path.read_text(encoding="utf-8") == "old"
@@ -0,0 +1,25 @@
+import numpy as np
+
+from src.dynamic_bg import (C_EDGE, _distance_table, create_tiled_background, radial_gradient,
+                            tiled_gradient)
+
+
+def test_tiled_gradient_close_to_exact():
+    exact = np.asarray(radial_gradient(300, 700, 150, 350, 500), dtype=np.int16)
+    tiled = np.asarray(tiled_gradient(300, 700, 150, 350, 500), dtype=np.int16)
+    assert tiled.shape == exact.shape
+    assert np.abs(tiled - exact).max() <= 1
+
+
+def test_distance_table_clamps_instead_of_wrapping():
+    # 超过 uint16 的距离不能回绕成很小的值 (否则画布底部会变回中心色)
+    img = np.asarray(tiled_gradient(4, 70000, 2, 0, 1000))
+    assert (img[-1] == C_EDGE).all()
+    assert (img[66000] == C_EDGE).all()
+
+
+def test_distance_cache_is_bounded():
+    _distance_table.cache_clear()
+    for height in (1660, 2400, 3600, 5000):
+        create_tiled_background(1242, height)
+    assert _distance_table.cache_info().currsize <= 2
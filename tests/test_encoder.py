@@ -0,0 +1,84 @@
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from src import encoder
+from src.encoder import FORMATS, ImageEncoder
+
+
+def _image(color=(200, 100, 50)):
+    return Image.new("RGB", (64, 48), color)
+
+
+@pytest.mark.parametrize("fmt", sorted(FORMATS))
+def test_save_writes_decodable_file_without_leftovers(tmp_path, fmt):
+    enc = ImageEncoder(format=fmt, subsampling=0)
+    path = str(tmp_path / f"card{enc.extension}")
+    assert enc.save(_image(), path) == path
+    with Image.open(path) as img:
+        assert img.format == FORMATS[fmt][0] and img.size == (64, 48)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+
+def test_failed_write_keeps_previous_file(tmp_path, monkeypatch):
+    enc = ImageEncoder(format="png")
+    path = str(tmp_path / "card.png")
+    enc.save(_image((1, 2, 3)), path)
+    before = open(path, "rb").read()
+
+    def broken_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(encoder.os, "replace", broken_replace)
+    with pytest.raises(OSError):
+        enc.save(_image((9, 9, 9)), path)
+    # 旧图完好，临时文件已清理
+    assert open(path, "rb").read() == before
+    assert os.listdir(tmp_path) == ["card.png"]
+
+
+def test_submit_blocks_beyond_max_pending(tmp_path, monkeypatch):
+    release = threading.Event()
+    lock = threading.Lock()
+    pending = [0]
+    peak = [0]
+
+    enc = ImageEncoder(format="png", threads=2, max_pending=2)
+    original_save = enc.save
+
+    def slow_save(img, path):
+        with lock:
+            pending[0] += 1
+            peak[0] = max(peak[0], pending[0])
+        release.wait(5)
+        try:
+            return original_save(img, path)
+        finally:
+            with lock:
+                pending[0] -= 1
+
+    monkeypatch.setattr(enc, "save", slow_save)
+    futures = [enc.submit(_image(), str(tmp_path / f"{i}.png")) for i in range(2)]
+
+    third = []
+    t = threading.Thread(target=lambda: third.append(enc.submit(_image(), str(tmp_path / "2.png"))))
+    t.start()
+    t.join(0.2)
+    # 两张还在编码，第三张提交被挡住
+    assert t.is_alive() and third == []
+
+    release.set()
+    t.join(5)
+    futures += third
+    assert [f.result() for f in futures] == [str(tmp_path / f"{i}.png") for i in range(3)]
+    enc.close()
+    assert peak[0] <= 2
+    assert sorted(os.listdir(tmp_path)) == ["0.png", "1.png", "2.png"]
+
+
+def test_synchronous_submit_returns_none(tmp_path):
+    enc = ImageEncoder()
+    assert enc.submit(_image(), str(tmp_path / "a.jpg")) is None
+    assert os.path.exists(tmp_path / "a.jpg")
@@ -0,0 +1,141 @@
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+
+import pytest
+
+from conftest import FONT_CYRILLIC, FONT_LATIN
+from src.font_cache import get_metrics
+from src.font_registry import FallbackFont, FontCoverage, FontRegistry, parse_cmap
+
+
+def _sfnt(subtables):
+    """
+    拼一个只有 cmap 表的最小 sfnt 文件。
+    :param subtables: [(platform, encoding, 子表字节), ...]
+    """
+    header_len = 4 + 8 * len(subtables)
+    records, body = b"", b""
+    for platform, encoding, data in subtables:
+        records += struct.pack(">HHI", platform, encoding, header_len + len(body))
+        body += data
+    cmap = struct.pack(">HH", 0, len(subtables)) + records + body
+    offset = 12 + 16
+    return struct.pack(">IHHHH", 0x00010000, 1, 16, 0, 0) + struct.pack(">4sIII", b"cmap", 0, offset, len(cmap)) + cmap
+
+
+def _format4(segments):
+    """
+    :param segments: [(start, end, delta, glyphs 或 None)]；glyphs 给出时走 idRangeOffset 查表
+    """
+    segments = list(segments) + [(0xFFFF, 0xFFFF, 1, None)]
+    n = len(segments)
+    ends = struct.pack(f">{n}H", *(s[1] for s in segments))
+    starts = struct.pack(f">{n}H", *(s[0] for s in segments))
+    deltas = struct.pack(f">{n}h", *(s[2] for s in segments))
+    glyph_array, range_offsets = [], []
+    for i, (start, end, delta, glyphs) in enumerate(segments):
+        if glyphs is None:
+            range_offsets.append(0)
+        else:
+            # 从 idRangeOffset[i] 所在位置到该段第一个字形号的字节距离
+            range_offsets.append(2 * (n - i) + 2 * len(glyph_array))
+            glyph_array.extend(glyphs)
+    body = (ends + b"\0\0" + starts + deltas + struct.pack(f">{n}H", *range_offsets)
+            + struct.pack(f">{len(glyph_array)}H", *glyph_array))
+    return struct.pack(">7H", 4, 14 + len(body), 0, 2 * n, 0, 0, 0) + body
+
+
+def _format12(groups):
+    body = b"".join(struct.pack(">III", *g) for g in groups)
+    return struct.pack(">HHIII", 12, 0, 16 + len(body), 0, len(groups)) + body
+
+
+def _covered(cov, upto=0x3000):
+    return {cp for cp in range(upto) if chr(cp) in cov}
+
+
+def test_format4_delta_and_range_offset():
+    data = _sfnt([(3, 1, _format4([
+        (0x41, 0x45, 10, None),               # A-E，字形号 = 码位 + 10
+        (0x61, 0x64, 0, [5, 0, 7, 8]),        # a-d 查表，b 映射到 .notdef
+        (0x100, 0x102, -0x101, None),         # 0x101 + delta = 0，即 .notdef
+    ]))])
+    expected = set(range(0x41, 0x46)) | {0x61, 0x63, 0x64} | {0x100, 0x102}
+    assert _covered(parse_cmap(data)) == expected
+
+
+def test_format12_and_preferred_subtable():
+    bmp_only = _format4([(0x41, 0x41, 1, None)])
+    full = _format12([(0x41, 0x5A, 1), (0x4E00, 0x4E05, 0), (0x1F600, 0x1F601, 50)])
+    # 同时有 (3, 1) 和 (3, 10) 时选完整 Unicode 的 (3, 10)
+    cov = parse_cmap(_sfnt([(3, 1, bmp_only), (3, 10, full)]))
+    assert _covered(cov, 0x4E10) == set(range(0x41, 0x5B)) | set(range(0x4E01, 0x4E06))
+    assert "\U0001F600" in cov and "\U0001F601" in cov
+    assert "\U0001F602" not in cov
+
+
+def test_format0_and_format6():
+    glyphs = bytes(256)
+    glyphs = glyphs[:0x30] + bytes([3] * 10) + glyphs[0x3A:]
+    fmt0 = struct.pack(">3H", 0, 262, 0) + glyphs
+    assert _covered(parse_cmap(_sfnt([(1, 0, b"")] + [(0, 3, fmt0)]))) == set(range(0x30, 0x3A))
+
+    fmt6 = struct.pack(">5H", 6, 10 + 8, 0, 0x410, 4) + struct.pack(">4H", 9, 0, 11, 12)
+    assert _covered(parse_cmap(_sfnt([(3, 1, fmt6)]))) == {0x410, 0x412, 0x413}
+
+
+def test_no_cmap_is_empty():
+    assert len(parse_cmap(_sfnt([]))) == 0
+
+
+def test_coverage_bits_roundtrip():
+    cov = FontCoverage(b"\x01\x80")
+    assert "\x00" in cov and "\x0f" in cov
+    assert "\x01" not in cov and "\U00010000" not in cov
+    assert len(cov) == 2
+
+
+def test_real_fonts_and_disk_cache(tmp_path):
+    registry = FontRegistry(cache_dir=str(tmp_path))
+    cov = registry.coverage(FONT_CYRILLIC)
+    assert all(c in cov for c in "AZaz09 Ёёабвгдежзийклмнопрстуфхцчшщъыьэюя")
+    assert "中" not in cov
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # 第二个索引直接读磁盘缓存，结果相同
+    again = FontRegistry(cache_dir=str(tmp_path)).coverage(FONT_CYRILLIC)
+    assert again.bits == cov.bits
+
+    chain = [FONT_CYRILLIC, FONT_LATIN]
+    assert registry.uncovered("Ёлки ǍǎƏ 中", chain) == {"中"}
+    assert registry.pick("Ǎ", chain) == 1
+    assert registry.missing("nonexistent", "/no/such/font.ttf") == set("nonexistent")
+
+
+def test_fallback_measure_matches_draw(tmp_path):
+    font = FallbackFont((FONT_CYRILLIC, FONT_LATIN), 40, registry=FontRegistry(cache_dir=str(tmp_path)))
+    metrics = get_metrics(font)
+    rnd = random.Random(0)
+    alphabet = "абвгд ǍǎƏə  xyz"
+    for _ in range(2000):
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 12)))
+        drawn = sum(run_font.getlength(run) for run_font, run in font.runs(text))
+        assert metrics.getlength(text) == pytest.approx(drawn)
+        assert "".join(run for _, run in font.runs(text)) == text
+
+
+def test_validate_does_not_load_pillow_or_numpy(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.symlink(os.path.join(root, "assets"), tmp_path / "assets")
+    record = {"input_info": {"title": "A", "author": "x"},
+              "versions": {"ru": {"title": "Зима", "author": "Пушкин", "content": "Мороз и солнце ǽ"}}}
+    (tmp_path / "r.json").write_text(json.dumps([record], ensure_ascii=False), encoding="utf-8")
+    script = ("import sys, main; main.step_validate(review_file='r.json'); "
+              "print(sorted(m for m in ('numpy', 'PIL') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True,
+                         env=dict(os.environ, PYTHONPATH=root), check=True).stdout
+    assert out.strip().splitlines()[-1] == "[]"
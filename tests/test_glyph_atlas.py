@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from conftest import FONT_CYRILLIC, FONT_LATIN
+from src.font_cache import get_font
+from src.glyph_atlas import GlyphAtlas
+
+TEXTS = ["AVA To W. l'amour", "Wahrheit — déjà vu, Tyrannei!", "Я помню чудное мгновенье", "  a  b  "]
+OFFSETS = [(10, 5), (10.25, 5), (10.5, 5.4), (33.7, 12.9), (0.015625, 0.984)]
+
+
+def _draw(xy, text, font, atlas=None):
+    img = Image.new("RGB", (900, 90), (250, 245, 240))
+    draw = ImageDraw.Draw(img)
+    if atlas is None:
+        draw.text(xy, text, font=font, fill=(60, 50, 45))
+    else:
+        atlas.draw_text(draw, xy, text, font, (60, 50, 45))
+    return np.asarray(img)
+
+
+@pytest.mark.parametrize("font_path, size", [(FONT_LATIN, 40), (FONT_CYRILLIC, 38), (FONT_LATIN, 75)])
+def test_atlas_matches_draw_text(font_path, size):
+    font = get_font(font_path, size)
+    atlas = GlyphAtlas()
+    assert atlas.supports(font)
+    for text in TEXTS:
+        for xy in OFFSETS:
+            expected = _draw(xy, text, font)
+            assert np.array_equal(_draw(xy, text, font, atlas), expected), (text, xy)
+    # 第二轮全部命中缓存，结果不变
+    misses = atlas.misses
+    for text in TEXTS:
+        assert np.array_equal(_draw(OFFSETS[2], text, font, atlas), _draw(OFFSETS[2], text, font))
+    assert atlas.misses == misses
+
+
+def test_eviction_keeps_within_budget():
+    font = get_font(FONT_LATIN, 40)
+    atlas = GlyphAtlas(max_bytes=4096)
+    for xy in OFFSETS:
+        _draw(xy, TEXTS[1], font, atlas)
+    assert 0 < atlas.current_bytes <= 4096
+    assert np.array_equal(_draw((10, 5), TEXTS[0], font, atlas), _draw((10, 5), TEXTS[0], font))
@@ -0,0 +1,109 @@
+import pytest
+
+from src import lang_check
+from src.lang_check import LanguageValidator, VerdictCache, check_block, validate_records
+
+
+@pytest.mark.parametrize("lang, text, detected", [
+    ("ru", "Я помню чудное мгновенье", "ru"),
+    ("zh_cn", "床前明月光，疑是地上霜。", "zh_cn"),
+    ("de", "Über allen Gipfeln ist Ruh", "de"),
+    ("fr", "Où es-tu, mon amour", "fr"),
+])
+def test_script_and_marker_letters_decide_without_langdetect(lang, text, detected):
+    verdict = check_block(lang, text)
+    assert verdict == {"ok": True, "detected": detected, "method": "script", "reason": ""}
+
+
+@pytest.mark.parametrize("lang, text, detected", [
+    ("ru", "I remember a wonderful moment", "latin"),
+    ("en", "Я помню чудное мгновенье", "cyrillic"),
+    ("zh_cn", "The moon before my bed", "latin"),
+    # 主体文字不到九成：俄文里混进了大段英文
+    ("ru", "Я помню чудное мгновенье hello", "cyrillic"),
+])
+def test_wrong_script_fails(lang, text, detected):
+    verdict = check_block(lang, text)
+    assert not verdict["ok"]
+    assert verdict["detected"] == detected and verdict["method"] == "script"
+
+
+def test_simplified_and_traditional():
+    simplified = "这时候我们来到东门"
+    traditional = "這時候我們來到東門"
+    assert check_block("zh_cn", simplified)["ok"]
+    assert check_block("zh_tw", traditional)["ok"]
+    assert check_block("zh_tw", simplified)["detected"] == "zh_cn"
+    assert not check_block("zh_tw", simplified)["ok"]
+    assert check_block("zh_cn", traditional)["detected"] == "zh_tw"
+    # 没有简繁专用字时无法区分，按期望语言通过
+    assert check_block("zh_tw", "床前明月光")["ok"]
+
+
+def test_stopwords():
+    fr = "Le lac et la mer dans le soir"
+    assert check_block("fr", fr) == {"ok": True, "detected": "fr", "method": "stopwords", "reason": ""}
+    verdict = check_block("en", fr)
+    assert (verdict["ok"], verdict["detected"], verdict["method"]) == (False, "fr", "stopwords")
+    verdict = check_block("de", "The sea and the sky is all of my heart")
+    assert (verdict["ok"], verdict["detected"], verdict["method"]) == (False, "en", "stopwords")
+
+
+def test_few_stopwords_fall_through_to_langdetect(monkeypatch):
+    monkeypatch.setattr(lang_check, "_detect_with_langdetect", lambda text: "fr")
+    assert check_block("fr", "Le lac")["method"] == "langdetect"
+
+
+def test_empty_and_unknown():
+    assert not check_block("en", "123 ... !")["ok"]
+    assert check_block("ja", "anything")["ok"]
+
+
+def _counting_check(monkeypatch):
+    calls = []
+    original = lang_check.check_block
+
+    def check(lang, text):
+        calls.append(lang)
+        return original(lang, text)
+
+    monkeypatch.setattr(lang_check, "check_block", check)
+    return calls
+
+
+def test_validator_uses_and_persists_cache(tmp_path, monkeypatch):
+    calls = _counting_check(monkeypatch)
+    path = str(tmp_path / "verdicts.jsonl")
+    block = {"title": "Зима", "author": "Pushkin", "content": "Мороз и солнце"}
+
+    validator = LanguageValidator(VerdictCache(path))
+    assert validator.check("ru", block)["ok"]
+    assert validator.check("ru", block)["ok"]
+    assert calls == ["ru"]
+    validator.flush()
+
+    # 新进程读入缓存文件，不再判断；作者名不参与校验
+    again = LanguageValidator(VerdictCache(path))
+    assert again.check("ru", dict(block, author="Пушкин"))["ok"]
+    assert calls == ["ru"]
+    assert len(again.cache) == 1
+
+
+def test_validate_records(tmp_path, monkeypatch):
+    calls = _counting_check(monkeypatch)
+    records = [
+        {"input_info": {"title": str(i)},
+         "versions": {"ru": {"title": "Зима", "content": "Мороз и солнце"},
+                      "zh_tw": {"title": "静夜思", "content": "这时候我们来到东门"},
+                      "xhs_copy": "不参与校验"}}
+        for i in range(5)
+    ]
+    cache = VerdictCache(str(tmp_path / "v.jsonl"))
+    results = list(validate_records(iter(records), cache=cache, chunk_records=2, batch_blocks=1))
+    assert [info["title"] for info, _ in results] == ["0", "1", "2", "3", "4"]
+    for _, verdicts in results:
+        assert set(verdicts) == {"ru", "zh_tw"}
+        assert verdicts["ru"]["ok"] and not verdicts["zh_tw"]["ok"]
+    # 相同内容每种只判断一次 (同一批内去重，后面的批次命中缓存)
+    assert sorted(calls) == ["ru", "zh_tw"]
+    assert (tmp_path / "v.jsonl").exists()
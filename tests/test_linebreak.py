@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from conftest import FONT_CYRILLIC, FONT_LATIN
+from src.font_cache import GlyphMetrics, get_font
+from src.linebreak import _break_greedy_measured, break_balanced, break_greedy
+
+LATIN_WORDS = ["a", "the", "love", "Wahrheit", "l'amour", "AVA", "To", "W.", "—", "déjà", "Tyrannei"]
+CYRILLIC_CHARS = list("Я помню чудное мгновенье, передо мной явилась ты")
+
+
+@pytest.fixture(scope="module", params=[FONT_LATIN, FONT_CYRILLIC])
+def metrics(request):
+    return GlyphMetrics(get_font(request.param, 40))
+
+
+def _cases(seed, count):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        if rnd.random() < 0.5:
+            # 西文：按空格切词，连续空格会产生空词
+            words = [rnd.choice(LATIN_WORDS + [""]) for _ in range(rnd.randint(0, 40))]
+            sep = " "
+        else:
+            words = [rnd.choice(CYRILLIC_CHARS) for _ in range(rnd.randint(0, 80))]
+            sep = ""
+        yield words, sep, rnd.choice([60, 150, 400, 962])
+
+
+def test_greedy_matches_measured_reference(metrics):
+    for words, sep, width in _cases(1, 600):
+        assert break_greedy(words, sep, metrics, width) == _break_greedy_measured(words, sep, metrics, width)
+
+
+def _badness(lines, metrics, width):
+    return sum(max(0.0, width - metrics.getlength(line)) ** 2 for line in lines)
+
+
+def test_balanced_keeps_line_count_and_fits(metrics):
+    for words, sep, width in _cases(2, 300):
+        words = [w for w in words if w]
+        greedy = break_greedy(words, sep, metrics, width)
+        balanced = break_balanced(words, sep, metrics, width)
+
+        # 贪心断行保留了旧实现的行为：第一个词就放不下时先产出一个空行
+        greedy = [line for line in greedy if line]
+        assert sep.join(balanced) == sep.join(greedy) == sep.join(words)
+        assert len(balanced) == len(greedy)
+        for line in balanced:
+            # 只有放不进一行的单个词才允许超宽
+            single_word = sep not in line if sep else len(line) == 1
+            assert metrics.getlength(line) <= width + 1e-6 or single_word
+        assert _badness(balanced, metrics, width) <= _badness(greedy, metrics, width) + 1e-6
+
+
+def test_balanced_evens_out_short_last_line():
+    metrics = GlyphMetrics(get_font(FONT_LATIN, 40))
+    words = "one two three four five six seven eight nine ten eleven".split()
+    width = metrics.getlength(" ".join(words[:8])) + 1
+    greedy = break_greedy(words, " ", metrics, width)
+    balanced = break_balanced(words, " ", metrics, width)
+    assert len(greedy) == len(balanced) == 2
+    widths = [metrics.getlength(line) for line in balanced]
+    assert max(widths) - min(widths) < max(metrics.getlength(line) for line in greedy) - min(
+        metrics.getlength(line) for line in greedy)
+
+
+def test_empty_input():
+    metrics = GlyphMetrics(get_font(FONT_LATIN, 40))
+    assert break_greedy([], " ", metrics, 100) == []
+    assert break_balanced(["", ""], " ", metrics, 100) == []
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import llm_cache
+from src.llm_cache import ResponseCache, make_cache_key
+
+DATA = {"ru": {"title": "Зима", "content": "Мороз и солнце"}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def _cache(tmp_path, **kwargs):
+    return ResponseCache(str(tmp_path / "c.sqlite"), **kwargs)
+
+
+def test_key_depends_on_every_part():
+    base = make_cache_key("t", "a", "m", "prompt", 0.3)
+    assert base == make_cache_key("t", "a", "m", "prompt", 0.3)
+    variants = [("t2", "a", "m", "prompt", 0.3), ("t", "a2", "m", "prompt", 0.3), ("t", "a", "m2", "prompt", 0.3),
+                ("t", "a", "m", "prompt2", 0.3), ("t", "a", "m", "prompt", 0.7)]
+    assert len({make_cache_key(*v) for v in variants} | {base}) == 6
+
+
+def test_ttl_expiry(tmp_path, clock):
+    cache = _cache(tmp_path, ttl=60)
+    cache.put("k", DATA)
+    clock[0] += 59
+    assert cache.get("k") == DATA
+    clock[0] += 2
+    assert cache.get("k") is None
+    assert cache.purge_expired() == 1
+
+    calls = []
+    cache.put("k", DATA)
+    clock[0] += 61
+    assert cache.get_or_fetch("k", lambda: calls.append(1) or DATA) == DATA
+    assert calls == [1] and cache.stats() == {"hits": 0, "misses": 1, "coalesced": 0}
+
+
+def test_persists_and_skips_empty_results(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.get_or_fetch("empty", lambda: {}) == {}
+    assert cache.get_or_fetch("k", lambda: DATA) == DATA
+    cache.close()
+
+    again = _cache(tmp_path)
+    assert again.get("empty") is None
+    assert again.get_or_fetch("k", lambda: pytest.fail("应当命中缓存")) == DATA
+    assert again.stats()["hits"] == 1
+
+
+def test_refresh_refetches_once_per_run(tmp_path):
+    _cache(tmp_path).put("k", {"old": True})
+    cache = _cache(tmp_path, refresh=True)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return DATA
+
+    assert cache.get_or_fetch("k", fetch) == DATA
+    # 同一次运行里重复的条目命中刚写回的结果
+    assert cache.get_or_fetch("k", fetch) == DATA
+    assert calls == [1]
+    assert _cache(tmp_path).get("k") == DATA
+
+
+def test_sync_concurrent_callers_share_one_fetch(tmp_path):
+    cache = _cache(tmp_path)
+    callers = 8
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        # 等其余调用者都排上队再返回
+        deadline = time.monotonic() + 5
+        while cache.coalesced < callers - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return DATA
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("k", fetch)))
+               for _ in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+    assert results == [DATA] * callers
+    assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": callers - 1}
+
+
+def test_sync_waiters_retry_after_leader_fails(tmp_path):
+    cache = _cache(tmp_path)
+    calls = []
+    started = threading.Event()
+
+    def failing():
+        calls.append("fail")
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("boom")
+
+    errors, results = [], []
+
+    def leader():
+        try:
+            cache.get_or_fetch("k", failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    t = threading.Thread(target=leader)
+    t.start()
+    started.wait(2)
+    results.append(cache.get_or_fetch("k", lambda: calls.append("ok") or DATA))
+    t.join()
+    assert len(errors) == 1 and results == [DATA]
+    assert calls == ["fail", "ok"]
+
+
+def test_async_concurrent_callers_share_one_fetch(tmp_path):
+    cache = _cache(tmp_path)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return DATA
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_fetch("k", fetch) for _ in range(10)))
+
+    assert asyncio.run(main()) == [DATA] * 10
+    assert calls == [1]
+    assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": 9}
+    assert asyncio.run(cache.aget_or_fetch("k", fetch)) == DATA
+    assert calls == [1] and cache.hits == 1
+
+
+def test_async_error_reaches_every_waiter(tmp_path):
+    cache = _cache(tmp_path)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_fetch("k", fetch) for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache._async_inflight == {}
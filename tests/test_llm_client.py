@@ -0,0 +1,77 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src import llm_client
+from src.llm_client import LANGUAGES, FetchError, fetch_poem_data_stream, fetch_poem_data_v2
+
+FULL = {lang: {"title": "t", "author": "a", "content": "c"} for lang in LANGUAGES}
+
+
+def _choice(text):
+    return SimpleNamespace(message=SimpleNamespace(content=text), delta=SimpleNamespace(content=text))
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """把共享客户端换成返回固定内容的假客户端；stream=True 时按 chunks 逐段返回"""
+    reply = {}
+
+    def create(**kwargs):
+        if "error" in reply:
+            raise reply["error"]
+        if kwargs.get("stream"):
+            return iter([SimpleNamespace(choices=[_choice(c)]) for c in reply["chunks"]])
+        return SimpleNamespace(choices=[_choice(reply["text"])])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm_client, "_client", client)
+    return reply
+
+
+def test_v2_returns_parsed_object(fake_llm):
+    fake_llm["text"] = json.dumps(FULL)
+    assert fetch_poem_data_v2("t", "a") == FULL
+
+
+@pytest.mark.parametrize("text, kind", [("not json", "malformed_json"), ("[1, 2]", "malformed_json"),
+                                        (None, "malformed_json")])
+def test_v2_malformed_raises(fake_llm, text, kind):
+    fake_llm["text"] = text
+    with pytest.raises(FetchError) as e:
+        fetch_poem_data_v2("t", "a")
+    assert e.value.kind == kind
+    assert e.value.to_dict()["kind"] == kind
+
+
+def test_v2_api_error_raises(fake_llm):
+    fake_llm["error"] = RuntimeError("connection reset")
+    with pytest.raises(FetchError) as e:
+        fetch_poem_data_v2("t", "a")
+    assert e.value.kind == "api_error"
+    assert "connection reset" in e.value.message
+
+
+def test_stream_hands_off_blocks(fake_llm):
+    text = json.dumps(FULL)
+    fake_llm["chunks"] = [text[i:i + 7] for i in range(0, len(text), 7)]
+    seen = []
+    assert fetch_poem_data_stream("t", "a", on_block=lambda k, v: seen.append(k)) == FULL
+    assert seen == list(LANGUAGES)
+
+
+def test_stream_incomplete_keeps_partial(fake_llm):
+    partial = {k: FULL[k] for k in LANGUAGES[:2]}
+    fake_llm["chunks"] = [json.dumps(partial)]
+    with pytest.raises(FetchError) as e:
+        fetch_poem_data_stream("t", "a")
+    assert e.value.kind == "incomplete"
+    assert e.value.to_dict()["received"] == sorted(partial)
+
+
+def test_stream_truncated_is_malformed(fake_llm):
+    fake_llm["chunks"] = [json.dumps(FULL)[:-20]]
+    with pytest.raises(FetchError) as e:
+        fetch_poem_data_stream("t", "a")
+    assert e.value.kind == "malformed_json"
@@ -0,0 +1,78 @@
+import os
+import shutil
+
+from conftest import FONT_CYRILLIC, FONT_LATIN
+from src.font_registry import file_digest
+from src.manifest import OutputManifest, card_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES = os.path.join(ROOT, "assets", "templates")
+DATA = {"title": "Зимнее утро", "author": "Пушкин", "content": "Мороз и солнце; день чудесный!"}
+
+
+def _hash(data=DATA, font=FONT_CYRILLIC, size=40, options=None, fallbacks=()):
+    return card_hash(data, font, size, options, fallbacks)
+
+
+def test_same_inputs_same_hash():
+    assert _hash() == _hash(data=dict(DATA))
+    assert _hash(options={}) == _hash(options=None)
+    # 选项顺序不影响指纹
+    assert _hash(options={"a": 1, "b": 2}) == _hash(options={"b": 2, "a": 1})
+
+
+def test_every_input_changes_the_hash():
+    variants = [
+        _hash(),
+        _hash(data=dict(DATA, title="Бесы")),
+        _hash(data=dict(DATA, author="Лермонтов")),
+        _hash(data=dict(DATA, content=DATA["content"] + "!")),
+        _hash(font=FONT_LATIN),
+        _hash(size=41),
+        _hash(options={"line_break": "balanced"}),
+        _hash(options={"bg_tiled": True}),
+        _hash(options={"max_height": 4000}),
+        _hash(options={"font_fit": [30, 60]}),
+        _hash(options={"output_format": {"format": "webp"}}),
+        _hash(fallbacks=(FONT_LATIN,)),
+        _hash(options={"bg_template": os.path.join(TEMPLATES, "paper_clean.jpg")}),
+        _hash(options={"bg_template": os.path.join(TEMPLATES, "paper_rose_texture.jpg")}),
+    ]
+    assert len(set(variants)) == len(variants)
+
+
+def test_font_identified_by_content_not_path(tmp_path):
+    copy = tmp_path / "copy.ttf"
+    shutil.copy(FONT_CYRILLIC, copy)
+    assert _hash(font=str(copy)) == _hash()
+
+
+def test_template_content_change_changes_hash(tmp_path):
+    template = tmp_path / "bg.jpg"
+    shutil.copy(os.path.join(TEMPLATES, "paper_clean.jpg"), template)
+    options = {"bg_template": str(template)}
+    before = _hash(options=options)
+
+    shutil.copy(os.path.join(TEMPLATES, "paper_rose_texture.jpg"), template)
+    file_digest.cache_clear()  # 文件哈希按进程缓存，相当于下一次运行
+    assert _hash(options=options) != before
+
+
+def test_manifest_freshness(tmp_path):
+    manifest = OutputManifest(str(tmp_path))
+    manifest.record("ru.jpg", "d1")
+    manifest.record("en.jpg", "d2", ["en_1.jpg", "en_2.jpg"])
+    for name in ("ru.jpg", "en_1.jpg"):
+        (tmp_path / name).write_bytes(b"x")
+    manifest.save()
+
+    loaded = OutputManifest(str(tmp_path))
+    assert loaded.is_fresh("ru.jpg", "d1")
+    assert not loaded.is_fresh("ru.jpg", "other")
+    # 分页卡片缺了一页就要重画
+    assert not loaded.is_fresh("en.jpg", "d2")
+    (tmp_path / "en_2.jpg").write_bytes(b"x")
+    assert loaded.is_fresh("en.jpg", "d2")
+
+    (tmp_path / "manifest.json").write_text("{broken", encoding="utf-8")
+    assert OutputManifest(str(tmp_path)).entries == {}
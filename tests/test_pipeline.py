@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+
+import pytest
+
+import main
+from src import llm_client, render_pool
+from src.checkpoint import CollectionCheckpoint
+from src.pipeline import FetchPipeline
+from src.review_io import iter_review_records
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _record(title, content):
+    return {"input_info": {"title": title, "author": "x"},
+            "versions": {"ru": {"title": title, "author": "x", "content": content}}}
+
+
+def test_fetch_pipeline_bounded_and_complete():
+    in_flight = []
+    lock = threading.Lock()
+    peak = [0]
+
+    def fetch(item):
+        with lock:
+            in_flight.append(item)
+            peak[0] = max(peak[0], len(in_flight))
+        return item * 2
+
+    pipe = FetchPipeline(range(50), fetch, concurrency=3, queue_size=2)
+    results = []
+    for item, data, error in pipe:
+        with lock:
+            in_flight.remove(item)
+        assert error is None
+        results.append((item, data))
+    assert sorted(results) == [(i, i * 2) for i in range(50)]
+    # 在内存里等待下游的结果最多 queue_size 个，外加每个采集线程手上的一个
+    assert peak[0] <= 2 + 3 + 1
+
+
+def test_fetch_pipeline_passes_errors_through():
+    def fetch(item):
+        if item == 3:
+            raise ValueError("boom")
+        return item
+
+    errors = [(item, str(err)) for item, _, err in FetchPipeline(range(5), fetch, concurrency=2) if err]
+    assert errors == [(3, "boom")]
+
+
+def test_fetch_pipeline_start_runs_before_iteration():
+    started = threading.Event()
+
+    def fetch(item):
+        started.set()
+        return item
+
+    pipe = FetchPipeline(range(3), fetch, concurrency=1).start()
+    try:
+        assert started.wait(2)
+        assert sorted(item for item, _, _ in pipe) == [0, 1, 2]
+    finally:
+        pipe.close()
+
+
+def test_pipeline_fetches_while_existing_records_render(in_tmp, monkeypatch):
+    os.symlink(os.path.join(ROOT, "assets"), in_tmp / "assets")
+    fetching = threading.Event()
+
+    def fake_fetch(title, author, cache=None):
+        fetching.set()
+        return _record(title, "fetched " + title)["versions"]
+
+    rendered = []
+
+    def fake_render_jobs(jobs, on_done=None, **kwargs):
+        for job in jobs:
+            if not rendered:
+                # 第一张是校验文件里已有的 A：此时 B 应该已经在采集了
+                assert fetching.wait(2)
+            rendered.append(job["data"]["content"])
+        return len(rendered), []
+
+    monkeypatch.setattr(llm_client, "fetch_poem_data_v2", fake_fetch)
+    monkeypatch.setattr(render_pool, "render_jobs", fake_render_jobs)
+    monkeypatch.setattr(main, "POEM_DATA_SOURCE", [{"title": "A", "author": "x"}, {"title": "B", "author": "x"}])
+    (in_tmp / main.REVIEW_FILE).write_text(json.dumps([_record("A", "REVIEWED")], ensure_ascii=False),
+                                           encoding="utf-8")
+    assert main.step_pipeline(concurrency=1) == 0
+    assert rendered == ["REVIEWED", "fetched B"]
+
+
+@pytest.mark.parametrize("ext", [".json", ".jsonl"])
+def test_export_review_merge_keeps_edits(tmp_path, ext):
+    cp = CollectionCheckpoint(str(tmp_path / "c.jsonl"))
+    cp.append(_record("A", "")["input_info"], versions=_record("A", "fetched A")["versions"])
+    review = str(tmp_path / f"review{ext}")
+    assert cp.export_review(review) == 1
+
+    # 人工校对后，再采集到一首新诗
+    edited = [_record("A", "REVIEWED")]
+    if ext == ".json":
+        (tmp_path / f"review{ext}").write_text(json.dumps(edited, ensure_ascii=False), encoding="utf-8")
+    else:
+        (tmp_path / f"review{ext}").write_text(json.dumps(edited[0], ensure_ascii=False) + "\n", encoding="utf-8")
+    mtime = os.path.getmtime(review)
+    assert cp.export_review(review, merge=True) == 1
+    assert os.path.getmtime(review) == mtime  # 没有新诗时不改动文件
+
+    cp.append(_record("B", "")["input_info"], versions=_record("B", "fetched B")["versions"])
+    assert cp.export_review(review, merge=True) == 2
+    contents = [r["versions"]["ru"]["content"] for r in iter_review_records(review)]
+    assert contents == ["REVIEWED", "fetched B"]
+
+
+def test_pipeline_reuses_reviewed_records(in_tmp, monkeypatch):
+    os.symlink(os.path.join(ROOT, "assets"), in_tmp / "assets")
+    calls = []
+
+    def fake_fetch(title, author, cache=None):
+        calls.append(title)
+        return _record(title, "fetched " + title)["versions"]
+
+    monkeypatch.setattr(llm_client, "fetch_poem_data_v2", fake_fetch)
+    monkeypatch.setattr(main, "POEM_DATA_SOURCE", [{"title": "A", "author": "x"}, {"title": "B", "author": "x"}])
+    (in_tmp / main.REVIEW_FILE).write_text(json.dumps([_record("A", "REVIEWED")], ensure_ascii=False),
+                                           encoding="utf-8")
+
+    assert main.step_pipeline(concurrency=2) == 0
+    assert calls == ["B"]
+    contents = [r["versions"]["ru"]["content"] for r in iter_review_records(main.REVIEW_FILE)]
+    assert contents == ["REVIEWED", "fetched B"]
+
+    # 重跑：不再请求，也不重画
+    assert main.step_pipeline(concurrency=2) == 0
+    assert calls == ["B"]
+    # 第二步读到的是同一份内容，卡片指纹一致，同样跳过
+    manifest = json.loads((in_tmp / "output" / "A_多语言组图" / "manifest.json").read_text(encoding="utf-8"))
+    assert main.step_2_render_from_file() == 0
+    assert json.loads((in_tmp / "output" / "A_多语言组图" / "manifest.json").read_text(encoding="utf-8")) == manifest
+
+
+def test_fetch_rerun_keeps_reviewer_edits(in_tmp, monkeypatch):
+    calls = []
+
+    def fake_fetch(title, author, cache=None):
+        calls.append(title)
+        return _record(title, "fetched " + title)["versions"]
+
+    monkeypatch.setattr(llm_client, "fetch_poem_data_v2", fake_fetch)
+    monkeypatch.setattr(main, "POEM_DATA_SOURCE", [{"title": "A", "author": "x"}])
+    assert main.step_1_fetch_and_save() == 0
+
+    # 人工校对改了 A，随后源列表又加了一首
+    (in_tmp / main.REVIEW_FILE).write_text(json.dumps([_record("A", "REVIEWED")], ensure_ascii=False),
+                                           encoding="utf-8")
+    monkeypatch.setattr(main, "POEM_DATA_SOURCE", [{"title": "A", "author": "x"}, {"title": "B", "author": "x"}])
+    assert main.step_1_fetch_and_save() == 0
+    assert calls == ["A", "B"]
+    contents = [r["versions"]["ru"]["content"] for r in iter_review_records(main.REVIEW_FILE)]
+    assert contents == ["REVIEWED", "fetched B"]
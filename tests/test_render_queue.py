@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import render_queue
+from src.render_queue import DONE, FAILED, LEASED, PENDING, RenderQueue
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """队列模块里的 time.time 换成手动拨动的时钟"""
+    now = [1000.0]
+    monkeypatch.setattr(render_queue, "time", SimpleNamespace(time=lambda: now[0], sleep=lambda s: None))
+    return now
+
+
+def _jobs(tmp_path, n, digest="d1"):
+    out = str(tmp_path / "out")
+    return [{"output_path": f"{out}/card{i}.jpg", "manifest": (out, f"card{i}.jpg", digest)} for i in range(n)]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = RenderQueue(str(tmp_path / "q.sqlite"), lease_seconds=60, max_attempts=2)
+    yield q
+    q.close()
+
+
+def test_each_job_claimed_once_across_workers(tmp_path, queue):
+    assert queue.enqueue(_jobs(tmp_path, 40), batch_size=7) == 40
+    claimed = {}
+    lock = threading.Lock()
+
+    def worker(name):
+        # 每个工作者各开一个连接，和多进程时一样
+        q = RenderQueue(queue.path)
+        try:
+            while True:
+                jobs = q.claim(name, limit=3)
+                if not jobs:
+                    return
+                with lock:
+                    for job in jobs:
+                        claimed.setdefault(job["queue_id"], []).append(name)
+        finally:
+            q.close()
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(claimed) == 40
+    assert all(len(owners) == 1 for owners in claimed.values())
+    assert queue.counts() == {LEASED: 40}
+
+
+def test_expired_lease_is_reclaimed(tmp_path, queue, clock):
+    queue.enqueue(_jobs(tmp_path, 1))
+    [job] = queue.claim("a")
+    assert queue.claim("b") == []
+
+    clock[0] += 61
+    assert queue.counts() == {"expired": 1}
+    assert not queue.is_drained()
+    assert [j["queue_id"] for j in queue.claim("b")] == [job["queue_id"]]
+
+    # 原持有者已经丢了租约：续约报告丢失，完成不生效
+    assert queue.heartbeat("a", [job["queue_id"]]) == {job["queue_id"]}
+    assert queue.complete("a", job["queue_id"], ["card0.jpg"]) is False
+    assert queue.complete("b", job["queue_id"], ["card0.jpg"]) is True
+    assert queue.counts() == {DONE: 1}
+    assert queue.is_drained()
+
+
+def test_heartbeat_extends_lease(tmp_path, queue, clock):
+    queue.enqueue(_jobs(tmp_path, 1))
+    [job] = queue.claim("a")
+    for _ in range(5):
+        clock[0] += 40
+        assert queue.heartbeat("a", [job["queue_id"]]) == set()
+    # 累计已远超一个租约期，但一直在续约，别人领不到
+    assert queue.claim("b") == []
+    assert queue.counts() == {LEASED: 1}
+
+
+def test_lease_expiring_too_often_fails(tmp_path, queue, clock):
+    queue.enqueue(_jobs(tmp_path, 1))
+    for worker in ("a", "b"):
+        assert len(queue.claim(worker)) == 1
+        clock[0] += 61
+    assert queue.claim("c") == []
+    assert queue.counts() == {FAILED: 1}
+    assert queue.is_drained()
+
+
+def test_fail_retries_until_max_attempts(tmp_path, queue):
+    queue.enqueue(_jobs(tmp_path, 1))
+    [job] = queue.claim("a")
+    queue.fail("a", job["queue_id"], "boom")
+    assert queue.counts() == {PENDING: 1}
+
+    [job] = queue.claim("a")
+    queue.fail("a", job["queue_id"], "boom again")
+    assert queue.counts() == {FAILED: 1}
+    assert queue.failures() == [(job["queue_id"], "boom again")]
+
+
+def test_enqueue_skips_unchanged_done_jobs(tmp_path, queue):
+    queue.enqueue(_jobs(tmp_path, 2))
+    for job in queue.claim("a", limit=2):
+        queue.complete("a", job["queue_id"], None)
+
+    assert queue.enqueue(_jobs(tmp_path, 2)) == 0
+    changed = _jobs(tmp_path, 2)
+    changed[1]["manifest"] = (changed[1]["manifest"][0], "card1.jpg", "d2")
+    assert queue.enqueue(changed) == 1
+    assert queue.counts() == {DONE: 1, PENDING: 1}
+
+
+def test_sync_manifests_records_once(tmp_path, queue):
+    (tmp_path / "out").mkdir()  # 图片由渲染写出，输出目录此时已存在
+    queue.enqueue(_jobs(tmp_path, 2))
+    first, second = queue.claim("a", limit=2)
+    queue.complete("a", first["queue_id"], ["card0.jpg"])
+    queue.complete("a", second["queue_id"], ["card1_1.jpg", "card1_2.jpg"])
+
+    assert queue.sync_manifests() == 2
+    assert queue.sync_manifests() == 0
+    entries = json.loads((tmp_path / "out" / "manifest.json").read_text(encoding="utf-8"))
+    assert entries == {"card0.jpg": "d1", "card1.jpg": {"digest": "d1", "files": ["card1_1.jpg", "card1_2.jpg"]}}
+
+
+def test_force_requeues_done_and_leased(tmp_path, queue):
+    queue.enqueue(_jobs(tmp_path, 2))
+    first, _ = queue.claim("a", limit=2)
+    queue.complete("a", first["queue_id"], None)
+    assert queue.counts() == {DONE: 1, LEASED: 1}
+
+    assert queue.enqueue(_jobs(tmp_path, 2)) == 0
+    assert queue.enqueue(_jobs(tmp_path, 2), force=True) == 2
+    assert queue.counts() == {PENDING: 2}
+    # 原持有者的结果不再登记
+    assert queue.complete("a", _jobs(tmp_path, 2)[1]["output_path"], None) is False
+
+
+def test_worker_skips_jobs_whose_lease_was_taken(tmp_path, queue, monkeypatch):
+    from src import render_pool
+
+    jobs = _jobs(tmp_path, 2)
+    queue.enqueue(jobs)
+    renders = []
+
+    def fake_render_job(job, renderer=None):
+        renders.append(job["queue_id"])
+        if len(renders) == 1:
+            # 画第一张时，同批领到的第二张被别的进程接手；等心跳发现
+            queue._conn.execute("UPDATE jobs SET worker = 'thief', lease_until = ? WHERE id = ?",
+                                (time.time() + 0.5, jobs[1]["output_path"]))
+            time.sleep(0.3)
+        return job["output_path"], None, [job["output_path"]]
+
+    monkeypatch.setattr(render_pool, "render_job", fake_render_job)
+    stats = render_queue.run_worker(queue.path, worker_id="me", lease_seconds=0.15, claim_batch=2, poll=0.05)
+    # 第二张不在本进程手上时不画；对方的租约过期后由本进程重新领取
+    assert renders == [jobs[0]["output_path"], jobs[1]["output_path"]]
+    assert stats["lost"] == 1 and stats["done"] == 2
+    assert queue.counts() == {DONE: 2}
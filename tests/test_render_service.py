@@ -0,0 +1,130 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import FONT_CYRILLIC
+from src import render_service
+from src.render_service import LatencyWindow, RenderService, percentile
+
+REQUEST = {"lang": "ru", "title": "Зимнее утро", "author": "Пушкин", "content": "Мороз и солнце; день чудесный!"}
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """进程池换成线程池，渲染换成计数的假实现 (稍慢一点，好让并发请求撞在一起)"""
+    calls = []
+    lock = threading.Lock()
+
+    def fake_render_job(job):
+        with lock:
+            calls.append(job["data"]["title"])
+        time.sleep(0.05)
+        if job["data"]["title"] == "boom":
+            return job["output_path"], "render failed", None, None
+        with open(job["output_path"], "wb") as f:
+            f.write(b"jpeg")
+        return job["output_path"], None, [job["output_path"]], None
+
+    monkeypatch.setattr(render_service, "_pool_render_job", fake_render_job)
+    svc = RenderService(lambda lang, data: (FONT_CYRILLIC, ()), ["ru", "en"], output_dir=str(tmp_path / "svc"))
+    svc.calls = calls
+    pool = ThreadPoolExecutor(4)
+    svc._pool = pool
+    yield svc
+    svc._pool = None
+    pool.shutdown(wait=True)
+
+
+def _run(service, *coros):
+    async def main():
+        service._save_lock = asyncio.Lock()
+        return await asyncio.gather(*coros, return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def test_identical_requests_render_once(service):
+    other = dict(REQUEST, title="Бесы")
+    results = _run(service, *[service.render(dict(REQUEST)) for _ in range(5)], service.render(other))
+    assert sorted(service.calls) == sorted([REQUEST["title"], "Бесы"])
+    assert sorted(how for _, _, how in results) == ["coalesced"] * 4 + ["render"] * 2
+    assert len({digest for digest, _, _ in results[:5]}) == 1
+    assert service.stats["rendered"] == 2 and service.stats["coalesced"] == 4
+    assert service._inflight == {}
+
+    # 渲染完成后同一张卡片直接命中已有文件，清单也已写盘
+    [(digest, files, how)] = _run(service, service.render(dict(REQUEST)))
+    assert how == "hit" and files == [f"{digest}.jpg"]
+    assert len(service.calls) == 2
+    saved = json.loads(open(service.manifest.path, encoding="utf-8").read())
+    assert saved[f"{digest}.jpg"] == digest
+
+
+def test_failed_render_is_shared_then_retried(service):
+    bad = dict(REQUEST, title="boom")
+    results = _run(service, *[service.render(dict(bad)) for _ in range(3)])
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert service.calls == ["boom"]
+    # 失败不留在 inflight 里，下一次请求重新渲染
+    assert service._inflight == {}
+    _run(service, service.render(dict(bad)))
+    assert service.calls == ["boom", "boom"]
+
+
+@pytest.mark.parametrize("patch", [
+    {"lang": "xx"},
+    {"lang": ["ru"]},
+    {"content": "   "},
+    {"content": None},
+    {"title": 5},
+    {"author": ["a"]},
+    {"font_size": 0},
+    {"font_size": 201},
+    {"font_size": "40"},
+    {"font_size": 40.5},
+    {"font_size": True},
+])
+def test_invalid_requests_are_400(service, patch):
+    body = json.dumps(dict(REQUEST, **patch)).encode("utf-8")
+    [(status, _, payload)] = _run(service, service._dispatch("POST", "/render", body))
+    assert status == 400
+    assert json.loads(payload)["error"]
+    assert service.calls == []
+
+
+def test_missing_content_and_non_object_body_are_400(service):
+    request = {k: v for k, v in REQUEST.items() if k != "content"}
+    results = _run(service, service._dispatch("POST", "/render", json.dumps(request).encode("utf-8")),
+                   service._dispatch("POST", "/render", b"[1, 2]"))
+    assert [status for status, _, _ in results] == [400, 400]
+
+
+def test_dispatch_returns_image_then_stats(service):
+    body = json.dumps(dict(REQUEST, font_size=10)).encode("utf-8")
+    [(status, content_type, payload)] = _run(service, service._dispatch("POST", "/render", body))
+    assert (status, content_type, payload) == (200, "image/jpeg", b"jpeg")
+    [(status, _, payload)] = _run(service, service._dispatch("GET", "/stats", b""))
+    report = json.loads(payload)
+    assert report["requests"] == 1 and report["rendered"] == 1
+    assert report["latency_ms"]["render"]["count"] == 1
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([7], 50) == 7
+    assert percentile([], 50) is None
+
+
+def test_latency_window_keeps_recent():
+    window = LatencyWindow(size=3)
+    assert window.summary() == {"count": 0, "p50": None, "p99": None}
+    for ms in (1000, 1, 2, 3):
+        window.add(ms)
+    assert window.summary() == {"count": 3, "p50": 2, "p99": 3}
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+from PIL import Image
+
+from conftest import FONT_CYRILLIC, FONT_LATIN
+from src.renderer import DynamicRenderer
+
+STANZA = "Я помню чудное мгновенье:\nПередо мной явилась ты,\nКак мимолетное виденье,\nКак гений чистой красоты."
+LONG_LINE = " ".join(["Мороз и солнце; день чудесный! Еще ты дремлешь, друг прелестный"] * 40)
+
+
+def _lines(pages):
+    return [line for page in pages for para in page["paragraphs"] for line in para["lines"]]
+
+
+def _renderer(**kwargs):
+    return DynamicRenderer(verbose=False, **kwargs)
+
+
+def test_max_height_below_standard_is_rejected():
+    with pytest.raises(ValueError):
+        _renderer(max_height=1000)
+
+
+@pytest.mark.parametrize("text", ["\n\n".join([STANZA] * 30), "\n".join([STANZA] * 4 + [LONG_LINE] + [STANZA] * 4)])
+def test_paginate_fits_every_page_and_keeps_all_lines(text):
+    renderer = _renderer(max_height=2000)
+    font = renderer._get_font(FONT_CYRILLIC, 40)
+    layout, body_height, para_gap = renderer._layout_text(text, font)
+    max_body = 2000 - renderer.y_body_start - renderer.padding_bottom
+    assert body_height > max_body
+
+    pages = renderer.paginate(layout, body_height, para_gap)
+    assert len(pages) >= -(-body_height // max_body)
+    assert all(0 < page["height"] <= max_body for page in pages)
+    assert _lines(pages) == [line for para in layout for line in para["lines"]]
+    # 每页都装到放不下下一块为止：下一页的第一块本可以接在上一页后面时就不该断开
+    for page, following in zip(pages, pages[1:]):
+        assert page["height"] + para_gap + following["paragraphs"][0]["height"] > max_body
+
+
+def test_paginate_without_limit_or_when_short_is_one_page():
+    font = _renderer()._get_font(FONT_CYRILLIC, 40)
+    for renderer in (_renderer(), _renderer(max_height=4000)):
+        layout, body_height, para_gap = renderer._layout_text(STANZA, font)
+        assert renderer.paginate(layout, body_height, para_gap) == [{"paragraphs": layout, "height": body_height}]
+
+
+def test_split_paragraph_by_lines():
+    para = {"lines": [str(i) for i in range(100)], "height": 100 * 50 + 99 * 30, "font_height": 50, "line_gap": 30}
+    pieces = DynamicRenderer._split_paragraph(para, 1270)
+    # (1270 + 30) // (50 + 30) = 16 行一块
+    assert [len(p["lines"]) for p in pieces] == [16] * 6 + [4]
+    assert all(p["height"] <= 1270 for p in pieces)
+    assert [line for p in pieces for line in p["lines"]] == para["lines"]
+    assert DynamicRenderer._split_paragraph(dict(para, height=100), 1270) == [dict(para, height=100)]
+
+
+def test_render_pages_writes_numbered_pages(tmp_path):
+    renderer = _renderer(max_height=2000)
+    data = {"title": "Зимнее утро", "author": "Пушкин", "content": "\n\n".join([STANZA] * 12)}
+    paths, futures = renderer.render_pages(data, FONT_CYRILLIC, str(tmp_path / "ru.jpg"))
+    assert futures == []
+    assert len(paths) > 1
+    assert [os.path.basename(p) for p in paths] == [f"ru_{i}.jpg" for i in range(1, len(paths) + 1)]
+    heights = [Image.open(p).height for p in paths]
+    assert all(h == 2000 for h in heights[:-1])
+    assert 1660 <= heights[-1] <= 2000
+
+
+@pytest.mark.parametrize("lines", [4, 7, 8, 9, 10, 11, 13, 24])
+def test_fit_font_picks_largest_size_that_fits(lines):
+    text = "\n".join((STANZA.split("\n") * 6)[:lines])
+    renderer = _renderer()
+    available = 1660 - renderer.y_body_start - renderer.padding_bottom
+    paths = (FONT_CYRILLIC,)
+
+    def height(size):
+        return renderer._layout_text(text, renderer._font(paths, size))[1]
+
+    size = renderer.fit_font_size(text, paths, 30, 60)
+    assert 30 <= size <= 60
+    if height(30) > available:
+        assert size == 30
+    else:
+        assert height(size) <= available
+        assert size == 60 or height(size + 1) > available
+
+
+def test_fit_font_used_by_plan():
+    renderer = _renderer(font_fit=(30, 60))
+    data = {"title": "Winter", "author": "P", "content": "Frost and sun"}
+    plan = renderer.plan(data, FONT_LATIN)
+    assert plan["font_size"] == 60
+    assert [page["canvas_height"] for page in plan["pages"]] == [1660]
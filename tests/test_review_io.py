@@ -0,0 +1,49 @@
+import io
+import json
+
+import pytest
+
+from src.review_io import _iter_json_array, convert, iter_review_records, write_review_records
+
+RECORDS = [
+    {"input_info": {"title": "Зимнее утро", "author": "Пушкин"},
+     "versions": {"ru": {"title": "Зимнее утро", "content": "Мороз и солнце;\nдень чудесный!"},
+                  "zh_cn": {"title": "冬天的早晨", "content": "严寒和太阳，真是美妙的一天！"}}},
+    {"input_info": {"title": "a \"quoted\" ] title, {x}", "author": "\\"}, "versions": {}},
+    {"input_info": {"title": "", "author": ""}, "versions": {"en": {"content": "[1, 2]"}}, "n": 12345},
+]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_any_chunk_size_gives_the_same_records(indent):
+    text = json.dumps(RECORDS, ensure_ascii=False, indent=indent)
+    for chunk_size in list(range(1, 64)) + [len(text) - 1, len(text), 1 << 16]:
+        assert list(_iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == RECORDS
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]  ", "\n[\n]\n"])
+def test_empty_array(text):
+    assert list(_iter_json_array(io.StringIO(text), chunk_size=1)) == []
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', "", '[{"a": 1}', '[{"a": 1}, {"b"'])
+def test_malformed_array_raises(text):
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO(text), chunk_size=4))
+
+
+@pytest.mark.parametrize("records", [RECORDS, []])
+def test_json_output_matches_json_dump(tmp_path, records):
+    path = tmp_path / "r.json"
+    assert write_review_records(str(path), iter(records)) == len(records)
+    assert path.read_text(encoding="utf-8") == json.dumps(records, ensure_ascii=False, indent=2)
+
+
+def test_round_trip_between_formats(tmp_path):
+    json_path, jsonl_path, back = (str(tmp_path / name) for name in ("r.json", "r.jsonl", "back.json"))
+    write_review_records(json_path, RECORDS)
+    assert convert(json_path, jsonl_path) == len(RECORDS)
+    assert len(open(jsonl_path, encoding="utf-8").read().splitlines()) == len(RECORDS)
+    assert list(iter_review_records(jsonl_path)) == RECORDS
+    assert convert(jsonl_path, back) == len(RECORDS)
+    assert open(back, encoding="utf-8").read() == open(json_path, encoding="utf-8").read()
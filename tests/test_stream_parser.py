@@ -0,0 +1,92 @@
+import json
+import random
+
+import pytest
+
+from src.stream_parser import IncrementalObjectParser, MalformedJSONError
+
+DOC = {
+    "zh_cn": {"title": "假如生活欺骗了你", "author": "普希金", "content": "假如生活欺骗了你，\n不要悲伤，不要心急！"},
+    "en": {"title": "If By Life You Were Deceived", "author": "Pushkin", "content": "Say \"hi\" {not} [a] \\ brace,"},
+    "ru": {"title": "Если жизнь тебя обманет", "author": "Пушкин", "content": "Не печалься, не сердись!"},
+    "tags": ["a", {"nested": [1, 2]}],
+    "xhs_copy": "文案，带逗号, 和 } 括号",
+}
+
+
+def _feed_in_chunks(text, sizes):
+    parser = IncrementalObjectParser()
+    emitted = []
+    pos = 0
+    for size in sizes:
+        emitted.extend(parser.feed(text[pos:pos + size]))
+        pos += size
+    emitted.extend(parser.feed(text[pos:]))
+    return parser, emitted
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_any_chunking_gives_the_same_members(indent):
+    text = json.dumps(DOC, ensure_ascii=False, indent=indent)
+    rnd = random.Random(indent or 0)
+    for _ in range(200):
+        sizes = [rnd.randint(1, 12) for _ in range(len(text))]
+        parser, emitted = _feed_in_chunks(text, sizes)
+        assert parser.close() == DOC
+        # 每个成员恰好产出一次，顺序与原文一致
+        assert [k for k, _ in emitted] == list(DOC)
+        assert dict(emitted) == DOC
+
+
+def test_block_is_emitted_as_soon_as_it_closes():
+    text = json.dumps(DOC, ensure_ascii=False)
+    end_of_zh = text.index("}") + 1  # zh_cn 对象的右括号
+    parser = IncrementalObjectParser()
+    assert [k for k, _ in parser.feed(text[:end_of_zh])] == ["zh_cn"]
+    assert "en" not in parser.members
+
+
+def test_single_character_chunks():
+    text = json.dumps(DOC, ensure_ascii=False)
+    parser, emitted = _feed_in_chunks(text, [1] * len(text))
+    assert parser.close() == DOC
+    assert len(emitted) == len(DOC)
+
+
+def test_empty_object():
+    parser = IncrementalObjectParser()
+    assert parser.feed("  {  }  ") == []
+    assert parser.close() == {}
+
+
+@pytest.mark.parametrize("text", [
+    "not json",
+    '["zh_cn"]',
+    '{"zh_cn": {"title": "a"}} trailing',
+    '{"a": 1,, "b": 2}',
+    '{"a": 1,}',
+    '{"a": 1]}',
+    '{"a":"x" "b"}',
+    '{"a":"x"  , "b":"y" 5}',
+    '{"a": {"b": 1} 2}',
+])
+def test_malformed_raises(text):
+    parser = IncrementalObjectParser()
+    with pytest.raises(MalformedJSONError):
+        parser.feed(text)
+        parser.close()
+
+
+def test_truncated_output_keeps_partial_members():
+    text = json.dumps(DOC, ensure_ascii=False)
+    cut = text.index('"ru"') + 10
+    parser = IncrementalObjectParser()
+    parser.feed(text[:cut])
+    with pytest.raises(MalformedJSONError):
+        parser.close()
+    assert set(parser.members) == {"zh_cn", "en"}
+
+
+def test_empty_output():
+    with pytest.raises(MalformedJSONError):
+        IncrementalObjectParser().close()